@@ -0,0 +1,401 @@
+"""
+Randomized differential check of the fast engines against the frozen reference.
+
+Thousands of random scenarios are run through both the original
+implementation (reference.py) and every optimized path: the single and
+batched mortgage tables, compounding, inflation, rent reinvestment, the
+stage graph, the vectorized pipeline and the closed-form scorer. The report
+gives, for each engine and column, the largest absolute error and the
+largest error relative to the magnitude of the series, plus the number of
+scenarios outside tolerance.
+
+On top of plain random draws, scenarios are pushed into the edge cases of
+the original code:
+
+    no_fgts           fgts_frequency of zero (FGTS never used)
+    zero_rates        every rate at zero
+    short_horizon     time horizon shorter than the mortgage term
+    early_payoff      FGTS large enough to end the mortgage early
+    short_term        mortgages of a few months
+
+The original `build_fgts_cash_flow` divides by the frequency, so no_fgts
+scenarios run on the reference with a yearly frequency and no amount, which
+is what a zero frequency means for the fast engines.
+
+Usage:
+
+    python accuracy.py --scenarios 200 --seed 0
+
+The reference takes about a second per scenario of the full ranges, so
+larger runs should spread it over --workers or cap --max-months.
+"""
+
+import argparse
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+import core
+import reference
+from core import calculate_mortgage_batch
+from dag import buy_vs_rent
+from pipeline import PARAM_NAMES, as_scenarios, simulate_batch
+from scoring import TOLERANCE_ABS, score
+
+EDGE_CASES = ('no_fgts', 'zero_rates', 'short_horizon', 'early_payoff', 'short_term')
+
+# share of scenarios drawn into each edge case (the rest are plain random draws)
+EDGE_CASE_SHARE = 0.1
+
+RATE_NAMES = ('home_appreciation', 'inflation', 'mort_interest', 'invest_interest', 'rent_appreciation')
+
+MORTGAGE_COLUMNS = ('mort_balance', 'mort_amount_paid', 'mort_amount_interest', 'mort_installment', 'mort_fgts_paid')
+
+# scenarios sent to a worker at a time
+CHUNK_SIZE = 50
+
+def random_scenarios(n_scenarios, seed=0, max_months=None):
+
+    """
+    Random scenarios over (and past) the ranges of interface.py, with a 'case' column.
+
+    `max_months` caps the mortgage terms and horizons, which bounds the time
+    the (quadratic) reference takes per scenario.
+    """
+
+    rng = np.random.default_rng(seed)
+
+    total_amount = rng.uniform(100e3, 3e6, n_scenarios)
+    downpay_amount = total_amount * rng.uniform(0., 1., n_scenarios)
+    principal = total_amount - downpay_amount
+
+    scenarios = pd.DataFrame({
+        'total_amount': total_amount,
+        'downpay_amount': downpay_amount,
+        'downpay_fgts_amount': np.where(rng.random(n_scenarios) < 0.5, 0., downpay_amount * rng.random(n_scenarios)),
+        'home_appreciation': rng.uniform(-0.1, 0.1, n_scenarios),
+        'inflation': rng.uniform(-0.05, 0.15, n_scenarios),
+        'time_horizon': rng.integers(0, 41, n_scenarios) * 12,
+        'n_months': rng.integers(1, 481, n_scenarios),
+        'mort_interest': rng.uniform(0., 0.15, n_scenarios),
+        'fgts_amount': np.where(rng.random(n_scenarios) < 0.3, 0., principal * rng.uniform(0., 0.1, n_scenarios)),
+        'fgts_frequency': rng.integers(1, 11, n_scenarios),
+        'invest_interest': rng.uniform(0., 0.2, n_scenarios),
+        'rent_amount': total_amount * rng.uniform(0., 0.008, n_scenarios),
+        'rent_appreciation': rng.uniform(-0.05, 0.15, n_scenarios),
+        'is_reinvestment': rng.random(n_scenarios) < 0.7,
+        'use_inflation': rng.random(n_scenarios) < 0.7,
+        'case': 'random',
+    })
+
+    cases = rng.choice(
+        np.array(('random',) + EDGE_CASES),
+        size=n_scenarios,
+        p=[1 - EDGE_CASE_SHARE * len(EDGE_CASES)] + [EDGE_CASE_SHARE] * len(EDGE_CASES)
+    )
+    scenarios['case'] = cases
+
+    def edge(name):
+        return scenarios['case'] == name
+
+    scenarios.loc[edge('no_fgts'), 'fgts_frequency'] = 0
+
+    for name in RATE_NAMES:
+        scenarios.loc[edge('zero_rates'), name] = 0.
+
+    short_horizon = edge('short_horizon')
+    scenarios.loc[short_horizon, 'time_horizon'] = (
+        scenarios.loc[short_horizon, 'n_months'] * rng.random(short_horizon.sum())
+    ).astype(int)
+
+    early_payoff = edge('early_payoff')
+    scenarios.loc[early_payoff, 'fgts_frequency'] = rng.integers(1, 3, early_payoff.sum())
+    scenarios.loc[early_payoff, 'fgts_amount'] = principal[early_payoff] * rng.uniform(0.05, 1.5, early_payoff.sum())
+
+    short_term = edge('short_term')
+    scenarios.loc[short_term, 'n_months'] = rng.integers(1, 25, short_term.sum())
+
+    if max_months is not None:
+        scenarios['n_months'] = scenarios['n_months'].clip(upper=max_months)
+        scenarios['time_horizon'] = scenarios['time_horizon'].clip(upper=max_months)
+
+    return scenarios
+
+def _pipeline_params(scenarios):
+
+    """
+    Inputs of `pipeline.simulate_batch`: the options the reference models (SAC, FGTS reducing the term, no index).
+    """
+
+    params = {name: scenarios[name].to_numpy() for name in PARAM_NAMES if name in scenarios}
+    params.update(amortization='sac', fgts_policy='reduce_term', mort_index=0.)
+
+    return as_scenarios(params, len(scenarios))
+
+def _reference_params(scenario):
+
+    """
+    Inputs of one scenario as the reference takes them (see the module docstring about fgts_frequency).
+    """
+
+    scenario = dict(scenario)
+
+    if scenario['fgts_frequency'] == 0:
+        scenario.update(fgts_frequency=1, fgts_amount=0.)
+
+    return scenario
+
+def _function_inputs(scenario):
+
+    """
+    Realistic inputs of the standalone core functions: rent and installments over the horizon.
+    """
+
+    mortgage = reference.calculate_mortgage_over_time(
+        scenario['total_amount'] - scenario['downpay_amount'],
+        scenario['n_months'],
+        scenario['mort_interest'],
+        scenario['fgts_frequency'],
+        scenario['fgts_amount']
+    )
+
+    horizon = max(scenario['time_horizon'], mortgage.shape[0])
+    monthly_appreciation = reference.convert_yearly_to_monthly_interest(scenario['rent_appreciation'])
+    rent = pd.Series(scenario['rent_amount'] * (1 + monthly_appreciation) ** np.arange(1, horizon + 1), name='rent')
+    installments = mortgage['mort_installment'].reindex(range(horizon)).fillna(0)
+
+    return rent, installments
+
+def _run_functions(module, scenario, rent, installments):
+
+    """
+    Outputs of the core functions of `module` (core or reference) for one scenario, keyed by (engine, column).
+    """
+
+    mortgage = module.calculate_mortgage_over_time(
+        scenario['total_amount'] - scenario['downpay_amount'],
+        scenario['n_months'],
+        scenario['mort_interest'],
+        scenario['fgts_frequency'],
+        scenario['fgts_amount']
+    )
+
+    outputs = {('mortgage', column): mortgage[column].to_numpy() for column in MORTGAGE_COLUMNS}
+    outputs['apply_interest_series', 'installments'] = (
+        module.apply_interest_series(installments, scenario['invest_interest']).to_numpy()
+    )
+    outputs['apply_inflation', 'rent'] = module.apply_inflation(rent, scenario['inflation']).to_numpy()
+    outputs['rent_reinvestment', 'passive_income'] = (
+        module.calculate_rent_reinvestment(rent, installments, scenario['invest_interest']).to_numpy()
+    )
+
+    return outputs
+
+def _reference_chunk(records):
+
+    """
+    Reference outputs of a list of scenarios: the core functions and the monthly total.
+    """
+
+    results = []
+
+    for record in records:
+
+        scenario = _reference_params(record)
+        rent, installments = _function_inputs(scenario)
+
+        outputs = _run_functions(reference, scenario, rent, installments)
+        outputs['total', 'total'] = reference.calculate_total(scenario).to_numpy()
+
+        results.append(outputs)
+
+    return results
+
+def run_reference(scenarios, n_workers=None):
+
+    """
+    Reference outputs of every scenario, spread over processes (the reference is slow).
+    """
+
+    records = scenarios.drop(columns='case').to_dict('records')
+    tasks = [records[start:start + CHUNK_SIZE] for start in range(0, len(records), CHUNK_SIZE)]
+
+    n_workers = min(n_workers or os.cpu_count() or 1, len(tasks))
+
+    if n_workers <= 1:
+        chunks = [_reference_chunk(task) for task in tasks]
+    else:
+        with ProcessPoolExecutor(n_workers) as executor:
+            chunks = list(executor.map(_reference_chunk, tasks))
+
+    return [outputs for chunk in chunks for outputs in chunk]
+
+def run_engines(scenarios, chunk_size=256):
+
+    """
+    Outputs of every fast engine for each scenario, keyed by (engine, column) like the reference.
+    """
+
+    records = scenarios.drop(columns='case').to_dict('records')
+    results = []
+
+    for record in records:
+
+        rent, installments = _function_inputs(_reference_params(record))
+        outputs = _run_functions(core, record, rent, installments)
+
+        graph_run = buy_vs_rent.run({**record, 'mortgage_value': record['total_amount'] - record['downpay_amount'],
+                                     'amortization': 'sac', 'fgts_policy': 'reduce_term', 'components': ()})
+        outputs['dag', 'total'] = np.asarray(graph_run['final_total'], dtype=float)
+
+        results.append(outputs)
+
+    # batched engines
+    params = _pipeline_params(scenarios)
+
+    mortgage = calculate_mortgage_batch(
+        params['total_amount'] - params['downpay_amount'],
+        params['n_months'],
+        params['mort_interest'],
+        params['fgts_frequency'],
+        params['fgts_amount']
+    )
+
+    for index, outputs in enumerate(results):
+        for column in MORTGAGE_COLUMNS:
+            outputs['mortgage_batch', column] = mortgage[column][index, :mortgage['n_rows'][index]]
+
+    for start in range(0, len(results), chunk_size):
+
+        chunk = {name: values[start:start + chunk_size] for name, values in params.items()}
+        result = simulate_batch(chunk)
+
+        for offset, horizon in enumerate(result['horizon']):
+            results[start + offset]['pipeline', 'total'] = result['total'][offset, :horizon]
+
+    scores = score(params)
+
+    for outputs, value in zip(results, scores):
+        outputs['scoring', 'final_total'] = np.array([value])
+
+    return results
+
+# engine outputs and the reference output they are compared to
+COMPARED = {
+    **{('mortgage', column): ('mortgage', column) for column in MORTGAGE_COLUMNS},
+    **{('mortgage_batch', column): ('mortgage', column) for column in MORTGAGE_COLUMNS},
+    ('apply_interest_series', 'installments'): ('apply_interest_series', 'installments'),
+    ('apply_inflation', 'rent'): ('apply_inflation', 'rent'),
+    ('rent_reinvestment', 'passive_income'): ('rent_reinvestment', 'passive_income'),
+    ('dag', 'total'): ('total', 'total'),
+    ('pipeline', 'total'): ('total', 'total'),
+    ('scoring', 'final_total'): ('total', 'total'),
+}
+
+def _errors(expected, actual, last_only=False):
+
+    """
+    Largest absolute error, error relative to the magnitude of `expected`, and that magnitude.
+
+    Series of different lengths (e.g. a mortgage stopping at another month)
+    count as an infinite error.
+    """
+
+    if last_only:
+        expected = expected[-1:]
+
+    if expected.shape != actual.shape:
+        return np.inf, np.inf, 0.
+
+    # NaN in only one of the two is an error, NaN in both is agreement
+    both_nan = np.isnan(expected) & np.isnan(actual)
+    error = np.where(both_nan, 0., np.abs(actual - expected))
+    error = np.where(np.isnan(error), np.inf, error)
+
+    max_error = error.max(initial=0.)
+    scale = max(np.nanmax(np.abs(expected), initial=0.), 1.)
+
+    return max_error, max_error / scale, scale
+
+def _max_deflation(scenarios, n_months):
+
+    """
+    Largest factor by which `reference.apply_inflation` scales a value of each scenario, over its months.
+    """
+
+    inflation = np.where(scenarios['use_inflation'], scenarios['inflation'], 0.)
+    return np.maximum((1 + inflation) ** (-np.asarray(n_months) / 12), 1.)
+
+def compare(expected, actual, scenarios, atol=TOLERANCE_ABS, rtol=1e-9):
+
+    """
+    Error report of the engines against the reference.
+
+    A scenario fails when its absolute error exceeds `atol` plus `rtol`
+    times the magnitude of the reference series. `atol` is in nominal
+    reais: results deflated by a negative inflation get it scaled up, as
+    the rounding of the reinvestment happens before deflation.
+
+    Returns:
+
+        report (pd.DataFrame): 'max_abs', 'max_rel', 'n_failed' and the
+            row and case of the worst scenario, per (engine, column)
+    """
+
+    rows = []
+    deflation = _max_deflation(scenarios, [outputs['total', 'total'].shape[0] for outputs in expected])
+
+    for (engine, column), reference_key in COMPARED.items():
+
+        errors = np.array([
+            _errors(reference_outputs[reference_key], engine_outputs[engine, column], engine == 'scoring')
+            for reference_outputs, engine_outputs in zip(expected, actual)
+        ])
+
+        absolute, relative, scale = errors.T
+        failed = absolute > atol * (deflation if reference_key == ('total', 'total') else 1.) + rtol * scale
+        worst = int(np.argmax(absolute))
+
+        rows.append({
+            'engine': engine,
+            'column': column,
+            'max_abs': absolute.max(),
+            'max_rel': relative.max(),
+            'n_failed': int(failed.sum()),
+            'worst_row': worst,
+            'worst_case': scenarios['case'].iloc[worst],
+        })
+
+    return pd.DataFrame(rows).set_index(['engine', 'column'])
+
+def main(argv=None):
+
+    parser = argparse.ArgumentParser(description='Compare the fast engines against the reference implementation.')
+    parser.add_argument('--scenarios', type=int, default=200, help='number of random scenarios (default: 200)')
+    parser.add_argument('--seed', type=int, default=0, help='seed of the random scenarios')
+    parser.add_argument('--max-months', type=int, default=None, help='cap on the mortgage terms and horizons')
+    parser.add_argument('--atol', type=float, default=TOLERANCE_ABS, help='allowed absolute error, in reais')
+    parser.add_argument('--rtol', type=float, default=1e-9, help='allowed error relative to the series magnitude')
+    parser.add_argument('--workers', type=int, default=None, help='processes running the reference')
+
+    args = parser.parse_args(argv)
+
+    scenarios = random_scenarios(args.scenarios, args.seed, args.max_months)
+    expected = run_reference(scenarios, args.workers)
+    actual = run_engines(scenarios)
+
+    report = compare(expected, actual, scenarios, args.atol, args.rtol)
+
+    with pd.option_context('display.float_format', '{:.3g}'.format):
+        print(report.to_string())
+
+    if report['n_failed'].any():
+        print(f'FAILED: {report["n_failed"].sum()} comparisons outside tolerance '
+              f'(seed {args.seed}, rows as in random_scenarios)', file=sys.stderr)
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
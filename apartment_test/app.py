@@ -1,17 +1,15 @@
-import numpy as np
+import os
+
 import pandas as pd
 import streamlit as st
-import plotly.express as px
-import plotly.graph_objects as go
-from plotly.subplots import make_subplots
-
-from core import (
-    convert_yearly_to_monthly_interest,
-    calculate_mortgage_over_time,
-    apply_interest_scalar,
-    apply_interest_series,
-    apply_inflation,
-    calculate_rent_reinvestment
+
+from dag import buy_vs_rent
+
+# memoized versions of the pipeline stages, shared across reruns and sessions
+from cache import (
+    cache_info,
+    cached_sensitivity_grid as sensitivity_grid,
+    cached_monte_carlo as run_monte_carlo,
 )
 
 from viz import (
@@ -24,6 +22,9 @@ from viz import (
     plot_rent_installment_diff,
     plot_rent_installment_diff_reinvest,
     plot_total,
+    plot_sensitivity_heatmap,
+    plot_monte_carlo,
+    plot_tornado,
 )
 
 from interface import (
@@ -35,144 +36,201 @@ from interface import (
     display_investments_section,
     display_rent_section,
     display_rent_reinvestment_option,
+    display_additional_costs_option,
     display_final_results_section,
-    display_conclusion
+    display_conclusion,
+    display_sensitivity_section,
+    display_monte_carlo_section,
+    display_monte_carlo_conclusion,
+    display_break_even_section,
+    display_break_even_result,
+    display_tornado_section,
+    display_tornado_conclusion,
+    display_profiling_option,
+    display_profile_panel
 )
 
-# constants #
-FGTS_INTEREST = 3./100
+from solver import solve_break_even
+from dual import tornado
+from store import open_store
+import profiling
 
-# header #
-display_header()
+# optional store of precomputed scenarios (APARTMENT_RESULT_STORE env var)
+result_store = open_store()
 
-# basic info section #
-total_amount, downpay_amount, downpay_fgts_amount, home_appreciation, inflation, time_horizon = display_basic_info_section()
+# opt-in instrumentation of this rerun (sidebar option or APARTMENT_PROFILE env var) #
+is_profiling = display_profiling_option() or bool(os.environ.get('APARTMENT_PROFILE'))
+
+# the profile stops even when the rerun is cut short (st.stop, rerun, exception)
+with profiling.session(is_profiling) as profile:
 
-# how to use the tool section #
-display_tutorial_section()
-plot_example()
+    # header #
+    display_header()
 
-# mortgage section #
-mortgage_value, n_months, mort_interest = display_mortage_section_basic_info(total_amount, downpay_amount)
-fgts_amount, fgts_frequency = display_mortage_section_fgts_info(downpay_amount, mortgage_value)
+    # basic info section #
+    total_amount, downpay_amount, downpay_fgts_amount, home_appreciation, inflation, time_horizon = display_basic_info_section()
 
-# calculating mortgage cash flow
-mortgage_df = calculate_mortgage_over_time(
-    mortgage_value,
-    n_months,
-    mort_interest,
-    fgts_frequency,
-    fgts_amount
-)
+    # how to use the tool section #
+    display_tutorial_section()
+    plot_example()
 
-# time horizon is at least the time of the mortgage
-time_horizon = max(
-    time_horizon,
-    mortgage_df.shape[0]
-)
+    # mortgage section #
+    mortgage_value, n_months, mort_interest, amortization = display_mortage_section_basic_info(total_amount, downpay_amount)
+    fgts_amount, fgts_frequency, fgts_policy = display_mortage_section_fgts_info(downpay_amount, mortgage_value)
+
+    # the computation runs as a graph of cached stages: a widget change only
+    # re-executes the stages downstream of the inputs that changed
+    run = buy_vs_rent.run({
+        'total_amount': total_amount,
+        'downpay_amount': downpay_amount,
+        'downpay_fgts_amount': downpay_fgts_amount,
+        'home_appreciation': home_appreciation,
+        'inflation': inflation,
+        'time_horizon': time_horizon,
+        'mortgage_value': mortgage_value,
+        'n_months': n_months,
+        'mort_interest': mort_interest,
+        'fgts_amount': fgts_amount,
+        'fgts_frequency': fgts_frequency,
+        'amortization': amortization,
+        'fgts_policy': fgts_policy,
+    })
 
-# calculating home appreciation
-home_value = apply_interest_scalar(
-    total_amount, 
-    home_appreciation,
-    time_horizon,
-    'home_value'
-)
+    # stages work on arrays; plots get pandas objects
+    cash_flow = run['cash_flow'].to_frame()
 
-# joining everything into cash flow df
-cash_flow = (
-    pd.concat([mortgage_df, home_value], axis=1)
-    .assign(downpayment=[downpay_amount] + [0]*(home_value.shape[0] - 1))
-    .assign(mort_installment = lambda x: x.mort_installment.fillna(0))
-    .assign(mort_amount_interest = lambda x: x.mort_amount_interest.fillna(0))
-    .assign(mort_fgts_paid = lambda x: x.mort_fgts_paid.fillna(0))
-    .fillna(method='ffill')
-    .assign(estate = lambda x: x.home_value - x.mort_balance)
-)
+    # show installments?
+    if st.checkbox('Mostrar valor das parcelas?'):
+        plot_installment(cash_flow)
 
-# show installments?
-if st.checkbox('Mostrar valor das parcelas?'):
-    plot_installment(cash_flow)
+    plot_total_amount_mortgage(cash_flow)
+    plot_home_value(cash_flow)
 
-plot_total_amount_mortgage(cash_flow)
-plot_home_value(cash_flow)
+    # passive income section #
+    invest_interest = display_investments_section()
 
-# passive income section #
-invest_interest = display_investments_section()
+    run.update(invest_interest=invest_interest)
+    downpay_and_amort_passive_income = pd.Series(run['downpay_and_amort_passive_income'])
 
-downpay_interest = apply_interest_scalar(
-     downpay_amount - downpay_fgts_amount, 
-     invest_interest,
-     cash_flow.shape[0],
-     'downpay_interest'
-)
+    plot_interest_downpay_fgts(downpay_and_amort_passive_income)
 
-downpay_fgts_interest = apply_interest_scalar(
-     downpay_fgts_amount, 
-     FGTS_INTEREST,
-     cash_flow.shape[0],
-     'downpay_fgts_interest'
-)
+    # rent section #
+    rent_amount, rent_appreciation = display_rent_section()
 
-fgts_amort_interest = (
-    apply_interest_series(cash_flow['mort_fgts_paid'], FGTS_INTEREST) - 
-    cash_flow['mort_fgts_paid'].cumsum()
-)
+    run.update(rent_amount=rent_amount, rent_appreciation=rent_appreciation)
+    rent_over_time = pd.Series(run['rent'], name='rent')
 
-downpay_and_amort_passive_income = (
-    downpay_interest +
-    downpay_fgts_interest +
-    fgts_amort_interest - 
-    downpay_amount
-)
+    plot_rent_economy(rent_over_time)
 
-plot_interest_downpay_fgts(downpay_and_amort_passive_income)
+    is_reinvestment = display_rent_reinvestment_option()
+    run.update(is_reinvestment=is_reinvestment)
 
-# rent section #
-rent_amount, rent_appreciation = display_rent_section()
+    if is_reinvestment:
+        plot_rent_installment_diff_reinvest(pd.Series(run['rent_reinvestment']))
 
-# calculating rent appreciation
-rent_over_time = apply_interest_scalar(
-    rent_amount, 
-    rent_appreciation,
-    time_horizon,
-    'rent'
-)
- 
-plot_rent_economy(rent_over_time)
-
-is_reinvestment = display_rent_reinvestment_option()
-
-if is_reinvestment:
-    rent_reinvestment_passive_income = calculate_rent_reinvestment(
-        rent_over_time,
-        cash_flow['mort_installment'],
-        invest_interest
-    )
-    
-    plot_rent_installment_diff_reinvest(rent_reinvestment_passive_income)
-
-else:
-    rent_reinvestment_passive_income = 0
-
-# final results section #
-
-# making final calculations
-total = (
-    rent_over_time.cumsum() +
-    rent_reinvestment_passive_income +
-    cash_flow['estate'] -
-    downpay_and_amort_passive_income -
-    cash_flow['mort_fgts_paid'].cumsum() -
-    cash_flow['downpayment'].cumsum() -
-    cash_flow['mort_installment'].cumsum()
-)
+    components = display_additional_costs_option()
+    run.update(components=components)
+
+    # final results section #
+
+    use_inflation = display_final_results_section()
+    run.update(use_inflation=use_inflation)
+
+    total = pd.Series(run['final_total'])
+
+    plot_total(total)
+
+    display_conclusion(total)
+
+    # inputs of the vectorized pipeline, the additional costs go next to them as `components` #
+    base_params = {
+        'total_amount': total_amount,
+        'downpay_amount': downpay_amount,
+        'downpay_fgts_amount': downpay_fgts_amount,
+        'home_appreciation': home_appreciation,
+        'inflation': inflation,
+        'time_horizon': time_horizon,
+        'n_months': n_months,
+        'mort_interest': mort_interest,
+        'fgts_amount': fgts_amount,
+        'fgts_frequency': fgts_frequency,
+        'amortization': amortization,
+        'fgts_policy': fgts_policy,
+        'invest_interest': invest_interest,
+        'rent_amount': rent_amount,
+        'rent_appreciation': rent_appreciation,
+        'is_reinvestment': is_reinvestment,
+        'use_inflation': use_inflation,
+    }
+
+    # sensitivity section #
+    is_sensitivity, x_axis, y_axis = display_sensitivity_section()
+
+    if is_sensitivity:
+
+        x_name, x_label, x_values, x_scale = x_axis
+        y_name, y_label, y_values, y_scale = y_axis
+
+        with profiling.stage('sensitivity_grid'):
+            totals = sensitivity_grid(
+                x_name,
+                x_values * x_scale,
+                y_name,
+                y_values * y_scale,
+                base_params,
+                store=result_store,
+                components=components
+            )
+
+        plot_sensitivity_heatmap(x_values, y_values, totals, x_label, y_label)
+
+    # monte carlo section #
+    is_monte_carlo, process, volatilities, n_paths = display_monte_carlo_section()
+
+    if is_monte_carlo:
+
+        specs = {
+            name: {'process': process, 'mean': base_params[name], 'volatility': volatility}
+            for name, volatility in volatilities.items()
+        }
+
+        with profiling.stage('run_monte_carlo'):
+            monte_carlo = run_monte_carlo(base_params, specs, n_paths, components=components)
+
+        plot_monte_carlo(monte_carlo['quantiles'])
+        display_monte_carlo_conclusion(monte_carlo['prob_buy_wins'][-1], monte_carlo['n_dropped'])
+
+    # break-even section #
+    is_break_even, break_even_param = display_break_even_section()
+
+    if is_break_even:
+
+        name, label, min_value, max_value, scale = break_even_param
+
+        with profiling.stage('solve_break_even'):
+            break_even = solve_break_even(name, min_value * scale, max_value * scale, base_params, components=components)[0]
+        display_break_even_result(label, break_even / scale)
+
+    # tornado section #
+    is_tornado, tornado_labels = display_tornado_section()
+
+    if is_tornado:
+
+        with profiling.stage('tornado'):
+            impacts = tornado(base_params, components=components)
 
-use_inflation = display_final_results_section()
+        plot_tornado(impacts, tornado_labels)
+        display_tornado_conclusion(impacts, tornado_labels)
 
-if use_inflation:
-    total = apply_inflation(total, inflation)
+# instrumentation results #
+if profile is not None:
 
-plot_total(total)
+    display_profile_panel(profile, run.trace)
 
-display_conclusion(total)
\ No newline at end of file
+    # structured log, one JSON line per rerun
+    if os.environ.get('APARTMENT_PROFILE_LOG'):
+        profile.log(
+            os.environ['APARTMENT_PROFILE_LOG'],
+            stage_runs=[stage_run._asdict() for stage_run in run.trace],
+            caches={name: info._asdict() for name, info in cache_info().items()}
+        )
@@ -0,0 +1,162 @@
+"""
+Historical backtest of the buy-vs-rent simulation over rolling purchase dates.
+
+Replays the model against monthly series loaded from a local CSV: every
+month of the history is a possible purchase date, and the outcome of buying
+then is simulated with the rates that actually followed. All windows run
+as scenarios of one vectorized `pipeline.simulate_batch` call, with the
+rates of each window taken as a sliding window of the history.
+
+The CSV has a 'date' column plus any of the columns of `HISTORY_COLUMNS`
+(missing ones keep the fixed rate of the inputs):
+
+    home_price      property price index (e.g. FipeZap), any base
+    rent_price      rent index (e.g. IVAR or FipeZap rent), any base
+    ipca            monthly inflation, in % (as published by IBGE)
+    cdi             yearly CDI or SELIC rate, in % (as published by the central bank)
+    mortgage_rate   yearly mortgage rate of new loans, in %, fixed for
+                    the whole loan at the purchase date
+
+Usage:
+
+    python backtest.py history.csv --horizon 120 --start 2000-01
+"""
+
+import argparse
+
+import numpy as np
+import pandas as pd
+
+from core import convert_yearly_to_monthly_interest
+from montecarlo import DEFAULT_QUANTILES
+from pipeline import DEFAULT_PARAMS, as_scenarios, simulate_batch
+
+# CSV column: (input of the pipeline, how the column is quoted)
+HISTORY_COLUMNS = {
+    'home_price': ('home_appreciation', 'index'),
+    'rent_price': ('rent_appreciation', 'index'),
+    'ipca': ('inflation', 'monthly_pct'),
+    'cdi': ('invest_interest', 'yearly_pct'),
+    'mortgage_rate': ('mort_interest', 'yearly_pct'),
+}
+
+def load_history(path, columns=HISTORY_COLUMNS):
+
+    """
+    Monthly rates of a historical CSV (see the module docstring).
+
+    Index columns become the monthly variation up to the next month, and
+    percentages become monthly rates, except the mortgage rate which stays
+    yearly (it is fixed at the purchase date). Rows of the returned
+    pd.DataFrame are months and its columns are inputs of the pipeline.
+    """
+
+    raw = pd.read_csv(path, parse_dates=['date']).sort_values('date').set_index('date')
+    history = pd.DataFrame(index=raw.index)
+
+    for column, (name, quote) in columns.items():
+
+        if column not in raw:
+            continue
+
+        if quote == 'index':
+            history[name] = raw[column].shift(-1) / raw[column] - 1
+        elif quote == 'monthly_pct':
+            history[name] = raw[column] / 100
+        elif name == 'mort_interest':
+            history[name] = raw[column] / 100
+        else:
+            history[name] = convert_yearly_to_monthly_interest(raw[column] / 100)
+
+    # the last index value has no following month
+    return history.dropna()
+
+def run_backtest(history, params=None, horizon=120, start=None, end=None, quantiles=DEFAULT_QUANTILES):
+
+    """
+    Buy-vs-rent result of buying at every month of a history, after `horizon` months.
+
+    Prices and rents of `params` are the ones at each purchase date and
+    follow the historical indexes afterwards. Months the mortgage still
+    needs past the end of the history repeat its last rates; they don't
+    change the result at the horizon.
+
+    Args:
+        history (pd.DataFrame): monthly rates, see `load_history`
+        params (dict): remaining inputs, keyed as in `pipeline.PARAM_NAMES`
+        horizon (int): months between the purchase and the evaluation of the result
+        start (str): first purchase date, defaults to the start of the history
+        end (str): last purchase date, defaults to the last one with `horizon` months of history
+        quantiles (tuple): quantiles of the result to compute at each month
+
+    Returns:
+
+        results (dict): 'windows' (pd.DataFrame with the result and whether
+            buying won for each purchase date), 'share_buy_wins' at the
+            horizon, and per-month 'quantiles', 'mean' and 'prob_buy_wins'
+            across purchase dates, as in `montecarlo.run_monte_carlo`
+    """
+
+    params = {**dict(params or {}), 'time_horizon': horizon}
+    n_windows = history.shape[0] - horizon + 1
+
+    if n_windows < 1:
+        raise ValueError(f'the history has {history.shape[0]} months, {horizon} are needed')
+
+    dates = history.index[:n_windows]
+    selected = np.flatnonzero(
+        (dates >= pd.Timestamp(start or dates[0])) & (dates <= pd.Timestamp(end or dates[-1]))
+    )
+
+    if selected.size == 0:
+        raise ValueError(f'no purchase date between {start} and {end}')
+
+    merged = {**DEFAULT_PARAMS, **params}
+    n_months = max(horizon, int(np.max(merged['n_months'])) + 1)
+
+    rate_paths = {}
+
+    for name in history.columns:
+
+        rates = history[name].to_numpy()
+
+        if name == 'mort_interest':
+            params[name] = rates[selected]
+            continue
+
+        # the window of each selected start, over the history extended with its last rate
+        padded = np.concatenate([rates, np.full(n_months, rates[-1])])
+        rate_paths[name] = padded[selected[:, None] + np.arange(n_months)]
+
+    scenarios = as_scenarios(params, selected.size)
+    total = simulate_batch(scenarios, rate_paths)['total'][:, :horizon]
+
+    windows = pd.DataFrame({'final_total': total[:, -1], 'buy_wins': total[:, -1] > 0}, index=dates[selected])
+
+    return {
+        'windows': windows,
+        'share_buy_wins': windows['buy_wins'].mean(),
+        'quantiles': {quantile: np.quantile(total, quantile, axis=0) for quantile in quantiles},
+        'mean': total.mean(axis=0),
+        'prob_buy_wins': (total > 0).mean(axis=0),
+    }
+
+def main(argv=None):
+
+    parser = argparse.ArgumentParser(description='Backtest the buy-vs-rent simulation over historical purchase dates.')
+    parser.add_argument('history', help='CSV of monthly historical series (see backtest.py)')
+    parser.add_argument('--horizon', type=int, default=120, help='months until the result is evaluated')
+    parser.add_argument('--start', default=None, help='first purchase date, e.g. 2000-01')
+    parser.add_argument('--end', default=None, help='last purchase date')
+
+    args = parser.parse_args(argv)
+
+    results = run_backtest(load_history(args.history), horizon=args.horizon, start=args.start, end=args.end)
+    windows = results['windows']
+
+    print(f'{len(windows)} purchase dates, from {windows.index[0]:%Y-%m} to {windows.index[-1]:%Y-%m}')
+    print(f'buying won in {results["share_buy_wins"]:.1%} of them')
+    print(windows['final_total'].describe(percentiles=DEFAULT_QUANTILES).round(0).to_string())
+
+if __name__ == '__main__':
+    main()
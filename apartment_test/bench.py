@@ -0,0 +1,302 @@
+"""
+Benchmark suite for the core functions and the end-to-end computation.
+
+Each case is timed over repeated calls (best and median wall time per
+call), then run once more under tracemalloc to record peak memory and the
+number of memory blocks the call allocated and left alive (its result and
+anything it cached). Results can be saved as a baseline and later compared
+against it, failing when a case regresses past a threshold. The quick suite
+baseline of the reference machine is bench_baseline.json.
+
+Usage:
+
+    python bench.py --save bench_baseline.json
+    python bench.py --compare bench_baseline.json --threshold 0.25
+    python bench.py --full --scenarios scenarios.csv
+"""
+
+import argparse
+import json
+import platform
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+from core import (
+    calculate_mortgage_over_time,
+    calculate_mortgage_batch,
+    apply_interest_series,
+    apply_inflation,
+    calculate_rent_reinvestment,
+)
+from pipeline import PARAM_NAMES, final_totals
+from cache import clear_caches
+from dag import buy_vs_rent
+
+QUICK_HORIZONS = (5, 20, 40)
+FULL_HORIZONS = (5, 10, 20, 30, 40)
+
+QUICK_BATCH_SIZES = (1, 100, 10000)
+FULL_BATCH_SIZES = (1, 10, 100, 1000, 10000, 100000)
+
+# bounds the memory of the mortgage cases, whose arrays are (scenarios x months)
+MORTGAGE_CHUNK_SIZE = 2000
+
+# metrics compared against the baseline
+COMPARED_METRICS = ('best_seconds', 'peak_bytes')
+
+def random_scenarios(n_scenarios, seed=0):
+
+    """
+    Plausible scenarios spread over the ranges offered by interface.py.
+    """
+
+    rng = np.random.default_rng(seed)
+    total_amount = rng.uniform(200e3, 3e6, n_scenarios)
+    downpay_amount = total_amount * rng.uniform(0.1, 0.5, n_scenarios)
+
+    return pd.DataFrame({
+        'total_amount': total_amount,
+        'downpay_amount': downpay_amount,
+        'home_appreciation': rng.uniform(-0.02, 0.06, n_scenarios),
+        'inflation': rng.uniform(0.02, 0.08, n_scenarios),
+        'time_horizon': rng.integers(5, 41, n_scenarios) * 12,
+        'n_months': rng.integers(20, 121, n_scenarios) * 3,
+        'mort_interest': rng.uniform(0.05, 0.12, n_scenarios),
+        'fgts_amount': np.where(rng.random(n_scenarios) < 0.5, 0., rng.uniform(0, 50e3, n_scenarios)),
+        'fgts_frequency': rng.integers(1, 6, n_scenarios) * 2,
+        'invest_interest': rng.uniform(0.0, 0.12, n_scenarios),
+        'rent_amount': total_amount * rng.uniform(0.003, 0.006, n_scenarios),
+        'rent_appreciation': rng.uniform(0.0, 0.08, n_scenarios),
+    })
+
+def sample_scenarios(scenarios, n_scenarios):
+
+    """
+    First `n_scenarios` rows of a scenario table, cycled if it is shorter.
+    """
+
+    index = np.arange(n_scenarios) % len(scenarios)
+    return {
+        name: scenarios[name].to_numpy()[index]
+        for name in PARAM_NAMES if name in scenarios
+    }
+
+def build_cases(horizons, batch_sizes, scenarios):
+
+    """
+    Benchmark cases as (name, func) pairs of argument-free callables.
+    """
+
+    cases = []
+    rng = np.random.default_rng(0)
+
+    for years in horizons:
+
+        n_months = 12 * years
+        values = pd.Series(rng.normal(0, 1000, n_months))
+        installments = pd.Series(rng.uniform(2000, 8000, n_months))
+
+        cases += [
+            (f'apply_interest_series[{years}y]', lambda values=values: apply_interest_series(values, 0.05)),
+            (f'apply_inflation[{years}y]', lambda values=values: apply_inflation(values, 0.04)),
+            (f'calculate_rent_reinvestment[{years}y]',
+             lambda values=values, installments=installments: calculate_rent_reinvestment(values + 5000, installments, 0.05)),
+            (f'calculate_mortgage_over_time[{years}y]',
+             lambda n_months=n_months: calculate_mortgage_over_time(800e3, n_months, 0.08, 2, 10e3)),
+            (f'app_pipeline[{years}y]', lambda n_months=n_months: _run_app_pipeline(n_months)),
+        ]
+
+    for batch_size in batch_sizes:
+
+        params = sample_scenarios(scenarios, batch_size)
+
+        cases += [
+            (f'calculate_mortgage_batch[{batch_size}]', lambda params=params: _run_mortgage_batch(params)),
+            (f'final_totals[{batch_size}]', lambda params=params: final_totals(params)),
+        ]
+
+    return cases
+
+def _run_mortgage_batch(params, chunk_size=MORTGAGE_CHUNK_SIZE):
+
+    """
+    Batched mortgage engine over bounded-size chunks, as the pipeline calls it.
+    """
+
+    n_scenarios = len(params['total_amount'])
+
+    for start in range(0, n_scenarios, chunk_size):
+        chunk = {name: values[start:start + chunk_size] for name, values in params.items()}
+        calculate_mortgage_batch(
+            chunk['total_amount'] - chunk['downpay_amount'],
+            chunk['n_months'],
+            chunk['mort_interest'],
+            chunk['fgts_frequency'],
+            chunk['fgts_amount'],
+        )
+
+def _run_app_pipeline(n_months):
+
+    """
+    Full app.py computation from cold caches, as on a first render.
+    """
+
+    clear_caches()
+
+    run = buy_vs_rent.run({
+        'total_amount': 1000e3,
+        'downpay_amount': 200e3,
+        'downpay_fgts_amount': 0.,
+        'home_appreciation': 0.02,
+        'inflation': 0.02,
+        'time_horizon': n_months,
+        'mortgage_value': 800e3,
+        'n_months': min(n_months, 360),
+        'mort_interest': 0.073,
+        'fgts_amount': 10e3,
+        'fgts_frequency': 2,
+        'amortization': 'sac',
+        'fgts_policy': 'reduce_term',
+        'invest_interest': 0.03,
+        'rent_amount': 5000.,
+        'rent_appreciation': 0.02,
+        'is_reinvestment': True,
+        'use_inflation': True,
+        'components': (),
+    })
+
+    return run['final_total']
+
+def _allocated_blocks(before, after):
+
+    """
+    Memory blocks allocated between two snapshots and still alive in the second one.
+
+    Differences are taken per source line and only the positive ones are
+    added up, so blocks freed on one line don't cancel blocks allocated on
+    another.
+    """
+
+    ignored = [tracemalloc.Filter(False, tracemalloc.__file__)]
+    before, after = before.filter_traces(ignored), after.filter_traces(ignored)
+
+    return sum(max(stat.count_diff, 0) for stat in after.compare_to(before, 'lineno'))
+
+def measure(func, min_seconds=0.2, max_repeats=1000):
+
+    """
+    Wall time per call, peak memory and memory blocks allocated by one call.
+    """
+
+    # warm up (imports, caches of numpy/pandas internals)
+    func()
+
+    timings = []
+    start = time.perf_counter()
+
+    while len(timings) < max_repeats and (len(timings) < 3 or time.perf_counter() - start < min_seconds):
+        call_start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - call_start)
+
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    tracemalloc.reset_peak()
+
+    # the result is still alive when the second snapshot is taken
+    result = func()
+
+    _, peak_bytes = tracemalloc.get_traced_memory()
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    del result
+
+    return {
+        'best_seconds': min(timings),
+        'median_seconds': float(np.median(timings)),
+        'repeats': len(timings),
+        'peak_bytes': peak_bytes,
+        'allocated_blocks': _allocated_blocks(before, after),
+    }
+
+def run_benchmarks(cases, stream=sys.stdout):
+
+    results = {}
+
+    for name, func in cases:
+        results[name] = measure(func)
+        stats = results[name]
+        print(
+            f'{name:45s} best {1e3 * stats["best_seconds"]:10.3f} ms   '
+            f'median {1e3 * stats["median_seconds"]:10.3f} ms   '
+            f'peak {stats["peak_bytes"] / 2**20:9.2f} MiB   '
+            f'blocks {stats["allocated_blocks"]:8d}',
+            file=stream
+        )
+
+    return results
+
+def compare(results, baseline, threshold):
+
+    """
+    Regressions of more than `threshold` (relative) against a saved baseline.
+    """
+
+    regressions = []
+
+    for name, stats in results.items():
+
+        if name not in baseline:
+            continue
+
+        for metric in COMPARED_METRICS:
+
+            reference = baseline[name][metric]
+            if reference > 0 and stats[metric] > reference * (1 + threshold):
+                regressions.append((name, metric, reference, stats[metric]))
+
+    return regressions
+
+def main(argv=None):
+
+    parser = argparse.ArgumentParser(description='Benchmark the buy-vs-rent computation.')
+    parser.add_argument('--full', action='store_true', help='every horizon from 5 to 40 years and batches up to 100k')
+    parser.add_argument('--scenarios', help='CSV of scenarios used for the batch cases (default: random scenarios)')
+    parser.add_argument('--filter', default='', help='only run cases whose name contains this text')
+    parser.add_argument('--save', help='write the results to this JSON file')
+    parser.add_argument('--compare', help='baseline JSON file to compare against')
+    parser.add_argument('--threshold', type=float, default=0.25, help='allowed relative regression (default: 0.25)')
+
+    args = parser.parse_args(argv)
+
+    horizons = FULL_HORIZONS if args.full else QUICK_HORIZONS
+    batch_sizes = FULL_BATCH_SIZES if args.full else QUICK_BATCH_SIZES
+    scenarios = pd.read_csv(args.scenarios) if args.scenarios else random_scenarios(max(batch_sizes))
+
+    cases = [(name, func) for name, func in build_cases(horizons, batch_sizes, scenarios) if args.filter in name]
+    results = run_benchmarks(cases)
+
+    if args.save:
+        with open(args.save, 'w') as file:
+            json.dump({'python': platform.python_version(), 'numpy': np.__version__,
+                       'pandas': pd.__version__, 'results': results}, file, indent=2)
+
+    if args.compare:
+
+        with open(args.compare) as file:
+            baseline = json.load(file)['results']
+
+        regressions = compare(results, baseline, args.threshold)
+
+        for name, metric, reference, value in regressions:
+            print(f'REGRESSION {name} {metric}: {reference:.6g} -> {value:.6g}', file=sys.stderr)
+
+        if regressions:
+            sys.exit(1)
+
+if __name__ == '__main__':
+    main()
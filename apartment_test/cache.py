@@ -0,0 +1,229 @@
+import hashlib
+import sys
+import threading
+from collections import OrderedDict, namedtuple
+from functools import wraps
+
+import numpy as np
+import pandas as pd
+
+from core import growth_table
+from sweep import sensitivity_grid
+from montecarlo import run_monte_carlo
+
+CacheInfo = namedtuple('CacheInfo', ['hits', 'misses', 'size', 'maxsize', 'nbytes', 'max_bytes'])
+
+# every memoized function, so their counters can be reported together
+_registry = {}
+
+def _digest(array):
+    return hashlib.blake2b(np.ascontiguousarray(array).view(np.uint8), digest_size=16).hexdigest()
+
+def make_key(value):
+
+    """
+    Hashable key of a numeric input: scalars, strings, arrays, pandas objects and containers of them.
+    """
+
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return value
+
+    if isinstance(value, np.generic):
+        return value.item()
+
+    if isinstance(value, np.ndarray):
+        if value.dtype == object:
+            raise TypeError('object arrays are not supported')
+        return ('ndarray', value.dtype.str, value.shape, _digest(value))
+
+    if isinstance(value, pd.Series):
+        return ('series', value.name, make_key(value.to_numpy()), make_key(value.index.to_numpy()))
+
+    if isinstance(value, pd.DataFrame):
+        columns = tuple((column, make_key(value[column].to_numpy())) for column in value.columns)
+        return ('frame', columns, make_key(value.index.to_numpy()))
+
+    if isinstance(value, (tuple, list)):
+        return (type(value).__name__, tuple(make_key(item) for item in value))
+
+    if isinstance(value, dict):
+        return ('dict', tuple(sorted((key, make_key(item)) for key, item in value.items())))
+
+    raise TypeError(f'unsupported cache key type: {type(value).__name__}')
+
+def _nbytes(value):
+
+    """
+    Approximate memory used by a cached result.
+    """
+
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+
+    if isinstance(value, (pd.Series, pd.DataFrame)):
+        return int(np.sum(value.memory_usage(index=True)))
+
+    if isinstance(value, dict):
+        return sum(_nbytes(item) for item in value.values())
+
+    if isinstance(value, (tuple, list)):
+        return sum(_nbytes(item) for item in value)
+
+    return sys.getsizeof(value)
+
+def _copy(value):
+
+    """
+    Copy mutable results so callers can never modify a cached value.
+    """
+
+    if isinstance(value, (np.ndarray, pd.Series, pd.DataFrame)):
+        return value.copy()
+
+    if isinstance(value, dict):
+        return {key: _copy(item) for key, item in value.items()}
+
+    return value
+
+class LRUCache:
+
+    """
+    Thread-safe least-recently-used cache bounded by entry count and bytes.
+    """
+
+    def __init__(self, maxsize=128, max_bytes=None):
+
+        self.maxsize = maxsize
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.nbytes = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+
+        """
+        Return (found, value), marking the entry as recently used.
+        """
+
+        with self._lock:
+
+            if key in self._data:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return True, self._data[key][0]
+
+            self.misses += 1
+            return False, None
+
+    def put(self, key, value):
+
+        """
+        Store a value, evicting least recently used entries past the limits.
+        """
+
+        size = _nbytes(value)
+
+        with self._lock:
+
+            if key in self._data:
+                self.nbytes -= self._data.pop(key)[1]
+
+            self._data[key] = (value, size)
+            self.nbytes += size
+
+            while self._data and (
+                len(self._data) > self.maxsize or
+                (self.max_bytes is not None and self.nbytes > self.max_bytes)
+            ):
+                _, (_, evicted_size) = self._data.popitem(last=False)
+                self.nbytes -= evicted_size
+
+    def clear(self):
+
+        with self._lock:
+            self._data.clear()
+            self.hits = 0
+            self.misses = 0
+            self.nbytes = 0
+
+    def info(self):
+
+        with self._lock:
+            return CacheInfo(self.hits, self.misses, len(self._data), self.maxsize, self.nbytes, self.max_bytes)
+
+def memoize(maxsize=128, max_bytes=None, name=None):
+
+    """
+    Memoize a function on its (numeric) arguments with a shared LRU cache.
+
+    Results are copied on the way in and out, so a cache entry can safely be
+    shared across Streamlit sessions and threads. Calls with arguments that
+    can't be turned into a key bypass the cache.
+
+    Args:
+        maxsize (int): maximum number of cached results
+        max_bytes (int): optional limit on the memory used by cached results
+        name (str): name reported by `cache_info`, defaults to the function name
+
+    Returns:
+
+        decorator (callable): decorator adding `cache` and `cache_info` to the function
+    """
+
+    def decorator(func):
+
+        cache = LRUCache(maxsize, max_bytes)
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+
+            try:
+                key = (make_key(args), make_key(kwargs))
+            except TypeError:
+                return func(*args, **kwargs)
+
+            found, value = cache.get(key)
+
+            if not found:
+                value = func(*args, **kwargs)
+                cache.put(key, _copy(value))
+
+            return _copy(value)
+
+        wrapper.cache = cache
+        wrapper.cache_info = cache.info
+        register_cache(name or func.__name__, cache)
+
+        return wrapper
+
+    return decorator
+
+def register_cache(name, cache):
+
+    """
+    Report an `LRUCache` created outside `memoize` in `cache_info`.
+    """
+
+    _registry[name] = cache
+
+def cache_info():
+
+    """
+    Hit/miss counters and sizes of every memoized function, keyed by name.
+    """
+
+    return {name: cache.info() for name, cache in _registry.items()}
+
+def clear_caches():
+
+    for cache in _registry.values():
+        cache.clear()
+
+# growth factors shared by every interest application (see core.GrowthTable)
+register_cache('growth_table', growth_table)
+
+# memoized pipeline stages, shared by every session of the app
+cached_sensitivity_grid = memoize(maxsize=16, name='sensitivity_grid')(sensitivity_grid)
+cached_monte_carlo = memoize(maxsize=16, name='run_monte_carlo')(run_monte_carlo)
@@ -0,0 +1,106 @@
+import numpy as np
+import pandas as pd
+
+class CashFlow:
+
+    """
+    Monthly cash flow of buying with a mortgage, as aligned NumPy arrays.
+
+    Replaces the concat/fillna/ffill DataFrame chain: every column is
+    preallocated over the whole horizon and filled once, installments and
+    FGTS payments are zero after the mortgage ends and the balance is
+    carried forward. `estate` and cumulative sums are derived on first use
+    and kept, and `to_frame` converts to pandas only where plots need it.
+    Instances are shared through the stage caches, so treat them as read-only.
+    """
+
+    # mortgage columns that are zero once the mortgage is paid off
+    FILLED = ('mort_amount_interest', 'mort_installment', 'mort_fgts_paid')
+
+    # mortgage columns that keep their last value once the mortgage is paid off
+    CARRIED = ('mort_balance', 'mort_amount_paid')
+
+    COLUMNS = CARRIED + FILLED + ('home_value', 'downpayment', 'estate')
+
+    __slots__ = (
+        'n_months',
+        'mort_balance',
+        'mort_amount_paid',
+        'mort_amount_interest',
+        'mort_installment',
+        'mort_fgts_paid',
+        'home_value',
+        'downpayment',
+        '_estate',
+        '_cumsums',
+        '_frame',
+    )
+
+    def __init__(self, mortgage, home_value, downpay_amount):
+
+        """
+        Args:
+            mortgage (dict): 1-D mortgage arrays of one scenario, keyed as the
+                columns of `core.calculate_mortgage_over_time`
+            home_value (array-like): home value at each month of the horizon,
+                at least as long as the mortgage
+            downpay_amount (float): downpayment, paid at month zero
+        """
+
+        self.home_value = np.asarray(home_value, dtype=float)
+        self.n_months = self.home_value.shape[0]
+
+        for name in self.FILLED:
+            values = np.zeros(self.n_months)
+            values[:mortgage[name].shape[0]] = mortgage[name]
+            setattr(self, name, values)
+
+        for name in self.CARRIED:
+            values = np.empty(self.n_months)
+            values[:mortgage[name].shape[0]] = mortgage[name]
+            values[mortgage[name].shape[0]:] = mortgage[name][-1]
+            setattr(self, name, values)
+
+        self.downpayment = np.zeros(self.n_months)
+        self.downpayment[0] = downpay_amount
+
+        self._estate = None
+        self._cumsums = {}
+        self._frame = None
+
+    def __len__(self):
+        return self.n_months
+
+    @property
+    def estate(self):
+
+        """
+        Home value minus mortgage balance.
+        """
+
+        if self._estate is None:
+            self._estate = self.home_value - self.mort_balance
+
+        return self._estate
+
+    def cumsum(self, name):
+
+        """
+        Cumulative sum of a column, computed once.
+        """
+
+        if name not in self._cumsums:
+            self._cumsums[name] = np.cumsum(getattr(self, name))
+
+        return self._cumsums[name]
+
+    def to_frame(self):
+
+        """
+        Columns as a pd.DataFrame indexed by month, built once (for the plots).
+        """
+
+        if self._frame is None:
+            self._frame = pd.DataFrame({name: getattr(self, name) for name in self.COLUMNS})
+
+        return self._frame
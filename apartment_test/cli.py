@@ -0,0 +1,284 @@
+"""
+Headless batch runner for the buy-vs-rent simulation.
+
+Reads scenarios from a CSV or JSONL file, one row per scenario with columns
+named after the inputs returned by interface.py (see `pipeline.PARAM_NAMES`;
+missing columns take the app defaults, other columns such as a lead id are
+copied to the output). Scenarios are simulated in bounded-size chunks and
+written as they are produced, so memory stays constant whatever the input size.
+
+Usage:
+
+    python cli.py scenarios.csv results.parquet --series total rent
+    python cli.py scenarios.jsonl results_dir --format npz
+    python cli.py scenarios.csv store_dir --format store
+    python cli.py scenarios.csv results.parquet --store store_dir
+
+The 'store' format writes a memory-mapped result store (see store.py),
+which takes a first pass over the input to size its arrays. `--store` reads
+the scenarios already in a store back instead of simulating them again.
+"""
+
+import argparse
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+from pipeline import PARAM_NAMES, SERIES_NAMES, as_scenarios, simulate_batch, summarize
+from store import STORE_SERIES, ResultStore
+
+OUTPUT_FORMATS = ('parquet', 'npz', 'store')
+
+def read_scenarios(path, chunk_size):
+
+    """
+    Iterate over chunks of scenarios (pd.DataFrame) of a CSV or JSONL file.
+    """
+
+    if path.endswith('.jsonl') or path.endswith('.json'):
+        return pd.read_json(path, lines=True, chunksize=chunk_size)
+
+    return pd.read_csv(path, chunksize=chunk_size)
+
+def scenario_params(scenarios):
+
+    """
+    Inputs of a chunk of scenarios, one entry per scenario (missing columns take the defaults).
+    """
+
+    return as_scenarios({name: scenarios[name].to_numpy() for name in PARAM_NAMES if name in scenarios}, len(scenarios))
+
+def scan_scenarios(path, chunk_size):
+
+    """
+    Number of scenarios of a file and the longest month count among them.
+    """
+
+    n_scenarios, n_months = 0, 0
+
+    for scenarios in read_scenarios(path, chunk_size):
+        params = scenario_params(scenarios)
+        n_scenarios += len(scenarios)
+        n_months = max(n_months, int(np.maximum(params['time_horizon'], params['n_months'] + 1).max()))
+
+    return n_scenarios, n_months
+
+def _stored_chunk(params, series, store):
+
+    """
+    Summary and monthly series of a chunk of scenarios, read from `store` where stored and simulated otherwise.
+    """
+
+    rows = store.lookup(params)
+    found = rows >= 0
+
+    stored = {name: store.summary(name)[rows[found]] for name in store.meta['summary']}
+    stored_series = {name: store.series(name)[rows[found]] for name in series}
+
+    if found.all():
+        return stored, stored_series
+
+    result = simulate_batch({name: values[~found] for name, values in params.items()})
+    computed = summarize(result)
+
+    summary = {}
+    for name, values in computed.items():
+        summary[name] = np.empty(rows.shape[0], dtype=values.dtype)
+        summary[name][found] = stored[name]
+        summary[name][~found] = values
+
+    monthly = {}
+    for name in series:
+        n_months = max(stored_series[name].shape[1], result[name].shape[1])
+        monthly[name] = np.full((rows.shape[0], n_months), np.nan)
+        monthly[name][found, :stored_series[name].shape[1]] = stored_series[name]
+        monthly[name][~found, :result[name].shape[1]] = result[name]
+
+    return summary, monthly
+
+def simulate_chunk(scenarios, series=(), store=None):
+
+    """
+    Simulate a chunk of scenarios, returning its summary and the requested monthly series.
+
+    Scenarios found in `store` (a `store.ResultStore` holding every requested
+    series) are read back instead of simulated.
+    """
+
+    params = scenario_params(scenarios)
+
+    summary = {column: scenarios[column].to_numpy() for column in scenarios if column not in PARAM_NAMES}
+
+    if store is not None and set(series) <= set(store.meta['series']):
+        computed, monthly = _stored_chunk(params, series, store)
+    else:
+        result = simulate_batch(params)
+        computed, monthly = summarize(result), {name: result[name] for name in series}
+
+    summary.update(computed)
+
+    return summary, monthly
+
+class ParquetWriter:
+
+    """
+    Append chunks to a single Parquet file, one row group per chunk.
+
+    Monthly series are stored as list columns, one list per scenario.
+    """
+
+    def __init__(self, path):
+
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise ImportError('writing Parquet files needs pyarrow (pip install pyarrow), or use --format npz')
+
+        self._pa = pa
+        self._pq = pq
+        self._path = path
+        self._writer = None
+
+    def write(self, summary, series):
+
+        columns = {key: self._pa.array(value) for key, value in summary.items()}
+
+        for name, values in series.items():
+            columns[name] = self._pa.array([row[np.isfinite(row)] for row in values])
+
+        table = self._pa.table(columns)
+
+        if self._writer is None:
+            self._writer = self._pq.ParquetWriter(self._path, table.schema)
+        else:
+            table = table.cast(self._writer.schema)
+
+        self._writer.write_table(table)
+
+    def close(self):
+
+        if self._writer is not None:
+            self._writer.close()
+
+class NpzWriter:
+
+    """
+    Write each chunk to its own compressed NPZ file inside a directory.
+
+    Monthly series are stored as (scenarios x months) arrays padded with NaN.
+    """
+
+    def __init__(self, path):
+
+        os.makedirs(path, exist_ok=True)
+        self._path = path
+        self._n_chunks = 0
+
+    def write(self, summary, series):
+
+        arrays = {key: np.asarray(value) for key, value in summary.items()}
+        arrays.update({f'series_{name}': values for name, values in series.items()})
+
+        # object columns (e.g. string ids) are stored as unicode arrays
+        arrays = {
+            key: value.astype(str) if value.dtype == object else value
+            for key, value in arrays.items()
+        }
+
+        np.savez_compressed(os.path.join(self._path, f'part-{self._n_chunks:05d}.npz'), **arrays)
+        self._n_chunks += 1
+
+    def close(self):
+        pass
+
+def write_store(input_path, output_path, chunk_size=10000, series=()):
+
+    """
+    Simulate every scenario of `input_path` into a new result store (see store.py).
+
+    Columns other than the inputs are not kept in the store.
+    """
+
+    n_scenarios, n_months = scan_scenarios(input_path, chunk_size)
+    store = ResultStore.create(output_path, n_scenarios, n_months, series or STORE_SERIES)
+    start = 0
+
+    for scenarios in read_scenarios(input_path, chunk_size):
+
+        params = scenario_params(scenarios)
+        store.write(start, params, simulate_batch(params))
+        start += len(scenarios)
+
+    store.finalize()
+
+    return n_scenarios
+
+def run_batch(input_path, output_path, output_format=None, chunk_size=10000, series=(), store=None):
+
+    """
+    Simulate every scenario of `input_path` and write the results to `output_path`.
+
+    Args:
+        input_path (str): CSV or JSONL file of scenarios
+        output_path (str): Parquet file, NPZ directory or store directory
+        output_format (str): one of `OUTPUT_FORMATS`, inferred from the output path if None
+        chunk_size (int): number of scenarios simulated and written at a time
+        series (tuple): names of monthly series to store (e.g. 'total', 'rent'),
+            see `pipeline.SERIES_NAMES`; the store format keeps `store.STORE_SERIES` if empty
+        store (str): optional store directory of precomputed scenarios to read back
+
+    Returns:
+
+        n_scenarios (int): number of simulated scenarios
+    """
+
+    if output_format is None:
+        output_format = 'parquet' if output_path.endswith('.parquet') else 'npz'
+
+    if output_format not in OUTPUT_FORMATS:
+        raise ValueError(f'unknown output format: {output_format}')
+
+    unknown = [name for name in series if name not in SERIES_NAMES]
+    if unknown:
+        raise ValueError(f'unknown series: {unknown}')
+
+    if output_format == 'store':
+        return write_store(input_path, output_path, chunk_size, series)
+
+    writer = ParquetWriter(output_path) if output_format == 'parquet' else NpzWriter(output_path)
+    store = ResultStore(store) if store is not None else None
+    n_scenarios = 0
+
+    try:
+        for scenarios in read_scenarios(input_path, chunk_size):
+
+            summary, monthly = simulate_chunk(scenarios, series, store)
+            writer.write(summary, monthly)
+            n_scenarios += len(scenarios)
+
+    finally:
+        writer.close()
+
+    return n_scenarios
+
+def main(argv=None):
+
+    parser = argparse.ArgumentParser(description='Run the buy-vs-rent simulation over a file of scenarios.')
+    parser.add_argument('input', help='CSV or JSONL file with one scenario per row')
+    parser.add_argument('output', help='Parquet file, directory of NPZ files or result store directory')
+    parser.add_argument('--format', choices=OUTPUT_FORMATS, default=None, help='output format (default: from the output path)')
+    parser.add_argument('--chunk-size', type=int, default=10000, help='scenarios simulated at a time')
+    parser.add_argument('--series', nargs='*', choices=SERIES_NAMES, default=[], metavar='SERIES',
+                        help=f'monthly series to store, some of: {" ".join(SERIES_NAMES)}')
+    parser.add_argument('--store', default=None, help='result store to read precomputed scenarios from')
+
+    args = parser.parse_args(argv)
+
+    n_scenarios = run_batch(args.input, args.output, args.format, args.chunk_size, tuple(args.series), args.store)
+    print(f'{n_scenarios} scenarios written to {args.output}', file=sys.stderr)
+
+if __name__ == '__main__':
+    main()
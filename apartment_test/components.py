@@ -0,0 +1,215 @@
+"""
+Registry of additional cash-flow components of buying and renting.
+
+Taxes, fees, ownership costs and rental deposits are each described by a
+`Component`: a share of some basis (an input or a monthly series), paid once
+or every few months, growing with one of the rates of the simulation. All
+components are evaluated together as one (components x months) array of
+signed payments, reduced in a single weighted sum into one row per
+distinct basis and growth. Only those rows are multiplied out over the
+scenarios into the monthly net cost of buying (costs of buying minus costs
+of renting), which enters the final result like installments do. Adding
+components with the usual bases only adds rows to the small array.
+
+Costs of buying are borne by the owner; IPTU and condominium are usually
+passed to the tenant in rental contracts and can be left out (or added to
+both sides) in that case.
+"""
+
+from collections import namedtuple
+
+import numpy as np
+
+Component = namedtuple(
+    'Component',
+    ['name', 'side', 'basis', 'rate', 'growth', 'start', 'period', 'count', 'during_mortgage'],
+    defaults=(None, 0, 1, None, False)
+)
+
+Component.__doc__ = """
+A cash flow of buying or renting.
+
+Fields:
+    name (str): identifier of the component
+    side (str): 'buy' (paid by the owner) or 'rent' (paid by the tenant)
+    basis (str): input ('total_amount', 'mortgage_value', 'rent_amount') or
+        monthly series ('home_value', 'mort_balance', 'rent') the rate
+        applies to, or 'fixed' for an amount in reais
+    rate (float or array-like): share of the basis (or amount) paid each
+        time, scalar or one per scenario
+    growth (str): rate input the amount grows with after month zero
+        ('home_appreciation', 'rent_appreciation', 'inflation', ...), or None
+    start (int): first month paid; negative months count back from the
+        horizon (-1 is the last month)
+    period (int): months between payments, 0 for a one-off payment
+    count (int): number of payments, None for every period until the horizon
+    during_mortgage (bool): only paid while the mortgage is running
+"""
+
+SIDES = ('buy', 'rent')
+
+# bases that are inputs of the simulation (one value per scenario)
+INPUT_BASES = ('total_amount', 'mortgage_value', 'rent_amount')
+
+# bases that are monthly series of the simulation
+SERIES_BASES = ('home_value', 'mort_balance', 'rent')
+
+DEFAULT_COMPONENTS = (
+    # one-off purchase costs
+    Component('itbi', 'buy', 'total_amount', 0.03, period=0),
+    Component('registry', 'buy', 'total_amount', 0.01, period=0),
+    # recurring ownership costs
+    Component('iptu', 'buy', 'home_value', 0.006 / 12),
+    Component('condominium', 'buy', 'fixed', 0., growth='inflation'),
+    Component('maintenance', 'buy', 'home_value', 0.005 / 12),
+    # mortgage insurance: MIP over the balance, DFI over the property
+    Component('insurance_mip', 'buy', 'mort_balance', 0.0003, during_mortgage=True),
+    Component('insurance_dfi', 'buy', 'home_value', 0.00007, during_mortgage=True),
+    # rental deposit of three rents, returned at the horizon
+    Component('rental_deposit', 'rent', 'rent_amount', 3., period=0),
+    Component('rental_deposit_refund', 'rent', 'rent_amount', -3., start=-1, period=0),
+)
+
+def validate(components):
+
+    """
+    Check sides, bases and timing of `components`, raising ValueError on the first invalid one.
+    """
+
+    for component in components:
+
+        if component.side not in SIDES:
+            raise ValueError(f'{component.name}: unknown side {component.side}, expected one of {SIDES}')
+
+        if component.basis not in INPUT_BASES + SERIES_BASES + ('fixed',):
+            raise ValueError(f'{component.name}: unknown basis {component.basis}')
+
+        if component.period < 0 or (component.count is not None and component.count < 0):
+            raise ValueError(f'{component.name}: period and count must not be negative')
+
+def schedule(components, n_months):
+
+    """
+    Whether each component is paid at each month.
+
+    Components with a negative start are laid out backwards, column j
+    being j months before the horizon, so the schedule doesn't depend on
+    the horizon of each scenario.
+
+    Returns:
+
+        paid (np.ndarray): (components x months) booleans
+    """
+
+    months = np.arange(n_months)
+
+    start = np.array([component.start for component in components])[:, None]
+    period = np.array([component.period for component in components])[:, None]
+    count = np.array([np.inf if component.count is None else component.count for component in components])[:, None]
+
+    # months since the first payment, in either layout
+    elapsed = np.where(start < 0, -start - 1 - months, months - start)
+
+    # one-off components are a single payment at their start
+    step = np.maximum(period, 1)
+    n_payments = np.where(period == 0, 1, count)
+
+    return (elapsed >= 0) & (elapsed % step == 0) & (elapsed // step < n_payments)
+
+def component_costs(components, bases, growths, horizon, mortgage_months):
+
+    """
+    Monthly net cost of buying from `components`: costs of buying minus costs of renting.
+
+    Args:
+        components (list): `Component`s
+        bases (dict): (scenarios,) inputs keyed by `INPUT_BASES` and
+            (scenarios x months) series keyed by `SERIES_BASES`
+        growths (dict): (scenarios x months) growth factors of the rate
+            inputs components grow with (see `core.growth_factors`)
+        horizon (array-like): months of each scenario
+        mortgage_months (array-like): months the mortgage of each scenario runs
+
+    Returns:
+
+        costs (np.ndarray): (scenarios x months) net cost, zero without components
+    """
+
+    shape = bases['mort_balance'].shape
+    n_scenarios, n_months = shape
+
+    if not components:
+        return np.zeros(shape)
+
+    validate(components)
+
+    months = np.arange(n_months)
+    horizon = np.asarray(horizon)[:, None]
+
+    # signed payments of each component: (components x scenarios x months),
+    # with a single scenario row unless some rate is given per scenario
+    weights = np.array([1. if component.side == 'buy' else -1. for component in components])
+    rates = np.array(np.broadcast_arrays(*[np.asarray(component.rate, dtype=float) for component in components]))
+    rates = (weights.reshape((-1,) + (1,) * (rates.ndim - 1)) * rates).reshape(len(components), -1, 1)
+
+    payments = rates * schedule(components, n_months)[:, None, :]
+
+    # weighted reduction into one row per distinct basis, growth and timing
+    groups = [
+        (component.basis, component.growth, component.during_mortgage, component.start < 0)
+        for component in components
+    ]
+    keys = sorted(set(groups), key=str)
+    membership = np.array([[group == key for group in groups] for key in keys], dtype=float)
+
+    grouped = np.einsum('kc,csm->ksm', membership, payments)
+
+    # basis of each scenario and month (or of each scenario), the balance counting only while positive
+    factors = {name: np.reshape(bases[name], (n_scenarios, -1)) for name in INPUT_BASES + SERIES_BASES}
+    factors['mort_balance'] = np.clip(factors['mort_balance'], 0, None)
+
+    # costs paid while the mortgage runs are masked once, after the sum
+    costs = np.zeros(shape)
+    mortgage_costs = np.zeros(shape) if any(key[2] for key in keys) else None
+
+    rows = np.arange(n_scenarios)[:, None]
+    normalized = {}
+
+    for (basis, growth, during_mortgage, from_horizon), payment in zip(keys, grouped):
+
+        target = mortgage_costs if during_mortgage else costs
+        paid = np.flatnonzero(payment.any(axis=0))
+
+        # few payments (one-off components): only the months paid are computed
+        if from_horizon or 4 * paid.size <= n_months:
+
+            columns = horizon - 1 - paid if from_horizon else np.broadcast_to(paid, (n_scenarios, paid.size))
+            is_valid = columns >= 0
+            columns = np.where(is_valid, columns, 0)
+            values = np.where(is_valid, payment[:, paid], 0.)
+
+            if basis != 'fixed':
+                factor = factors[basis]
+                values = values * (factor[rows, columns] if factor.shape[1] > 1 else factor)
+
+            # amounts are given at month zero
+            if growth is not None:
+                values = values * growths[growth][rows, columns] / growths[growth][:, :1]
+
+            np.add.at(target, (np.broadcast_to(rows, columns.shape), columns), values)
+            continue
+
+        if basis != 'fixed':
+            payment = payment * factors[basis]
+
+        if growth is not None:
+            if growth not in normalized:
+                normalized[growth] = growths[growth] / growths[growth][:, :1]
+            payment = payment * normalized[growth]
+
+        target += payment
+
+    if mortgage_costs is not None:
+        costs += np.where(months < np.asarray(mortgage_months)[:, None], mortgage_costs, 0.)
+
+    return costs
@@ -1,7 +1,19 @@
+import threading
+from collections import OrderedDict, namedtuple
+
 import numpy as np
 import pandas as pd
 from copy import deepcopy
 
+# FGTS balances yield 3% per year
+FGTS_INTEREST = 3./100
+
+# number of distinct yearly rates kept in the shared growth table, and the
+# memory they may take (a row of 480 months takes under 4 kB)
+GROWTH_TABLE_SIZE = 256
+GROWTH_TABLE_MAX_BYTES = 32 * 2**20
+
+GrowthTableInfo = namedtuple('GrowthTableInfo', ['hits', 'misses', 'size', 'maxsize', 'nbytes', 'max_bytes'])
 
 def convert_yearly_to_monthly_interest(yearly_interest):
     
@@ -27,7 +39,13 @@ def build_fgts_cash_flow(fgts_amount, fgts_frequency, n_months):
 
     return fgts_payments
 
-def calculate_mortgage_over_time(principal, n_months, yearly_interest, fgts_frequency=0, fgts_amount=0):
+AMORTIZATION_SYSTEMS = ('sac', 'price')
+
+FGTS_POLICIES = ('reduce_term', 'reduce_installment')
+
+def calculate_mortgage_over_time(principal, n_months, yearly_interest, fgts_frequency=0, fgts_amount=0,
+                                 amortization='sac', fgts_policy='reduce_term', monthly_interest=None,
+                                 index_rates=None):
 
     """
     Computes mortage over time. Allows using FGTS amount at fixed periods.
@@ -36,68 +54,511 @@ def calculate_mortgage_over_time(principal, n_months, yearly_interest, fgts_freq
         principal (float): total amount of mortgage 
         n_months (float): number of months of mortgage
         yearly_interest (float): yearly interest of mortgage
-        fgts_frequency (int): frequency in years that FGTS will be used
+        fgts_frequency (int): frequency in years that FGTS will be used (0 for never)
         fgts_amount (float): amount at each time FGTS is used
+        amortization (str): 'sac' (constant amortization) or 'price' (constant installments)
+        fgts_policy (str): whether FGTS payments 'reduce_term' or 'reduce_installment'
+        monthly_interest (array-like): optional interest rate of each month, replacing yearly_interest / 12
+        index_rates (array-like): optional monthly variation of the index correcting the balance
+            (TR, IPCA, ...), with the interest rate as the spread over it
 
     Returns:
 
         mortgage_df (pd.DataFrame): DataFrame containg mortgage expected cash flow
     """
-    
-    monthly_amortization = principal/n_months
-    monthly_interest = yearly_interest/12
-    
-    balance = [deepcopy(principal)]
-    amount_paid = [0]
-    amount_interest = [balance[0] * monthly_interest]
-    installment = [amount_interest[0] + monthly_amortization]
-    fgts_paid = [0]
-
-    fgts_payments = build_fgts_cash_flow(fgts_amount, fgts_frequency, n_months)
 
-    for i in range(1, n_months + 1):
-        
-        current_balance = balance[-1] - monthly_amortization - fgts_payments[i]
-        current_paid = amount_paid[-1] + monthly_amortization + fgts_payments[i]
-        current_interest = balance[-1] * monthly_interest
-        current_installment = current_interest + monthly_amortization
-
-        balance.append(current_balance)
-        amount_paid.append(current_paid)
-        amount_interest.append(current_interest)
-        installment.append(current_installment)
-        fgts_paid.append(fgts_payments[i])
-
-        if current_balance < 0:
-            break
-
-    mortgage_df = pd.DataFrame(
-        {'mort_balance': balance, 
-         'mort_amount_paid': amount_paid, 
-         'mort_amount_interest': amount_interest,
-         'mort_installment': installment,
-         'mort_fgts_paid': fgts_paid}
+    mortgage = calculate_mortgage_batch(
+        principal, n_months, yearly_interest, fgts_frequency, fgts_amount, amortization, fgts_policy,
+        monthly_interest=monthly_interest, index_rates=index_rates
     )
+
+    n_rows = mortgage.pop('n_rows')[0]
+    mortgage_df = pd.DataFrame({key: value[0, :n_rows] for key, value in mortgage.items()})
     
     return mortgage_df
 
-def apply_interest_series(x, yearly_interest):
+def build_fgts_schedule(fgts_amount, fgts_frequency, n_months):
 
     """
-    Apply interest dynamically to a series.
+    Vectorized counterpart of `build_fgts_cash_flow` for many scenarios.
+
+    Returns a (scenarios x max(n_months) + 1) array where column i holds the
+    FGTS amount used at month i. Column 0 and months past each scenario's term
+    are zero, as are scenarios with `fgts_frequency` equal to zero.
+    """
+
+    fgts_amount, fgts_frequency, n_months = np.broadcast_arrays(
+        np.atleast_1d(np.asarray(fgts_amount, dtype=float)),
+        np.atleast_1d(np.asarray(fgts_frequency, dtype=int)),
+        np.atleast_1d(np.asarray(n_months, dtype=int)),
+    )
+
+    months = np.arange(n_months.max() + 1)
+    period = (fgts_frequency * 12)[:, None]
+
+    is_payment = (
+        (period > 0) &
+        (months > 0) &
+        (months <= n_months[:, None]) &
+        (months % np.where(period > 0, period, 1) == 0)
+    )
+
+    return np.where(is_payment, fgts_amount[:, None], 0.)
+
+def build_event_schedule(scenario, month, amount, n_scenarios, n_months):
+
     """
+    Dense (scenarios x n_months + 1) payment matrix of sparse payment events.
+
+    Events are given as parallel arrays (scenario index, month, amount), so a
+    schedule with a handful of prepayments costs a handful of entries instead
+    of a full row. Events at the same month add up; events outside
+    months 1..n_months are dropped.
+    """
+
+    scenario, month, amount = np.broadcast_arrays(
+        np.asarray(scenario, dtype=int), np.asarray(month, dtype=int), np.asarray(amount, dtype=float)
+    )
+
+    keep = (month > 0) & (month <= n_months)
+    payments = np.zeros((n_scenarios, n_months + 1))
+    np.add.at(payments, (scenario[keep], month[keep]), amount[keep])
+
+    return payments
+
+def annuity_factor(monthly_interest, n_months):
+
+    """
+    Present value of n_months unit installments: (1 - (1 + r) ** -n) / r, or n when r is zero.
+    """
+
+    monthly_interest = np.asarray(monthly_interest, dtype=float)
+    n_months = np.asarray(n_months, dtype=float)
+    safe_interest = np.where(monthly_interest == 0, 1., monthly_interest)
+
+    return np.where(
+        monthly_interest == 0,
+        n_months,
+        -np.expm1(-n_months * np.log1p(safe_interest)) / safe_interest
+    )
+
+def _amortize(principal, n_months, monthly_interest, fgts_payments, amortization, fgts_policy):
+
+    """
+    Balance and payments of one amortization system and FGTS policy, in closed form.
+
+    Installments follow a "level" c (the amortization in SAC, the installment
+    in Price), with balance[i] = F(n - i) * c where F(k) is k for SAC and the
+    annuity factor for Price. Reducing the installment lowers the level by
+    f / F(n - i) at each FGTS payment f, a cumulative sum. Reducing the term
+    keeps the level and subtracts each payment, carried with interest, from
+    the scheduled balance. Arrays have shape (scenarios x months + 1), with
+    row 0 as the initial state. `monthly_interest` has one column (a fixed
+    rate) or one per month, column i holding the rate of month i; with
+    per-month rates the SAC schedule is unchanged (only interest varies) and
+    Price is delegated to `_amortize_price_variable`.
+
+    Returns:
+
+        balance, amount_paid, amount_interest, installment (np.ndarray)
+    """
+
+    if amortization == 'price' and monthly_interest.shape[1] > 1:
+        return _amortize_price_variable(principal, n_months, monthly_interest, fgts_payments, fgts_policy)
+
+    months = np.arange(fgts_payments.shape[1])
+    in_term = months <= n_months[:, None]
+    remaining = np.clip(n_months[:, None] - months, 0, None)
+    principal = principal[:, None]
+
+    if amortization == 'sac':
+        factor = remaining.astype(float)
+    else:
+        factor = annuity_factor(monthly_interest, remaining)
+
+    level = np.broadcast_to(principal / factor[:, :1], factor.shape)
+
+    if fgts_policy == 'reduce_installment':
+        has_term_left = factor > 0
+        reduction = np.where(has_term_left, fgts_payments / np.where(has_term_left, factor, 1.), 0.)
+        level = level - np.cumsum(reduction, axis=1)
+        balance = factor * level - np.where(has_term_left, 0., fgts_payments)
+
+    elif amortization == 'sac':
+        # interleaving amortization and FGTS steps reproduces the order of the
+        # running subtractions of the original month-by-month loop exactly
+        steps = np.zeros((principal.shape[0], 2 * months.shape[0] - 1))
+        steps[:, 1::2] = np.where(in_term, level, 0.)[:, 1:]
+        steps[:, 2::2] = fgts_payments[:, 1:]
+
+        amount_paid = np.cumsum(steps, axis=1)[:, ::2]
+        steps = -steps
+        steps[:, 0] = principal[:, 0]
+        balance = np.cumsum(steps, axis=1)[:, ::2]
+
+    else:
+        growth = np.power(1 + monthly_interest, months)
+        balance = factor * level - growth * np.cumsum(fgts_payments / growth, axis=1)
+
+    previous_balance = np.concatenate([balance[:, :1], balance[:, :-1]], axis=1)
+    previous_level = np.concatenate([level[:, :1], level[:, :-1]], axis=1)
+    amount_interest = previous_balance * monthly_interest
+
+    if amortization == 'sac':
+        installment = amount_interest + previous_level
+        amortized = previous_level
+    else:
+        installment = previous_level
+        amortized = installment - amount_interest
+
+    if not (amortization == 'sac' and fgts_policy == 'reduce_term'):
+        paid = np.where(in_term & (months > 0), amortized + fgts_payments, 0.)
+        amount_paid = np.cumsum(paid, axis=1)
+
+    return balance, amount_paid, amount_interest, installment
+
+def _amortize_price_variable(principal, n_months, monthly_interest, fgts_payments, fgts_policy):
+
+    """
+    Price table re-amortized every month at that month's rate (see `_amortize`).
+
+    The installment of month i is b[i-1] / F(n - i + 1, r[i]), so the balance
+    follows the linear recurrence b[i] = g[i] * b[i-1] - f[i] with
+    g[i] = 1 + r[i] - 1 / F(n - i + 1, r[i]), solved at once as a cumulative
+    product and a discounted cumulative sum. g is zero at the last month
+    (the loan is paid off), which is set apart to keep the products invertible.
+    """
+
+    if fgts_policy != 'reduce_installment':
+        raise ValueError('Price with per-month rates re-amortizes every month: use the reduce_installment FGTS policy')
+
+    months = np.arange(fgts_payments.shape[1])
+    in_term = months <= n_months[:, None]
+    remaining = np.clip(n_months[:, None] - months, 0, None)
+
+    # annuity factor over the months left at the start of each month, at that month's rate
+    previous_remaining = np.concatenate([remaining[:, :1], remaining[:, :-1]], axis=1)
+    factor = annuity_factor(monthly_interest, previous_remaining)
+
+    is_open = previous_remaining > 1
+    carry = np.where(is_open, 1 + monthly_interest - 1 / np.where(is_open, factor, 1.), 1.)
+    carry[:, 0] = 1.
+
+    cumulative_carry = np.cumprod(carry, axis=1)
+    balance = cumulative_carry * (principal[:, None] - np.cumsum(fgts_payments / cumulative_carry, axis=1))
+    balance = np.where(previous_remaining == 1, -fgts_payments, balance)
+
+    previous_balance = np.concatenate([balance[:, :1], balance[:, :-1]], axis=1)
+    amount_interest = previous_balance * monthly_interest
+    installment = previous_balance / np.where(previous_remaining > 0, factor, 1.)
+
+    paid = np.where(in_term & (months > 0), installment - amount_interest + fgts_payments, 0.)
+    amount_paid = np.cumsum(paid, axis=1)
+
+    return balance, amount_paid, amount_interest, installment
+
+def option_codes(values, options, name):
+
+    """
+    Integer codes (positions in `options`) of an array of string options, validating them.
+    """
+
+    values = np.atleast_1d(np.asarray(values))
+    codes = np.full(values.shape, -1)
+
+    for code, option in enumerate(options):
+        codes[values == option] = code
+
+    if (codes < 0).any():
+        raise ValueError(f'unknown {name}: {sorted(set(values[codes < 0]))}, expected one of {options}')
+
+    return codes
+
+def calculate_mortgage_batch(principal, n_months, yearly_interest, fgts_frequency=0, fgts_amount=0,
+                             amortization='sac', fgts_policy='reduce_term', monthly_interest=None,
+                             index_rates=None, fgts_payments=None):
+
+    """
+    Computes mortgage over time for many scenarios at once.
+
+    Every argument may be a scalar or an array with one entry per scenario.
+    Results follow `calculate_mortgage_over_time` row by row: row 0 holds the
+    initial state and row i the state after month i. Scenarios with different
+    terms, or whose balance goes negative early, are padded with NaN after
+    their last row. A `fgts_frequency` of zero means FGTS is never used.
+
+    Both SAC (constant amortization) and Price (constant installments) tables
+    are computed in closed form, with FGTS payments either reducing the term
+    (installments are kept and the loan ends early) or the installment (the
+    remaining balance is re-amortized over the remaining term).
+
+    Variable-rate mortgages take per-month rates in `monthly_interest`. SAC
+    accepts them with either FGTS policy. Price re-amortizes the balance at
+    every month's rate, which only fits the reduce_installment policy.
+    Indexed mortgages take the monthly index variation in `index_rates`, and
+    the interest rate is the spread over the index. The balance is corrected
+    by the index every month, and installments follow the corrected balance.
+    This makes the schedule the spread-only schedule in index-deflated (real)
+    terms, times the cumulative index. Rate arrays have one row per scenario
+    (or a single row) and at least max(n_months) columns, where column j
+    holds the rate of month j + 1.
+
+    Args:
+        principal (array-like): total amount of mortgage
+        n_months (array-like): number of months of mortgage
+        yearly_interest (array-like): yearly interest of mortgage
+        fgts_frequency (array-like): frequency in years that FGTS will be used
+        fgts_amount (array-like): amount at each time FGTS is used
+        amortization (array-like): one of `AMORTIZATION_SYSTEMS`
+        fgts_policy (array-like): one of `FGTS_POLICIES`
+        monthly_interest (np.ndarray): optional per-month interest rates, replacing yearly_interest / 12
+        index_rates (np.ndarray): optional per-month variation of the index correcting the balance
+        fgts_payments (np.ndarray): optional (scenarios x max(n_months) + 1) amounts used at each
+            month, replacing the schedule of `fgts_frequency` and `fgts_amount`
+
+    Returns:
+
+        mortgage (dict): (scenarios x max(n_months) + 1) arrays keyed by the
+            columns of `calculate_mortgage_over_time`, plus 'n_rows', the
+            number of valid rows of each scenario
+    """
+
+    principal, n_months, yearly_interest, system_code, policy_code = np.broadcast_arrays(
+        np.atleast_1d(np.asarray(principal, dtype=float)),
+        np.atleast_1d(np.asarray(n_months, dtype=int)),
+        np.atleast_1d(np.asarray(yearly_interest, dtype=float)),
+        option_codes(amortization, AMORTIZATION_SYSTEMS, 'amortization system'),
+        option_codes(fgts_policy, FGTS_POLICIES, 'FGTS policy'),
+    )
+
+    n_scenarios = principal.shape[0]
+    shape = (n_scenarios, n_months.max() + 1)
+
+    if fgts_payments is None:
+        fgts_payments = build_fgts_schedule(fgts_amount, fgts_frequency, n_months)
 
-    monthly_interest = convert_yearly_to_monthly_interest(yearly_interest)
-    series = pd.Series(np.zeros(len(x)))
+    fgts_payments = np.broadcast_to(np.asarray(fgts_payments, dtype=float), shape)
 
-    for i, value in x.iteritems():
+    if monthly_interest is None:
+        monthly_interest = (yearly_interest / 12)[:, None]
+    else:
+        # row 0 repeats the first month's rate, as the fixed-rate table does
+        monthly_interest = _monthly_columns(monthly_interest, shape, 'monthly_interest')
+        monthly_interest[:, 0] = monthly_interest[:, 1]
 
-        powers = np.clip(x.index - i + 1, 0, None)
-        multipliers = np.clip(powers, 0, 1)
-        temp_series = value * multipliers * (1 + monthly_interest) ** powers
-        series = series + temp_series
+    if index_rates is not None:
+        index = np.cumprod(1 + _monthly_columns(index_rates, shape, 'index_rates'), axis=1)
+        amortized_payments = fgts_payments / index
+    else:
+        amortized_payments = fgts_payments
+
+    columns = ('mort_balance', 'mort_amount_paid', 'mort_amount_interest', 'mort_installment')
+    mortgage = {key: np.empty(shape) for key in columns}
+
+    # one closed-form evaluation per combination of system and policy
+    for system_index, system in enumerate(AMORTIZATION_SYSTEMS):
+        for policy_index, policy in enumerate(FGTS_POLICIES):
+
+            group = (system_code == system_index) & (policy_code == policy_index)
+            if not group.any():
+                continue
+
+            results = _amortize(
+                principal[group], n_months[group], monthly_interest[group], amortized_payments[group], system, policy
+            )
+
+            for key, value in zip(columns, results):
+                mortgage[key][group] = value
+
+    if index_rates is not None:
+
+        # back from index-deflated to nominal terms
+        for key in ('mort_balance', 'mort_amount_interest', 'mort_installment'):
+            mortgage[key] *= index
+
+        paid = np.diff(mortgage['mort_amount_paid'], axis=1, prepend=0.)
+        mortgage['mort_amount_paid'] = np.cumsum(paid * index, axis=1)
+
+    mortgage['mort_fgts_paid'] = fgts_payments
+
+    # stop right after the first month where the balance goes negative
+    months = np.arange(fgts_payments.shape[1])
+    is_negative = (mortgage['mort_balance'] < 0) & (months > 0) & (months <= n_months[:, None])
+    last_row = np.where(is_negative.any(axis=1), is_negative.argmax(axis=1), n_months)
+    is_valid = months <= last_row[:, None]
+
+    mortgage = {key: np.where(is_valid, value, np.nan) for key, value in mortgage.items()}
+    mortgage['n_rows'] = last_row + 1
+
+    return mortgage
+
+def _monthly_columns(rates, shape, name):
+
+    """
+    Per-month rates (column j for month j + 1) as a (scenarios x months + 1) array with a zero column 0.
+    """
+
+    rates = np.atleast_2d(np.asarray(rates, dtype=float))
+    n_months = shape[1] - 1
+
+    if rates.shape[1] < n_months:
+        raise ValueError(f'{name} has {rates.shape[1]} months, {n_months} are needed')
+
+    columns = np.zeros(shape)
+    columns[:, 1:] = rates[:, :n_months]
+
+    return columns
+
+def growth_factors(monthly_interest, n_months):
+
+    """
+    Cumulative growth factors (1 + r) ** [1, ..., n_months].
+
+    `monthly_interest` may be a scalar or an array of rates, in which case the
+    factors are returned with shape (*monthly_interest.shape, n_months).
+    """
+
+    monthly_interest = np.asarray(monthly_interest, dtype=float)[..., None]
+    return np.power(1 + monthly_interest, np.arange(1, n_months + 1))
+
+class GrowthTable:
+
+    """
+    Memoized cumulative growth factors of yearly rates, with LRU eviction.
+
+    Keeps one read-only row (1 + r) ** [1, ..., n] per yearly rate, as long as
+    the longest horizon requested so far; shorter horizons are views of it, so
+    home appreciation, rent, inflation, FGTS and investment growth are computed
+    once per rate and shared by every caller (and scenario) using that rate.
+    Factors are elementwise powers, so a row extended to a longer horizon
+    keeps exactly the same values. Rows are evicted past `maxsize` rates or
+    `max_bytes` of factors.
+    """
+
+    def __init__(self, maxsize=GROWTH_TABLE_SIZE, max_bytes=GROWTH_TABLE_MAX_BYTES):
+
+        self.maxsize = maxsize
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.nbytes = 0
+        self._rows = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, yearly_interest, n_months):
+
+        """
+        Read-only growth factors of one yearly rate over `n_months`.
+        """
+
+        key = float(yearly_interest)
+
+        with self._lock:
+
+            row = self._rows.get(key)
+
+            if row is not None and row.shape[0] >= n_months:
+                self._rows.move_to_end(key)
+                self.hits += 1
+                return row[:n_months]
+
+            self.misses += 1
+
+        row = growth_factors(convert_yearly_to_monthly_interest(key), n_months)
+        row.flags.writeable = False
+
+        with self._lock:
+
+            if key in self._rows:
+                self.nbytes -= self._rows.pop(key).nbytes
+
+            self._rows[key] = row
+            self.nbytes += row.nbytes
+
+            while self._rows and (
+                len(self._rows) > self.maxsize or
+                (self.max_bytes is not None and self.nbytes > self.max_bytes)
+            ):
+                _, evicted = self._rows.popitem(last=False)
+                self.nbytes -= evicted.nbytes
+
+        return row
+
+    def rows(self, yearly_interest, n_months):
+
+        """
+        Growth factors (scenarios x months) for an array of yearly rates.
+
+        Rates are looked up once per distinct value; when every scenario shares
+        one rate the result is a read-only broadcast view of the table row.
+        Arrays with more distinct rates than the table holds are computed
+        directly, so large random batches don't flush the table.
+        """
+
+        yearly_interest = np.asarray(yearly_interest, dtype=float).ravel()
+        rates, inverse = np.unique(yearly_interest, return_inverse=True)
+
+        if rates.shape[0] == 1:
+            return np.broadcast_to(self.get(rates[0], n_months), (yearly_interest.shape[0], n_months))
+
+        if rates.shape[0] > self.maxsize:
+            monthly_interest = convert_yearly_to_monthly_interest(rates)
+            return growth_factors(monthly_interest, n_months)[inverse.ravel()]
+
+        return np.stack([self.get(rate, n_months) for rate in rates])[inverse.ravel()]
+
+    def clear(self):
+
+        with self._lock:
+            self._rows.clear()
+            self.hits = 0
+            self.misses = 0
+            self.nbytes = 0
+
+    def info(self):
+
+        with self._lock:
+            return GrowthTableInfo(self.hits, self.misses, len(self._rows), self.maxsize, self.nbytes, self.max_bytes)
+
+# shared by every interest application of the process
+growth_table = GrowthTable()
+
+def compound_array(values, growth):
+
+    """
+    Compound monthly contributions along the last axis.
+
+    Solves the recurrence s[t] = (s[t-1] + x[t]) * (1 + r[t]) in a single pass,
+    written as a discounted cumulative sum: s[t] = G[t] * sum(x[k] / G[k-1]),
+    where G are the cumulative growth factors (see `growth_factors`) and
+    G[-1] = 1. Runs in O(n) and broadcasts over any leading (scenario) axes.
+
+    Args:
+        values (np.ndarray): contributions with shape (..., n_months)
+        growth (np.ndarray): cumulative growth factors broadcastable to values
+
+    Returns:
+
+        compounded (np.ndarray): compounded balance at each month
+    """
+
+    values = np.asarray(values, dtype=float)
+    growth = np.asarray(growth, dtype=float)
+    previous_growth = np.concatenate(
+        [np.ones(growth.shape[:-1] + (1,)), growth[..., :-1]], axis=-1
+    )[..., :growth.shape[-1]]
+
+    return np.cumsum(values / previous_growth, axis=-1) * growth
+
+def apply_interest_series(x, yearly_interest):
+
+    """
+    Apply interest dynamically to a series.
+    """
+
+    growth = growth_table.get(yearly_interest, len(x))
     
-    return series
+    return pd.Series(compound_array(x.values, growth))
 
 def apply_interest_scalar(amount, yearly_interest, n_months, name):
 
@@ -105,9 +566,7 @@ def apply_interest_scalar(amount, yearly_interest, n_months, name):
     Apply interest to a fixed amount of money at t=0.
     """
 
-    amount_over_time = pd.Series([amount] + [0] * (n_months - 1))
-
-    amount_over_time = apply_interest_series(amount_over_time, yearly_interest)
+    amount_over_time = pd.Series(amount * growth_table.get(yearly_interest, max(n_months, 1)))
     amount_over_time.name = name
 
     return amount_over_time
@@ -121,6 +580,23 @@ def apply_inflation(series, inflation):
     inflation_series = apply_interest_scalar(1, inflation, series.shape[0], 'inflation_series')
     return series / inflation_series
 
+def calculate_rent_reinvestment_array(rent_over_time, installments_over_time, growth):
+
+    """
+    Same as `calculate_rent_reinvestment`, on arrays (months along the last axis)
+    and given the cumulative growth factors of the investment rate.
+    """
+
+    diff = rent_over_time - installments_over_time
+
+    rent_surplus = diff.clip(0, None)
+    installment_surplus = diff.clip(None, 0)
+
+    rent_passive_income = compound_array(rent_surplus, growth) - rent_surplus.cumsum(axis=-1)
+    installment_passive_income = compound_array(installment_surplus, growth) - installment_surplus.cumsum(axis=-1)
+
+    return (rent_passive_income + installment_passive_income).round(0)
+
 def calculate_rent_reinvestment(rent_over_time, installments_over_time, interest):
     
     """
@@ -0,0 +1,316 @@
+import itertools
+import time
+from collections import namedtuple
+
+from core import (
+    FGTS_INTEREST,
+    calculate_mortgage_batch,
+    calculate_rent_reinvestment_array,
+    compound_array,
+    growth_table,
+)
+from cashflow import CashFlow
+from components import component_costs
+from cache import LRUCache, make_key, register_cache
+from profiling import stage as profile_stage
+
+StageRun = namedtuple('StageRun', ['stage', 'recomputed', 'seconds'])
+
+# fallback output keys for results that can't be fingerprinted
+_unique_keys = itertools.count()
+
+class Stage:
+
+    """
+    Named computation with declared inputs (parameters or other stages).
+
+    `guarded_inputs` are only evaluated when the `guard` input is truthy;
+    otherwise the function gets None for them and they don't invalidate
+    the stage.
+    """
+
+    def __init__(self, name, func, inputs, maxsize=32, guard=None, guarded_inputs=()):
+
+        self.name = name
+        self.func = func
+        self.inputs = tuple(inputs)
+        self.guard = guard
+        self.guarded_inputs = tuple(guarded_inputs)
+        self.cache = LRUCache(maxsize)
+
+class StageGraph:
+
+    """
+    Dependency graph of named stages, evaluated incrementally.
+
+    Each stage result is cached under the fingerprints of its inputs, where a
+    stage input is fingerprinted by its *output* value. A stage therefore only
+    re-executes when one of its inputs actually changed, and a recomputed
+    stage whose output didn't change (e.g. the horizon) stops the propagation.
+    Results live in per-stage LRU caches, so one graph can be shared by every
+    session of the app; callers must treat stage results as read-only.
+    """
+
+    def __init__(self, name):
+
+        self.name = name
+        self.stages = {}
+
+    def stage(self, name, inputs, maxsize=32, guard=None, guarded_inputs=()):
+
+        """
+        Decorator registering a function as a stage, called with its inputs as keyword arguments.
+
+        `guarded_inputs` are only needed when the `guard` input (one of `inputs`) is truthy.
+        """
+
+        def decorator(func):
+
+            if name in self.stages:
+                raise ValueError(f'stage {name} already exists')
+
+            if guarded_inputs and guard not in inputs:
+                raise ValueError(f'guard of stage {name} must be one of its inputs')
+
+            self.stages[name] = Stage(name, func, inputs, maxsize, guard, guarded_inputs)
+            register_cache(f'{self.name}.{name}', self.stages[name].cache)
+
+            return func
+
+        return decorator
+
+    def parameters(self):
+
+        """
+        Names of the inputs that are not stages.
+        """
+
+        inputs = {name for stage in self.stages.values() for name in stage.inputs + stage.guarded_inputs}
+        return sorted(inputs - set(self.stages))
+
+    def run(self, params=None):
+
+        """
+        Start an evaluation over `params`, which may be extended as inputs become known.
+        """
+
+        return GraphRun(self, params)
+
+class GraphRun:
+
+    """
+    One evaluation of a `StageGraph`, recording which stages ran and how long they took.
+    """
+
+    def __init__(self, graph, params=None):
+
+        self.graph = graph
+        self.params = dict(params or {})
+        self.trace = []
+        self._evaluated = {}
+
+    def update(self, **params):
+
+        """
+        Set or change parameters; stages are re-validated on their next access.
+        """
+
+        self.params.update(params)
+        self._evaluated.clear()
+
+    def __getitem__(self, name):
+        return self._evaluate(name)[0]
+
+    def _evaluate(self, name):
+
+        """
+        Return (value, output key) of a stage, recomputing it only if its inputs changed.
+        """
+
+        if name in self._evaluated:
+            return self._evaluated[name]
+
+        stage = self.graph.stages[name]
+        kwargs = {}
+        input_keys = []
+
+        for input_name in self._inputs(stage):
+
+            if input_name in self.graph.stages:
+                value, key = self._evaluate(input_name)
+
+            elif input_name in self.params:
+                value = self.params[input_name]
+                key = make_key(value)
+
+            else:
+                raise KeyError(f'stage {name} needs parameter {input_name}, which is not set')
+
+            kwargs[input_name] = value
+            input_keys.append(key)
+
+            # guarded inputs are skipped entirely while the guard is off
+            if input_name == stage.guard and not value:
+                kwargs.update(dict.fromkeys(stage.guarded_inputs))
+                break
+
+        input_key = tuple(input_keys)
+        found, cached = stage.cache.get(input_key)
+        start = time.perf_counter()
+
+        if not found:
+
+            with profile_stage(name):
+                value = stage.func(**kwargs)
+
+            try:
+                output_key = make_key(value)
+            except TypeError:
+                output_key = ('unique', next(_unique_keys))
+
+            cached = (value, output_key)
+            stage.cache.put(input_key, cached)
+
+        self.trace.append(StageRun(name, not found, time.perf_counter() - start))
+        self._evaluated[name] = cached
+
+        return cached
+
+    def _inputs(self, stage):
+
+        """
+        Inputs of a stage in evaluation order, with the guard right before the inputs it guards.
+        """
+
+        if not stage.guarded_inputs:
+            return stage.inputs
+
+        others = tuple(name for name in stage.inputs if name != stage.guard)
+        return others + (stage.guard,) + stage.guarded_inputs
+
+    def recomputed(self):
+
+        """
+        Names of the stages that were re-executed in this run.
+        """
+
+        return [run.stage for run in self.trace if run.recomputed]
+
+# buy-vs-rent computation of app.py, on arrays (see cashflow.CashFlow) #
+buy_vs_rent = StageGraph('buy_vs_rent')
+
+@buy_vs_rent.stage('mortgage', ['mortgage_value', 'n_months', 'mort_interest', 'fgts_frequency', 'fgts_amount',
+                                 'amortization', 'fgts_policy'])
+def _mortgage(mortgage_value, n_months, mort_interest, fgts_frequency, fgts_amount, amortization, fgts_policy):
+
+    mortgage = calculate_mortgage_batch(
+        mortgage_value, n_months, mort_interest, fgts_frequency, fgts_amount, amortization, fgts_policy
+    )
+
+    n_rows = mortgage.pop('n_rows')[0]
+    return {key: value[0, :n_rows] for key, value in mortgage.items()}
+
+@buy_vs_rent.stage('horizon', ['time_horizon', 'mortgage'])
+def _horizon(time_horizon, mortgage):
+
+    # time horizon is at least the time of the mortgage
+    return max(time_horizon, mortgage['mort_balance'].shape[0])
+
+@buy_vs_rent.stage('home_value', ['total_amount', 'home_appreciation', 'horizon'])
+def _home_value(total_amount, home_appreciation, horizon):
+    return total_amount * growth_table.get(home_appreciation, horizon)
+
+@buy_vs_rent.stage('cash_flow', ['mortgage', 'home_value', 'downpay_amount'])
+def _cash_flow(mortgage, home_value, downpay_amount):
+    return CashFlow(mortgage, home_value, downpay_amount)
+
+@buy_vs_rent.stage('fgts_passive_income', ['cash_flow'])
+def _fgts_passive_income(cash_flow):
+
+    fgts_growth = growth_table.get(FGTS_INTEREST, len(cash_flow))
+    return compound_array(cash_flow.mort_fgts_paid, fgts_growth) - cash_flow.cumsum('mort_fgts_paid')
+
+@buy_vs_rent.stage('downpay_passive_income', ['downpay_amount', 'downpay_fgts_amount', 'invest_interest', 'horizon'])
+def _downpay_passive_income(downpay_amount, downpay_fgts_amount, invest_interest, horizon):
+
+    downpay_interest = (downpay_amount - downpay_fgts_amount) * growth_table.get(invest_interest, horizon)
+    downpay_fgts_interest = downpay_fgts_amount * growth_table.get(FGTS_INTEREST, horizon)
+
+    return downpay_interest + downpay_fgts_interest - downpay_amount
+
+@buy_vs_rent.stage('downpay_and_amort_passive_income', ['downpay_passive_income', 'fgts_passive_income'])
+def _downpay_and_amort_passive_income(downpay_passive_income, fgts_passive_income):
+    return downpay_passive_income + fgts_passive_income
+
+@buy_vs_rent.stage('rent', ['rent_amount', 'rent_appreciation', 'horizon'])
+def _rent(rent_amount, rent_appreciation, horizon):
+    return rent_amount * growth_table.get(rent_appreciation, horizon)
+
+@buy_vs_rent.stage('rent_reinvestment', ['rent', 'cash_flow', 'invest_interest', 'is_reinvestment'])
+def _rent_reinvestment(rent, cash_flow, invest_interest, is_reinvestment):
+
+    if not is_reinvestment:
+        return 0
+
+    invest_growth = growth_table.get(invest_interest, len(cash_flow))
+    return calculate_rent_reinvestment_array(rent, cash_flow.mort_installment, invest_growth)
+
+# without components the stage depends on nothing else, so rent and rate changes don't touch it
+@buy_vs_rent.stage('component_costs', ['components'], guard='components',
+                   guarded_inputs=['total_amount', 'downpay_amount', 'rent_amount', 'rent', 'cash_flow', 'mortgage',
+                                   'inflation', 'home_appreciation', 'rent_appreciation', 'invest_interest',
+                                   'is_reinvestment'])
+def _component_costs(components, total_amount, downpay_amount, rent_amount, rent, cash_flow, mortgage, inflation,
+                     home_appreciation, rent_appreciation, invest_interest, is_reinvestment):
+
+    if not components:
+        return 0
+
+    horizon = len(cash_flow)
+    rates = {
+        'inflation': inflation,
+        'home_appreciation': home_appreciation,
+        'rent_appreciation': rent_appreciation,
+        'invest_interest': invest_interest,
+    }
+
+    bases = {
+        'total_amount': total_amount,
+        'mortgage_value': total_amount - downpay_amount,
+        'rent_amount': rent_amount,
+        'home_value': cash_flow.home_value[None, :],
+        'mort_balance': cash_flow.mort_balance[None, :],
+        'rent': rent[None, :],
+    }
+
+    growths = {name: growth_table.get(rate, horizon)[None, :] for name, rate in rates.items()}
+    costs = component_costs(components, bases, growths, [horizon], [mortgage['mort_balance'].shape[0]])[0]
+
+    # cumulative costs, plus the passive income they would have earned
+    if is_reinvestment:
+        return compound_array(costs, growth_table.get(invest_interest, horizon))
+
+    return costs.cumsum()
+
+@buy_vs_rent.stage('total', ['rent', 'rent_reinvestment', 'cash_flow', 'downpay_and_amort_passive_income',
+                             'component_costs'])
+def _total(rent, rent_reinvestment, cash_flow, downpay_and_amort_passive_income, component_costs):
+
+    return (
+        rent.cumsum() +
+        rent_reinvestment +
+        cash_flow.estate -
+        downpay_and_amort_passive_income -
+        cash_flow.cumsum('mort_fgts_paid') -
+        cash_flow.cumsum('downpayment') -
+        cash_flow.cumsum('mort_installment') -
+        component_costs
+    )
+
+@buy_vs_rent.stage('final_total', ['total', 'inflation', 'use_inflation'])
+def _final_total(total, inflation, use_inflation):
+
+    if not use_inflation:
+        return total
+
+    return total / growth_table.get(inflation, total.shape[0])
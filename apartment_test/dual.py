@@ -0,0 +1,330 @@
+"""
+Forward-mode derivatives of the final buy-vs-rent result.
+
+`Dual` carries an array of values together with its derivatives with respect
+to a set of inputs, and implements the NumPy ufuncs the closed-form scorer
+(scoring.py) uses. Running the scorer once on dual inputs gives the final
+result and its derivative with respect to every input at the cost of a
+single vectorized pass. That covers the mortgage schedule, compounding and
+inflation, with no extra simulation per input. Scenarios the scorer doesn't
+support are differentiated by central finite differences, all perturbed
+copies running as one pipeline batch.
+"""
+
+import numpy as np
+import pandas as pd
+
+from pipeline import as_scenarios, final_totals
+from scoring import _closed_form_scores, is_supported
+
+# numeric inputs of interface.py the result is differentiated with respect to
+DIFFERENTIABLE_PARAMS = (
+    'total_amount',
+    'downpay_amount',
+    'downpay_fgts_amount',
+    'home_appreciation',
+    'inflation',
+    'mort_interest',
+    'fgts_amount',
+    'invest_interest',
+    'rent_amount',
+    'rent_appreciation',
+)
+
+RATE_PARAMS = ('home_appreciation', 'inflation', 'mort_interest', 'invest_interest', 'rent_appreciation')
+
+# change of each input shown by the tornado chart: rates move 1 p.p., amounts 10%
+RATE_STEP = 0.01
+AMOUNT_STEP = 0.1
+
+# finite difference steps of scenarios without a closed form: rates and share of amounts
+FD_RATE_STEP = 1e-3
+FD_AMOUNT_STEP = 1e-3
+
+def _derivative(x):
+    return x.deriv if isinstance(x, Dual) else None
+
+def _value(x):
+    return x.value if isinstance(x, Dual) else x
+
+def _chain(*terms):
+
+    """
+    Sum of (partial derivative, input derivative) products, skipping constant inputs.
+    """
+
+    total = None
+
+    for partial, deriv in terms:
+        if deriv is not None:
+            term = partial * deriv
+            total = term if total is None else total + term
+
+    return total
+
+# derivative rules of ufuncs: (result, *input values, *input derivatives) -> derivative
+_UNARY_RULES = {
+    np.negative: lambda r, a, da: -da,
+    np.positive: lambda r, a, da: da,
+    np.exp: lambda r, a, da: r * da,
+    np.expm1: lambda r, a, da: (r + 1) * da,
+    np.log1p: lambda r, a, da: da / (1 + a),
+    np.log: lambda r, a, da: da / a,
+    np.sqrt: lambda r, a, da: da / (2 * r),
+    np.absolute: lambda r, a, da: np.sign(a) * da,
+}
+
+_BINARY_RULES = {
+    np.add: lambda r, a, b, da, db: _chain((1, da), (1, db)),
+    np.subtract: lambda r, a, b, da, db: _chain((1, da), (-1, db)),
+    np.multiply: lambda r, a, b, da, db: _chain((b, da), (a, db)),
+    np.true_divide: lambda r, a, b, da, db: _chain((1 / b, da), (-r / b, db)),
+    np.minimum: lambda r, a, b, da, db: _chain((a <= b, da), (a > b, db)),
+    np.maximum: lambda r, a, b, da, db: _chain((a >= b, da), (a < b, db)),
+}
+
+# ufuncs whose result is piecewise constant (or boolean): no derivative
+_CONSTANT_UFUNCS = (
+    np.less, np.less_equal, np.greater, np.greater_equal, np.equal, np.not_equal,
+    np.isnan, np.isfinite, np.sign, np.floor_divide, np.remainder, np.floor, np.ceil,
+)
+
+class Dual:
+
+    """
+    Values with their derivatives with respect to a set of inputs.
+
+    `deriv` has the derivatives along its first axis: deriv[i] is the
+    derivative of `value` with respect to input i, with value's shape.
+    """
+
+    __slots__ = ('value', 'deriv')
+
+    def __init__(self, value, deriv):
+
+        self.value = np.asarray(value, dtype=float)
+        self.deriv = np.broadcast_to(deriv, (np.shape(deriv)[0],) + self.value.shape)
+
+    @classmethod
+    def variables(cls, values):
+
+        """
+        One dual per array of `values`, seeded as independent inputs.
+        """
+
+        values = [np.asarray(value, dtype=float) for value in values]
+        seeds = np.eye(len(values))
+
+        return [
+            cls(value, seeds[index].reshape((len(values),) + (1,) * value.ndim))
+            for index, value in enumerate(values)
+        ]
+
+    @property
+    def shape(self):
+        return self.value.shape
+
+    def __len__(self):
+        return len(self.value)
+
+    def __getitem__(self, key):
+        key = key if isinstance(key, tuple) else (key,)
+        return Dual(self.value[key], self.deriv[(slice(None),) + key])
+
+    def __repr__(self):
+        return f'Dual(value={self.value!r}, deriv={self.deriv!r})'
+
+    def __array_ufunc__(self, ufunc, method, *inputs, **kwargs):
+
+        if method != '__call__' or kwargs:
+            return NotImplemented
+
+        values = [_value(x) for x in inputs]
+        result = ufunc(*values)
+
+        if ufunc in _CONSTANT_UFUNCS:
+            return result
+
+        if ufunc in _UNARY_RULES:
+            return Dual(result, _UNARY_RULES[ufunc](result, values[0], _derivative(inputs[0])))
+
+        if ufunc is np.power and not isinstance(inputs[1], Dual):
+            base, exponent = values
+            return Dual(result, exponent * np.power(base, exponent - 1) * _derivative(inputs[0]))
+
+        if ufunc in _BINARY_RULES:
+            deriv = _BINARY_RULES[ufunc](result, *values, *(_derivative(x) for x in inputs))
+            return Dual(result, deriv)
+
+        raise TypeError(f'no derivative rule for {ufunc.__name__}')
+
+    def __array_function__(self, func, types, args, kwargs):
+
+        if func is np.where:
+            condition, x, y = args
+            deriv_x, deriv_y = _derivative(x), _derivative(y)
+            deriv = np.where(condition, 0. if deriv_x is None else deriv_x, 0. if deriv_y is None else deriv_y)
+            return Dual(np.where(condition, _value(x), _value(y)), deriv)
+
+        # rounding only trims the displayed value: derivatives pass through
+        if func in (np.round, np.around):
+            return Dual(func(args[0].value, *args[1:], **kwargs), args[0].deriv)
+
+        return NotImplemented
+
+    def __add__(self, other):
+        return np.add(self, other)
+
+    def __radd__(self, other):
+        return np.add(other, self)
+
+    def __sub__(self, other):
+        return np.subtract(self, other)
+
+    def __rsub__(self, other):
+        return np.subtract(other, self)
+
+    def __mul__(self, other):
+        return np.multiply(self, other)
+
+    def __rmul__(self, other):
+        return np.multiply(other, self)
+
+    def __truediv__(self, other):
+        return np.true_divide(self, other)
+
+    def __rtruediv__(self, other):
+        return np.true_divide(other, self)
+
+    def __pow__(self, other):
+        return np.power(self, other)
+
+    def __neg__(self):
+        return np.negative(self)
+
+    def __floordiv__(self, other):
+        return np.floor_divide(self, other)
+
+    def __lt__(self, other):
+        return np.less(self, other)
+
+    def __le__(self, other):
+        return np.less_equal(self, other)
+
+    def __gt__(self, other):
+        return np.greater(self, other)
+
+    def __ge__(self, other):
+        return np.greater_equal(self, other)
+
+    def __eq__(self, other):
+        return np.equal(self, other)
+
+    def __ne__(self, other):
+        return np.not_equal(self, other)
+
+    __hash__ = None
+
+def _finite_difference_steps(scenarios, names):
+    return [
+        np.full(scenarios[name].shape, FD_RATE_STEP) if name in RATE_PARAMS
+        else FD_AMOUNT_STEP * np.maximum(np.abs(scenarios[name]), 1e3)
+        for name in names
+    ]
+
+def gradient(params, names=DIFFERENTIABLE_PARAMS, components=None):
+
+    """
+    Final buy-vs-rent result of each scenario and its derivatives with respect to `names`.
+
+    Args:
+        params (dict): inputs, as scalars or arrays (see `pipeline.simulate_batch`)
+        names (tuple): inputs to differentiate with respect to
+        components (list): additional costs of buying and renting (see
+            `pipeline.simulate_batch`), which the scorer doesn't cover
+
+    Returns:
+
+        total (np.ndarray): final result of each scenario
+        derivatives (np.ndarray): (scenarios x names) derivatives
+    """
+
+    scenarios = as_scenarios(params)
+    n_scenarios = scenarios['total_amount'].shape[0]
+    supported = is_supported(scenarios) & (not components)
+
+    total = np.empty(n_scenarios)
+    derivatives = np.empty((n_scenarios, len(names)))
+
+    rows = np.flatnonzero(supported)
+
+    if rows.size:
+
+        chunk = {name: values[rows] for name, values in scenarios.items()}
+        chunk.update(zip(names, Dual.variables([chunk[name] for name in names])))
+
+        result = _closed_form_scores(chunk, None)
+        total[rows] = result.value
+        derivatives[rows] = result.deriv.T
+
+    rows = np.flatnonzero(~supported)
+
+    if rows.size:
+
+        chunk = {name: values[rows] for name, values in scenarios.items()}
+        steps = _finite_difference_steps(chunk, names)
+
+        # the scenarios, then each input moved up and down, in one batch
+        copies = [chunk]
+        for name, step in zip(names, steps):
+            for sign in (1, -1):
+                copies.append({**chunk, name: chunk[name] + sign * step})
+
+        batch = {name: np.concatenate([copy[name] for copy in copies]) for name in chunk}
+        totals = final_totals(batch, components=components).reshape(len(copies), rows.size)
+
+        total[rows] = totals[0]
+        derivatives[rows] = ((totals[1::2] - totals[2::2]) / (2 * np.array(steps))).T
+
+    return total, derivatives
+
+def tornado(params, names=DIFFERENTIABLE_PARAMS, components=None):
+
+    """
+    Change of the final result of one scenario when each input moves up and down by a typical step.
+
+    Rates move by `RATE_STEP` and amounts by `AMOUNT_STEP` of their value,
+    one input at a time, with the additional costs of `components` (see
+    `pipeline.simulate_batch`). Every moved copy runs in one pipeline batch.
+
+    Returns:
+
+        tornado (pd.DataFrame): 'value', 'step', the changes of the result
+            with the input moved 'up' and 'down', and their largest absolute
+            'impact' of each input, largest impact first
+    """
+
+    scenarios = as_scenarios(params)
+    if scenarios['total_amount'].shape[0] != 1:
+        raise ValueError('tornado takes the inputs of a single scenario')
+
+    values = np.array([scenarios[name][0] for name in names], dtype=float)
+    steps = np.array([RATE_STEP if name in RATE_PARAMS else AMOUNT_STEP * abs(value) for name, value in zip(names, values)])
+
+    # the scenario, then each input moved up and down
+    copies = [scenarios]
+    for name, step in zip(names, steps):
+        for sign in (1, -1):
+            copies.append({**scenarios, name: scenarios[name] + sign * step})
+
+    batch = {name: np.concatenate([copy[name] for copy in copies]) for name in scenarios}
+    totals = final_totals(batch, components=components)
+    up = totals[1::2] - totals[0]
+    down = totals[2::2] - totals[0]
+
+    frame = pd.DataFrame(
+        {'value': values, 'step': steps, 'up': up, 'down': down, 'impact': np.maximum(np.abs(up), np.abs(down))},
+        index=pd.Index(names, name='param')
+    )
+
+    return frame.sort_values('impact', ascending=False, kind='stable')
@@ -2,6 +2,18 @@ import numpy as np
 import pandas as pd
 import streamlit as st
 from core import apply_interest_series
+from components import DEFAULT_COMPONENTS
+
+# inputs that can be varied by the analysis sections
+# label: (parameter, min, max, scale from displayed value to model value)
+PARAM_OPTIONS = {
+    'CET do financiamento (% ao ano)': ('mort_interest', 5.0, 12.0, 1/100),
+    'Valorização do imóvel (% ao ano)': ('home_appreciation', -10.0, 10.0, 1/100),
+    'Valor do aluguel (R$ por mês)': ('rent_amount', 0., 20e3, 1),
+    'Aumento do aluguel (% ao ano)': ('rent_appreciation', 0.0, 15.0, 1/100),
+    'Rendimento dos investimentos (% ao ano)': ('invest_interest', 0.0, 30.0, 1/100),
+    'Inflação (% ao ano)': ('inflation', -10.0, 10.0, 1/100),
+}
 
 def display_header():
 
@@ -90,7 +102,8 @@ def display_mortage_section_basic_info(total_amount, downpay_amount):
         2. Você constrói patrimônio na forma do imóvel, que valoriza no tempo (receita)\n
         O ponto (1) gera uma desvantagem financeira em relação ao aluguel e o ponto (2) gera uma vantagem. 
         O saldo será positivo se o apartamento tiver uma valorização acima dos juros do financiamento. 
-        Assumimos que o financiamento seguirá a tabela SAC, onde a amortização é constante.
+        O financiamento pode seguir a tabela SAC, onde a amortização é constante e as parcelas diminuem com o tempo,
+        ou a tabela Price, onde as parcelas são constantes.
         """
     )
 
@@ -113,7 +126,18 @@ def display_mortage_section_basic_info(total_amount, downpay_amount):
         0.1,
     ) / 100
 
-    return mortgage_value, n_months, mort_interest
+    amortization_options = {
+        'SAC (amortização constante)': 'sac',
+        'Price (parcelas constantes)': 'price',
+    }
+
+    amortization = amortization_options[st.selectbox(
+        'Qual é o sistema de amortização do financiamento?',
+        list(amortization_options.keys()),
+        index=0
+    )]
+
+    return mortgage_value, n_months, mort_interest, amortization
 
 
 def display_mortage_section_fgts_info(downpay_amount, mortgage_value):
@@ -137,11 +161,23 @@ def display_mortage_section_fgts_info(downpay_amount, mortgage_value):
             format='%0f'
         )
 
+        fgts_policy_options = {
+            'Reduzir o prazo (mantendo as parcelas)': 'reduce_term',
+            'Reduzir o valor das parcelas (mantendo o prazo)': 'reduce_installment',
+        }
+
+        fgts_policy = fgts_policy_options[st.selectbox(
+            'Ao amortizar com o FGTS, você prefere:',
+            list(fgts_policy_options.keys()),
+            index=0
+        )]
+
     else:
         fgts_amount = 0
         fgts_frequency = 2
+        fgts_policy = 'reduce_term'
 
-    return fgts_amount, fgts_frequency
+    return fgts_amount, fgts_frequency, fgts_policy
 
 def display_investments_section():
 
@@ -226,6 +262,47 @@ def display_rent_reinvestment_option():
 
     return is_rent_reinvestment
 
+def display_additional_costs_option():
+
+    is_costs = st.checkbox(
+        """
+        Deseja incluir custos adicionais? (ITBI, escritura e registro, IPTU, condomínio,
+        manutenção, seguros do financiamento e caução do aluguel)
+        """
+    )
+
+    if not is_costs:
+        return ()
+
+    labels = {
+        'itbi': 'ITBI (3% do valor do imóvel)',
+        'registry': 'Escritura e registro (1% do valor do imóvel)',
+        'iptu': 'IPTU (0,6% do valor do imóvel por ano)',
+        'condominium': 'Condomínio',
+        'maintenance': 'Manutenção (0,5% do valor do imóvel por ano)',
+        'insurance_mip': 'Seguro MIP (0,03% do saldo devedor por mês)',
+        'insurance_dfi': 'Seguro DFI (0,007% do valor do imóvel por mês)',
+        'rental_deposit': 'Caução do aluguel (3 aluguéis, devolvidos no fim)',
+    }
+
+    selected = st.multiselect(
+        'Quais custos incluir? (IPTU e condomínio costumam ser pagos também por quem aluga)',
+        list(labels.values()),
+        list(labels.values())
+    )
+
+    condominium = st.number_input('Valor do condomínio hoje (R$ por mês)', 0., 10e3, 500., 50., format='%0f')
+
+    # the refund of the deposit goes with the deposit
+    names = {name for name, label in labels.items() if label in selected}
+    names |= {'rental_deposit_refund'} if 'rental_deposit' in names else set()
+
+    return tuple(
+        component._replace(rate=condominium) if component.name == 'condominium' else component
+        for component in DEFAULT_COMPONENTS
+        if component.name in names
+    )
+
 def display_final_results_section():
 
     st.title("4. Resultado final")
@@ -238,6 +315,7 @@ def display_final_results_section():
         **(+)** * Renda passiva potencial do reinvestimento da diferença entre parcelas e aluguel * \n 
         **(-)** * Total pago no imóvel (entrada + financiamento) * \n
         **(-)** * Renda passiva potencial do investimento da entrada e FGTS se não tivessem sido usados na compra do imóvel* \n
+        **(-)** * Custos adicionais de comprar menos os de alugar, se incluídos, com sua renda passiva potencial * \n
         Lembrando que resultados positivos indicam que comprar é mais vantajoso que alugar.  
         """
     )
@@ -260,3 +338,181 @@ def display_conclusion(total):
         """
     )
 
+
+def display_sensitivity_section():
+
+    st.title("5. Análise de sensibilidade")
+    st.markdown(
+        """
+        O resultado final depende bastante das premissas. Aqui você pode variar duas delas
+        ao mesmo tempo e ver, em um mapa de calor, o resultado final para cada combinação.
+        A linha preta marca as combinações onde comprar e alugar empatam.
+        """
+    )
+
+    is_sensitivity = st.checkbox('Mostrar análise de sensibilidade?')
+
+    if not is_sensitivity:
+        return is_sensitivity, None, None
+
+    labels = list(PARAM_OPTIONS.keys())
+    x_label = st.selectbox('Premissa no eixo horizontal', labels, index=0)
+    y_label = st.selectbox('Premissa no eixo vertical', [label for label in labels if label != x_label], index=0)
+
+    n_points = st.slider('Quantidade de pontos em cada eixo', 10, 50, 30, 5)
+
+    axes = []
+    for label in (x_label, y_label):
+
+        name, min_value, max_value, scale = PARAM_OPTIONS[label]
+        values_range = st.slider(f'Intervalo: {label}', min_value, max_value, (min_value, max_value))
+        values = np.linspace(values_range[0], values_range[1], n_points)
+        axes.append((name, label, values, scale))
+
+    return is_sensitivity, axes[0], axes[1]
+
+def display_monte_carlo_section():
+
+    st.title("6. Simulação de Monte Carlo")
+    st.markdown(
+        """
+        Até aqui, valorização do imóvel, aluguel, inflação e rendimento dos investimentos foram
+        considerados constantes. Na simulação de Monte Carlo, sorteamos milhares de trajetórias
+        possíveis para essas taxas (com as médias escolhidas acima) e mostramos a faixa de
+        resultados mais prováveis.
+        """
+    )
+
+    is_monte_carlo = st.checkbox('Rodar simulação de Monte Carlo?')
+
+    if not is_monte_carlo:
+        return is_monte_carlo, None, None, None
+
+    process_options = {
+        'Lognormal (choques independentes a cada mês)': 'lognormal',
+        'Reversão à média (taxas oscilam em torno da média)': 'mean_reverting',
+    }
+
+    process = process_options[st.selectbox('Como as taxas variam ao longo do tempo?', list(process_options.keys()))]
+
+    volatility_options = {
+        'home_appreciation': ('Volatilidade anual da valorização do imóvel (%)', 8.0),
+        'rent_appreciation': ('Volatilidade anual do aumento do aluguel (%)', 4.0),
+        'invest_interest': ('Volatilidade anual do rendimento dos investimentos (%)', 10.0),
+        'inflation': ('Volatilidade anual da inflação (%)', 2.0),
+    }
+
+    volatilities = {
+        name: st.slider(label, 0.0, 30.0, default, 0.5) / 100
+        for name, (label, default) in volatility_options.items()
+    }
+
+    n_paths = st.select_slider('Quantidade de trajetórias simuladas', [1000, 5000, 10000, 50000, 100000], 10000)
+
+    return is_monte_carlo, process, volatilities, n_paths
+
+def display_monte_carlo_conclusion(prob_buy_wins, n_dropped=0):
+
+    st.markdown(
+        f"""
+        Em **{100 * prob_buy_wins:.0f}%** das trajetórias simuladas, 
+        comprar o imóvel foi mais vantajoso do que alugar ao final do horizonte.
+        """
+    )
+
+    if n_dropped:
+        st.caption(f'{n_dropped} trajetórias com resultado indefinido em algum mês foram desconsideradas nesses meses.')
+
+def display_break_even_section():
+
+    st.title("7. Ponto de equilíbrio")
+    st.markdown(
+        """
+        Em vez de mover os controles até o resultado mudar de sinal, você pode pedir para a
+        ferramenta encontrar o valor de uma premissa que faz comprar e alugar empatarem
+        (por exemplo, o aluguel a partir do qual comprar passa a valer a pena),
+        mantendo todas as outras premissas como estão.
+        """
+    )
+
+    is_break_even = st.checkbox('Calcular ponto de equilíbrio?')
+
+    if not is_break_even:
+        return is_break_even, None
+
+    label = st.selectbox('Qual premissa você quer encontrar?', list(PARAM_OPTIONS.keys()), index=2)
+    name, min_value, max_value, scale = PARAM_OPTIONS[label]
+
+    return is_break_even, (name, label, min_value, max_value, scale)
+
+def display_break_even_result(label, value):
+
+    if np.isnan(value):
+        st.markdown(
+            f"""
+            Não foi encontrado ponto de equilíbrio para **{label}** dentro do intervalo considerado: 
+            o resultado final tem o mesmo sinal em todo o intervalo, ou a busca não convergiu.
+            """
+        )
+
+    else:
+        st.markdown(
+            f"""
+            Comprar e alugar empatam quando **{label}** vale **{value:,.2f}**.
+            """
+        )
+
+def display_tornado_section():
+
+    st.title("8. O que mais influencia o resultado")
+    st.markdown(
+        """
+        Qual premissa pesa mais na decisão? Aqui cada premissa é movida um pouco para cima
+        e para baixo (as taxas em 1 ponto percentual e os valores em 10%), uma de cada vez,
+        e o resultado é recalculado. O gráfico mostra quanto o resultado final muda em cada
+        sentido, da premissa mais importante para a menos importante.
+        """
+    )
+
+    is_tornado = st.checkbox('Mostrar premissas mais importantes?')
+
+    labels = {
+        'total_amount': 'Valor do imóvel',
+        'downpay_amount': 'Valor da entrada',
+        'downpay_fgts_amount': 'FGTS na entrada',
+        'home_appreciation': 'Valorização do imóvel',
+        'inflation': 'Inflação',
+        'mort_interest': 'CET do financiamento',
+        'fgts_amount': 'FGTS para amortizar',
+        'invest_interest': 'Rendimento dos investimentos',
+        'rent_amount': 'Valor do aluguel',
+        'rent_appreciation': 'Aumento do aluguel',
+    }
+
+    return is_tornado, labels
+
+def display_tornado_conclusion(impacts, labels):
+
+    st.markdown(
+        f"""
+        A premissa que mais influencia o resultado é **{labels[impacts.index[0]]}**: a variação
+        considerada muda o resultado final em até cerca de **{impacts['impact'].iloc[0]/1e3:.0f} mil reais**.
+        """
+    )
+
+def display_profiling_option():
+
+    return st.sidebar.checkbox('Mostrar perfil de execução?')
+
+def display_profile_panel(profile, stage_runs):
+
+    st.sidebar.title('Perfil de execução')
+    st.sidebar.markdown(f'Tempo total da execução: **{1e3 * profile.seconds:.0f} ms**')
+
+    stages = pd.DataFrame.from_dict(profile.summary(), orient='index')
+    stages['ms'] = (1e3 * stages.pop('seconds')).round(1)
+    st.sidebar.dataframe(stages[['ms', 'calls', 'DataFrame', 'Series']].sort_values('ms', ascending=False))
+
+    st.sidebar.markdown('Etapas do cálculo reaproveitadas do cache:')
+    cached = dict.fromkeys(stage_run.stage for stage_run in stage_runs if not stage_run.recomputed)
+    st.sidebar.write(', '.join(cached) or 'nenhuma')
@@ -0,0 +1,130 @@
+import numpy as np
+
+from pipeline import as_scenarios, final_totals
+from solver import solve_break_even
+
+# loan terms (months) of the affordability frontier
+TERM_GRID = np.arange(60, 361, 12)
+
+# default upper end of the price search, in months of rent
+MAX_PRICE_TO_RENT = 1200
+
+def max_affordable_price(params=None, target=0., lower=None, upper=None, **solver_kwargs):
+
+    """
+    Most expensive property for which buying still reaches `target` at the horizon.
+
+    Solves for `total_amount` with the downpayment fixed (the client's savings),
+    so a pricier property only means a larger mortgage. The search starts with
+    no mortgage at all and goes up to `MAX_PRICE_TO_RENT` months of rent.
+    Scenarios that reach the target over the whole bracket, or nowhere in it,
+    get NaN.
+
+    Args:
+        params (dict): inputs of each client, as scalars or arrays (see `pipeline.simulate_batch`)
+        target (array-like): final result to reach, zero for "buying breaks even"
+        lower (array-like): lowest price searched, defaults to the downpayment
+        upper (array-like): highest price searched
+        **solver_kwargs: tolerances and components passed to `solver.solve_break_even`
+
+    Returns:
+
+        price (np.ndarray): maximum property price of each client, one entry
+            per scenario (a 1-element array for scalar inputs)
+    """
+
+    scenarios = as_scenarios({key: value for key, value in (params or {}).items() if key != 'total_amount'})
+
+    lower = scenarios['downpay_amount'] if lower is None else lower
+    upper = scenarios['downpay_amount'] + MAX_PRICE_TO_RENT * scenarios['rent_amount'] if upper is None else upper
+
+    return solve_break_even('total_amount', lower, upper, scenarios, target, **solver_kwargs)
+
+def min_downpayment(params=None, target=0., lower=None, upper=None, **solver_kwargs):
+
+    """
+    Downpayment for which buying reaches `target` at the horizon, for a given property price.
+
+    The search goes from the FGTS part of the downpayment (which stays fixed)
+    to the whole price, i.e. no mortgage. Scenarios that already reach the
+    target with the lowest downpayment get it; those that reach it nowhere in
+    the bracket get NaN.
+
+    Args:
+        params (dict): inputs of each client, as scalars or arrays (see `pipeline.simulate_batch`)
+        target (array-like): final result to reach, zero for "buying breaks even"
+        lower (array-like): lowest downpayment searched, defaults to the FGTS part
+        upper (array-like): highest downpayment searched, defaults to the property price
+        **solver_kwargs: tolerances and components passed to `solver.solve_break_even`
+
+    Returns:
+
+        downpayment (np.ndarray): downpayment of each client, one entry per
+            scenario (a 1-element array for scalar inputs)
+    """
+
+    scenarios = as_scenarios({key: value for key, value in (params or {}).items() if key != 'downpay_amount'})
+
+    lower = scenarios['downpay_fgts_amount'] if lower is None else lower
+    upper = scenarios['total_amount'] if upper is None else upper
+
+    downpayment = solve_break_even('downpay_amount', lower, upper, scenarios, target, **solver_kwargs)
+
+    # no sign change: either the lowest downpayment is enough or none is
+    unsolved = np.flatnonzero(np.isnan(downpayment))
+
+    if unsolved.size:
+
+        scenarios = as_scenarios(scenarios, downpayment.shape[0])
+        lower, target = (np.broadcast_to(np.asarray(value, dtype=float), downpayment.shape) for value in (lower, target))
+
+        params = {name: values[unsolved] for name, values in scenarios.items()}
+        params['downpay_amount'] = lower[unsolved]
+
+        reached = final_totals(params, components=solver_kwargs.get('components')) >= target[unsolved]
+        downpayment[unsolved[reached]] = lower[unsolved[reached]]
+
+    return downpayment
+
+def term_frontier(solve_for='price', params=None, n_months=TERM_GRID, target=0., **kwargs):
+
+    """
+    Maximum price or minimum downpayment of each client for every loan term of a grid.
+
+    Every (client, term) pair is one scenario of a single vectorized solve,
+    so the whole frontier takes as many pipeline evaluations as one client.
+
+    Args:
+        solve_for (str): 'price' (see `max_affordable_price`) or 'downpayment' (see `min_downpayment`)
+        params (dict): inputs of each client, as scalars or arrays (see `pipeline.simulate_batch`)
+        n_months (array-like): loan terms, in months
+        target (array-like): final result to reach, per client
+        **kwargs: bracket and tolerances of the chosen solver
+
+    Returns:
+
+        frontier (np.ndarray): (clients x terms) solutions
+    """
+
+    solvers = {'price': max_affordable_price, 'downpayment': min_downpayment}
+
+    if solve_for not in solvers:
+        raise ValueError(f'unknown solve_for: {solve_for}, expected one of {tuple(solvers)}')
+
+    n_months = np.asarray(n_months, dtype=int)
+    scenarios = as_scenarios({key: value for key, value in (params or {}).items() if key != 'n_months'})
+    n_clients = scenarios['n_months'].shape[0]
+    target = np.broadcast_to(np.asarray(target, dtype=float), n_clients)
+
+    # clients along rows, terms along columns
+    grid = {name: np.repeat(values, n_months.shape[0]) for name, values in scenarios.items()}
+    grid['n_months'] = np.tile(n_months, n_clients)
+
+    kwargs = {
+        name: np.repeat(np.broadcast_to(value, n_clients), n_months.shape[0]) if name in ('lower', 'upper') else value
+        for name, value in kwargs.items()
+    }
+
+    solution = solvers[solve_for](grid, np.repeat(target, n_months.shape[0]), **kwargs)
+
+    return solution.reshape(n_clients, n_months.shape[0])
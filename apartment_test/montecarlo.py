@@ -0,0 +1,272 @@
+import os
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import numpy as np
+
+from core import convert_yearly_to_monthly_interest
+from pipeline import DEFAULT_PARAMS, MORTGAGE_RATE_PARAMS, RATE_PARAMS, simulate_batch
+
+RATE_PROCESSES = ('constant', 'lognormal', 'mean_reverting')
+
+DEFAULT_QUANTILES = (0.05, 0.5, 0.95)
+
+# rates the engine turns into monthly rates by dividing by 12 instead of
+# compounding (the mortgage interest, as mort_interest / 12 in core.py)
+NOMINAL_RATE_PARAMS = ('mort_interest',)
+
+def sample_rate_paths(spec, n_paths, n_months, rng, nominal=False):
+
+    """
+    Draw monthly rate paths from a yearly rate process.
+
+    `spec` is a dict with the 'process' name (one of `RATE_PROCESSES`), its
+    long-run yearly 'mean' and yearly 'volatility'. Mean-reverting processes
+    also take the reversion 'speed' (per year) and the 'initial' yearly rate,
+    which defaults to the mean.
+
+    Yearly rates are converted to the effective monthly rate, or divided by
+    12 when `nominal` is set.
+
+    Args:
+        spec (dict): process specification
+        n_paths (int): number of paths
+        n_months (int): number of months of each path
+        rng (np.random.Generator): random number generator
+        nominal (bool): whether the yearly rate is nominal
+
+    Returns:
+
+        monthly_interest (np.ndarray): (n_paths x n_months) monthly rates
+    """
+
+    process = spec.get('process', 'constant')
+    mean = spec['mean']
+    volatility = spec.get('volatility', 0.)
+
+    def to_monthly(yearly_interest):
+        return yearly_interest / 12 if nominal else convert_yearly_to_monthly_interest(yearly_interest)
+
+    if process == 'constant':
+        return np.full((n_paths, n_months), to_monthly(mean))
+
+    if process == 'lognormal':
+        # monthly log-growth with an expected monthly rate of to_monthly(mean)
+        drift = np.log1p(to_monthly(mean)) - volatility ** 2 / 24
+        log_growth = rng.normal(drift, volatility / np.sqrt(12), (n_paths, n_months))
+        return np.expm1(log_growth)
+
+    if process == 'mean_reverting':
+        # Ornstein-Uhlenbeck process on the yearly rate, discretized monthly
+        speed = spec.get('speed', 1.)
+        shocks = rng.normal(0., volatility / np.sqrt(12), (n_paths, n_months))
+        yearly_interest = np.empty((n_paths, n_months))
+        current = np.full(n_paths, spec.get('initial', mean), dtype=float)
+
+        for month in range(n_months):
+            current = current + speed * (mean - current) / 12 + shocks[:, month]
+            yearly_interest[:, month] = current
+
+        return to_monthly(np.clip(yearly_interest, -0.99, None))
+
+    raise ValueError(f'unknown rate process: {process}')
+
+def _simulate_totals(params, specs, n_paths, seed, components=None):
+
+    """
+    Monthly buy-vs-rent totals of `n_paths` random rate paths.
+    """
+
+    rng = np.random.default_rng(seed)
+    merged = {**DEFAULT_PARAMS, **params}
+
+    # long enough for any mortgage schedule and the requested horizon
+    n_months = max(merged['time_horizon'], merged['n_months'] + 1)
+
+    rate_paths = {
+        name: sample_rate_paths(spec, n_paths, n_months, rng, name in NOMINAL_RATE_PARAMS)
+        for name, spec in specs.items()
+    }
+
+    return simulate_batch(params, rate_paths, components=components)['total']
+
+def _histogram_bins(totals, n_bins):
+
+    """
+    Per-month equal-width bins covering the finite totals of a pilot sample with some headroom.
+    """
+
+    finite = np.isfinite(totals)
+
+    # months without any finite total get bins around zero
+    low = np.where(finite.any(axis=0), np.where(finite, totals, np.inf).min(axis=0), 0.)
+    high = np.where(finite.any(axis=0), np.where(finite, totals, -np.inf).max(axis=0), 0.)
+    margin = np.maximum(0.5 * (high - low), 1.)
+
+    return low - margin, (high - low + 2 * margin) / n_bins, n_bins
+
+def _summarize(totals, bins):
+
+    """
+    Reduce simulated totals to mergeable per-month statistics.
+
+    Values are counted in the equal-width bins of `bins` plus one underflow
+    and one overflow bin, so summaries of different chunks can be added up.
+    Non-finite totals are left out of every statistic; paths with any of
+    them are counted as dropped.
+    """
+
+    low, width, n_bins = bins
+    n_months = totals.shape[1]
+
+    finite = np.isfinite(totals)
+    values = np.where(finite, totals, 0.)
+
+    bin_index = np.clip(np.floor((values - low) / width).astype(int) + 1, 0, n_bins + 1)
+    flat_index = (np.arange(n_months) * (n_bins + 2) + bin_index)[finite]
+    counts = np.bincount(flat_index, minlength=n_months * (n_bins + 2)).reshape(n_months, n_bins + 2)
+
+    return {
+        'counts': counts,
+        'wins': (values > 0).sum(axis=0),
+        'sums': values.sum(axis=0),
+        'minimum': np.where(finite, totals, np.inf).min(axis=0),
+        'maximum': np.where(finite, totals, -np.inf).max(axis=0),
+        'n_finite': finite.sum(axis=0),
+        'n_dropped': int((~finite).any(axis=1).sum()),
+        'n_paths': totals.shape[0],
+    }
+
+def _merge(summary, other):
+
+    """
+    Merge two chunk summaries.
+    """
+
+    return {
+        'counts': summary['counts'] + other['counts'],
+        'wins': summary['wins'] + other['wins'],
+        'sums': summary['sums'] + other['sums'],
+        'minimum': np.minimum(summary['minimum'], other['minimum']),
+        'maximum': np.maximum(summary['maximum'], other['maximum']),
+        'n_finite': summary['n_finite'] + other['n_finite'],
+        'n_dropped': summary['n_dropped'] + other['n_dropped'],
+        'n_paths': summary['n_paths'] + other['n_paths'],
+    }
+
+def _simulate_chunk(params, specs, n_paths, seed, bins, components=None):
+
+    """
+    Simulate one chunk of paths in a worker and return only its summary.
+    """
+
+    return _summarize(_simulate_totals(params, specs, n_paths, seed, components), bins)
+
+def _histogram_quantile(summary, bins, quantile):
+
+    """
+    Per-month quantile interpolated linearly inside the histogram bins.
+    """
+
+    low, width, n_bins = bins
+    counts = summary['counts']
+
+    cumulative = counts.cumsum(axis=1)
+    target = quantile * summary['n_finite']
+    bin_index = np.minimum((cumulative < target[:, None]).sum(axis=1), n_bins + 1)
+
+    rows = np.arange(counts.shape[0])
+    count_before = np.where(bin_index > 0, cumulative[rows, np.maximum(bin_index - 1, 0)], 0)
+    fraction = (target - count_before) / np.maximum(counts[rows, bin_index], 1)
+
+    # under/overflow bins are bounded by the observed extremes
+    left = np.where(bin_index == 0, summary['minimum'], low + (bin_index - 1) * width)
+    right = np.where(bin_index == n_bins + 1, summary['maximum'], low + bin_index * width)
+    with np.errstate(invalid='ignore'):
+        value = np.clip(left + fraction * (right - left), summary['minimum'], summary['maximum'])
+
+    # months without any finite total have no quantile
+    return np.where(summary['n_finite'] > 0, value, np.nan)
+
+def run_monte_carlo(params, specs, n_paths=10000, chunk_size=1000, n_workers=None,
+                    quantiles=DEFAULT_QUANTILES, n_bins=2000, seed=0, components=None):
+
+    """
+    Monte Carlo simulation of the buy-vs-rent result under stochastic rates.
+
+    Paths are simulated in chunks across a process pool. Each chunk is reduced
+    to per-month histograms and counters before it is returned, so peak memory
+    depends on `chunk_size` and the number of workers, not on `n_paths`.
+    Quantiles are interpolated from histograms whose bins are fitted to the
+    first chunk; values outside them are still tracked exactly by the
+    under/overflow bins and the per-month extremes.
+
+    Args:
+        params (dict): fixed inputs of the simulation, keyed as in `pipeline.PARAM_NAMES`
+        specs (dict): rate process specifications (see `sample_rate_paths`)
+            keyed by `pipeline.RATE_PARAMS` or `pipeline.MORTGAGE_RATE_PARAMS`
+            (variable-rate or indexed mortgages)
+        n_paths (int): number of simulated paths
+        chunk_size (int): number of paths simulated per task
+        n_workers (int): number of worker processes (1 runs everything in-process,
+            None uses every CPU)
+        quantiles (tuple): quantiles to estimate at each month
+        n_bins (int): number of histogram bins per month
+        seed (int): seed of the random number generator
+        components (list): additional costs of buying and renting (see `pipeline.simulate_batch`)
+
+    Returns:
+
+        results (dict): per-month 'quantiles' (keyed by quantile), 'mean' and
+            'prob_buy_wins' (share of paths where buying beats renting)
+            over the finite totals of each month, plus the number of
+            simulated paths and of paths dropped for non-finite totals
+    """
+
+    unknown = set(specs) - set(RATE_PARAMS + MORTGAGE_RATE_PARAMS)
+    if unknown:
+        raise ValueError(f'unknown rate processes for: {sorted(unknown)}')
+
+    chunk_sizes = [min(chunk_size, n_paths - start) for start in range(0, n_paths, chunk_size)]
+    seeds = np.random.SeedSequence(seed).spawn(len(chunk_sizes))
+
+    # the first chunk fixes the histogram bins used by every other chunk
+    pilot = _simulate_totals(params, specs, chunk_sizes[0], seeds[0], components)
+    bins = _histogram_bins(pilot, n_bins)
+    summary = _summarize(pilot, bins)
+    del pilot
+
+    tasks = list(zip(chunk_sizes[1:], seeds[1:]))
+    n_workers = n_workers or os.cpu_count() or 1
+
+    if n_workers == 1 or not tasks:
+        for size, chunk_seed in tasks:
+            summary = _merge(summary, _simulate_chunk(params, specs, size, chunk_seed, bins, components))
+
+    else:
+        with ProcessPoolExecutor(max_workers=n_workers) as pool:
+
+            pending = set()
+            for size, chunk_seed in tasks:
+
+                # keep a bounded number of chunks in flight
+                if len(pending) >= 2 * n_workers:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        summary = _merge(summary, future.result())
+
+                pending.add(pool.submit(_simulate_chunk, params, specs, size, chunk_seed, bins, components))
+
+            for future in wait(pending).done:
+                summary = _merge(summary, future.result())
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = summary['sums'] / summary['n_finite']
+        prob_buy_wins = summary['wins'] / summary['n_finite']
+
+    return {
+        'quantiles': {quantile: _histogram_quantile(summary, bins, quantile) for quantile in quantiles},
+        'mean': mean,
+        'prob_buy_wins': prob_buy_wins,
+        'n_paths': summary['n_paths'],
+        'n_dropped': summary['n_dropped'],
+    }
@@ -0,0 +1,165 @@
+import itertools
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from core import FGTS_INTEREST, FGTS_POLICIES, build_event_schedule, convert_yearly_to_monthly_interest
+from pipeline import DEFAULT_PARAMS, final_total, simulate_batch
+
+# the FGTS balance can be used to amortize a mortgage at most once every two years
+MIN_FGTS_INTERVAL = 2
+
+CANDIDATE_COLUMNS = ('fgts_interval', 'fgts_first_year', 'extra_amount', 'extra_years', 'fgts_policy')
+
+def fgts_events(monthly_deposit, interval, first_year, n_months):
+
+    """
+    Months and amounts of FGTS uses every `interval` years, starting at `first_year`.
+
+    Each use withdraws the balance accumulated since the previous one, made of
+    monthly deposits yielding `FGTS_INTEREST`. An interval of zero means FGTS
+    is never used.
+    """
+
+    if interval == 0:
+        return np.zeros(0, dtype=int), np.zeros(0)
+
+    months = np.arange(12 * first_year, n_months + 1, 12 * interval)
+    elapsed = np.diff(months, prepend=0)
+    monthly_interest = convert_yearly_to_monthly_interest(FGTS_INTEREST)
+
+    return months, monthly_deposit * np.expm1(elapsed * np.log1p(monthly_interest)) / monthly_interest
+
+def extra_events(amount, years, n_months):
+
+    """
+    Months and amounts of a yearly extra prepayment over the first `years` years (None for the whole term).
+    """
+
+    last_month = n_months if pd.isna(years) else min(12 * int(years), n_months)
+    months = np.arange(12, last_month + 1, 12)
+
+    return months, np.full(months.shape, float(amount))
+
+def candidate_grid(fgts_intervals=(0, 2, 3, 4, 5), extra_amounts=(0.,), extra_years=(None,), policies=FGTS_POLICIES):
+
+    """
+    Every combination of FGTS interval and first use, yearly extra prepayment and FGTS policy.
+    """
+
+    for interval in fgts_intervals:
+        if 0 < interval < MIN_FGTS_INTERVAL:
+            raise ValueError(f'FGTS can be used at most every {MIN_FGTS_INTERVAL} years, got {interval}')
+
+    fgts_options = [(0, 0)] * (0 in fgts_intervals) + [
+        (interval, first_year)
+        for interval in fgts_intervals if interval > 0
+        for first_year in range(1, interval + 1)
+    ]
+
+    extra_options = [(0., None)] * (0 in extra_amounts) + [
+        (amount, years) for amount in extra_amounts if amount > 0 for years in extra_years
+    ]
+
+    rows = [
+        fgts + extra + (policy,)
+        for fgts, extra, policy in itertools.product(fgts_options, extra_options, policies)
+    ]
+
+    return pd.DataFrame(rows, columns=CANDIDATE_COLUMNS)
+
+def build_candidate_schedules(candidates, monthly_deposit, n_months):
+
+    """
+    Dense FGTS and extra prepayment matrices of a table of candidates, from their sparse events.
+    """
+
+    fgts = ([], [], [])
+    extra = ([], [], [])
+
+    for index, candidate in enumerate(candidates.itertuples(index=False)):
+
+        for events, (months, amounts) in (
+            (fgts, fgts_events(monthly_deposit, candidate.fgts_interval, candidate.fgts_first_year, n_months)),
+            (extra, extra_events(candidate.extra_amount, candidate.extra_years, n_months)),
+        ):
+            events[0].append(np.full(months.shape, index))
+            events[1].append(months)
+            events[2].append(amounts)
+
+    return {
+        name: build_event_schedule(*(np.concatenate(parts) for parts in events), len(candidates), n_months)
+        for name, events in (('fgts', fgts), ('extra', extra))
+    }
+
+def evaluate_candidates(params, candidates, monthly_deposit):
+
+    """
+    Final buy-vs-rent result of each candidate strategy, in one vectorized batch.
+    """
+
+    merged = {**DEFAULT_PARAMS, **params}
+    schedules = build_candidate_schedules(candidates, monthly_deposit, merged['n_months'])
+
+    result = simulate_batch(
+        {**params, 'fgts_policy': candidates['fgts_policy'].to_numpy()},
+        prepayments=schedules
+    )
+
+    return final_total(result)
+
+def _evaluate_chunk(args):
+    return evaluate_candidates(*args)
+
+def optimize_prepayments(params=None, candidates=None, monthly_deposit=None, chunk_size=256, n_workers=None):
+
+    """
+    Search for the FGTS and extra prepayment strategy with the best final buy-vs-rent result.
+
+    Candidate strategies are built as sparse payment events (see
+    `core.build_event_schedule`). They are evaluated as scenarios of the
+    vectorized pipeline in chunks, spread across a process pool. FGTS uses
+    withdraw the balance accumulated since the previous use. Extra
+    prepayments come out of the buyer's pocket, so they also cost the income
+    the money would have earned at `invest_interest`.
+
+    Args:
+        params (dict): inputs of one scenario, keyed as in `pipeline.PARAM_NAMES`
+        candidates (pd.DataFrame): strategies with `CANDIDATE_COLUMNS`, defaults to `candidate_grid()`
+        monthly_deposit (float): FGTS deposited each month, defaults to
+            fgts_amount spread over fgts_frequency years
+        chunk_size (int): number of candidates evaluated per task
+        n_workers (int): number of worker processes (1 runs everything in-process,
+            None uses every CPU)
+
+    Returns:
+
+        ranking (pd.DataFrame): candidates with their 'final_total', best first
+    """
+
+    params = dict(params or {})
+    merged = {**DEFAULT_PARAMS, **params}
+    candidates = candidate_grid() if candidates is None else candidates.reset_index(drop=True)
+
+    if monthly_deposit is None:
+        years = merged['fgts_frequency']
+        monthly_deposit = merged['fgts_amount'] / (12 * years) if years > 0 else 0.
+
+    tasks = [
+        (params, candidates.iloc[start:start + chunk_size], monthly_deposit)
+        for start in range(0, len(candidates), chunk_size)
+    ]
+
+    n_workers = min(n_workers or os.cpu_count() or 1, len(tasks))
+
+    if n_workers <= 1:
+        totals = [_evaluate_chunk(task) for task in tasks]
+    else:
+        with ProcessPoolExecutor(n_workers) as executor:
+            totals = list(executor.map(_evaluate_chunk, tasks))
+
+    ranking = candidates.assign(final_total=np.concatenate(totals))
+
+    return ranking.sort_values('final_total', ascending=False, kind='stable').reset_index(drop=True)
@@ -0,0 +1,442 @@
+import numpy as np
+
+from core import (
+    AMORTIZATION_SYSTEMS,
+    FGTS_POLICIES,
+    FGTS_INTEREST,
+    option_codes,
+    convert_yearly_to_monthly_interest,
+    build_fgts_schedule,
+    calculate_mortgage_batch,
+    calculate_rent_reinvestment_array,
+    growth_table,
+    compound_array,
+)
+from components import component_costs
+
+# inputs of the buy-vs-rent simulation, with the defaults shown by interface.py
+DEFAULT_PARAMS = {
+    'total_amount': 1000e3,
+    'downpay_amount': 200e3,
+    'downpay_fgts_amount': 0.,
+    'home_appreciation': 0.02,
+    'inflation': 0.02,
+    'time_horizon': 360,
+    'n_months': 360,
+    'mort_interest': 0.073,
+    'mort_index': 0.,
+    'fgts_amount': 0.,
+    'fgts_frequency': 2,
+    'amortization': 'sac',
+    'fgts_policy': 'reduce_term',
+    'invest_interest': 0.03,
+    'rent_amount': 5000.,
+    'rent_appreciation': 0.02,
+    'is_reinvestment': True,
+    'use_inflation': True,
+}
+
+PARAM_NAMES = tuple(DEFAULT_PARAMS)
+
+INTEGER_PARAMS = ('time_horizon', 'n_months', 'fgts_frequency')
+
+BOOLEAN_PARAMS = ('is_reinvestment', 'use_inflation')
+
+# yearly rates that may also be given as per-month paths (see `simulate_batch`)
+RATE_PARAMS = ('home_appreciation', 'inflation', 'rent_appreciation', 'invest_interest')
+
+# mortgage rates that may be given as per-month paths: the interest rate
+# (replacing mort_interest / 12) and the index correcting the balance
+MORTGAGE_RATE_PARAMS = ('mort_interest', 'mort_index')
+
+# monthly series of every `simulate_batch` result
+SERIES_NAMES = (
+    'mort_balance', 'mort_amount_paid', 'mort_amount_interest', 'mort_installment', 'mort_fgts_paid',
+    'home_value', 'downpayment', 'estate', 'downpay_and_amort_passive_income',
+    'rent', 'rent_reinvestment_passive_income', 'total',
+)
+
+# sources of mortgage prepayments (see `simulate_batch`): the FGTS balance,
+# whose opportunity cost is the FGTS yield, and extra money of the buyer,
+# whose opportunity cost is the investment rate
+PREPAYMENT_SOURCES = ('fgts', 'extra')
+
+def as_scenarios(params, n_scenarios=1):
+
+    """
+    Merge `params` with the defaults and broadcast every input to one entry per scenario.
+
+    Inputs are broadcast against each other and against `n_scenarios`, and
+    month counts and flags are cast to integers and booleans.
+    """
+
+    unknown = set(params) - set(PARAM_NAMES)
+    if unknown:
+        raise ValueError(f'unknown parameters: {sorted(unknown)}')
+
+    merged = {**DEFAULT_PARAMS, **params}
+    arrays = np.broadcast_arrays(
+        np.empty(n_scenarios), *[np.atleast_1d(np.asarray(merged[name])) for name in PARAM_NAMES]
+    )[1:]
+
+    scenarios = {name: array.ravel() for name, array in zip(PARAM_NAMES, arrays)}
+
+    for name in INTEGER_PARAMS:
+        scenarios[name] = scenarios[name].astype(int)
+
+    for name in BOOLEAN_PARAMS:
+        scenarios[name] = scenarios[name].astype(bool)
+
+    return scenarios
+
+def _scenario_growth(name, scenarios, rate_paths, n_months):
+
+    """
+    Growth factors of a rate input, taken from its monthly path when one is given.
+    """
+
+    if name not in rate_paths:
+        return growth_table.rows(scenarios[name], n_months)
+
+    monthly_interest = rate_paths[name]
+    if monthly_interest.shape[-1] < n_months:
+        raise ValueError(f'{name} path has {monthly_interest.shape[-1]} months, {n_months} are needed')
+
+    growth = np.cumprod(1 + monthly_interest[:, :n_months], axis=1)
+    return np.broadcast_to(growth, (scenarios[name].shape[0], n_months))
+
+def _mortgage(scenarios, rate_paths, prepayments):
+
+    """
+    Run the mortgage engine once per distinct set of mortgage inputs.
+
+    Scenarios with per-month mortgage rate paths or prepayment schedules are
+    all different, so they are run as one batch instead.
+    """
+
+    if prepayments or any(name in rate_paths for name in MORTGAGE_RATE_PARAMS):
+        return _mortgage_each(scenarios, rate_paths, prepayments)
+
+    keys = np.column_stack([
+        scenarios['total_amount'] - scenarios['downpay_amount'],
+        scenarios['n_months'],
+        scenarios['mort_interest'],
+        scenarios['mort_index'],
+        scenarios['fgts_frequency'],
+        scenarios['fgts_amount'],
+        option_codes(scenarios['amortization'], AMORTIZATION_SYSTEMS, 'amortization system'),
+        option_codes(scenarios['fgts_policy'], FGTS_POLICIES, 'FGTS policy'),
+    ])
+
+    unique_keys, inverse = np.unique(keys, axis=0, return_inverse=True)
+    n_months = unique_keys[:, 1].astype(int)
+
+    # fixed yearly index, as a constant monthly correction
+    index_rates = None
+    if (unique_keys[:, 3] != 0).any():
+        monthly_index = convert_yearly_to_monthly_interest(unique_keys[:, 3])
+        index_rates = np.repeat(monthly_index[:, None], n_months.max(), axis=1)
+
+    mortgage = calculate_mortgage_batch(
+        unique_keys[:, 0],
+        n_months,
+        unique_keys[:, 2],
+        unique_keys[:, 4].astype(int),
+        unique_keys[:, 5],
+        np.array(AMORTIZATION_SYSTEMS)[unique_keys[:, 6].astype(int)],
+        np.array(FGTS_POLICIES)[unique_keys[:, 7].astype(int)],
+        index_rates=index_rates,
+    )
+
+    return {key: value[inverse.ravel()] for key, value in mortgage.items()}
+
+def _prepayment_matrix(prepayments, name, shape):
+
+    payments = np.atleast_2d(np.asarray(prepayments[name], dtype=float))
+
+    if payments.shape[1] < shape[1]:
+        raise ValueError(f'{name} prepayments have {payments.shape[1]} columns, {shape[1]} are needed')
+
+    return np.broadcast_to(payments[:, :shape[1]], shape)
+
+def _mortgage_each(scenarios, rate_paths, prepayments):
+
+    """
+    Mortgage of every scenario, with per-month interest/index paths and prepayment schedules.
+    """
+
+    n_months = scenarios['n_months'].max()
+    shape = (scenarios['n_months'].shape[0], n_months + 1)
+
+    if 'fgts' in prepayments:
+        fgts_payments = _prepayment_matrix(prepayments, 'fgts', shape)
+    else:
+        fgts_payments = build_fgts_schedule(scenarios['fgts_amount'], scenarios['fgts_frequency'], scenarios['n_months'])
+
+    if 'extra' in prepayments:
+        extra_payments = _prepayment_matrix(prepayments, 'extra', shape)
+    else:
+        extra_payments = np.zeros(shape)
+
+    if 'mort_index' in rate_paths:
+        index_rates = rate_paths['mort_index']
+    elif (scenarios['mort_index'] != 0).any():
+        index_rates = convert_yearly_to_monthly_interest(scenarios['mort_index'])[:, None] * np.ones(n_months)
+    else:
+        index_rates = None
+
+    mortgage = calculate_mortgage_batch(
+        scenarios['total_amount'] - scenarios['downpay_amount'],
+        scenarios['n_months'],
+        scenarios['mort_interest'],
+        amortization=scenarios['amortization'],
+        fgts_policy=scenarios['fgts_policy'],
+        monthly_interest=rate_paths.get('mort_interest'),
+        index_rates=index_rates,
+        fgts_payments=fgts_payments + extra_payments,
+    )
+
+    # the engine sees one stream of payments, split back by source
+    is_valid = np.isfinite(mortgage['mort_balance'])
+    mortgage['mort_fgts_paid'] = np.where(is_valid, fgts_payments, np.nan)
+    mortgage['mort_extra_paid'] = np.where(is_valid, extra_payments, np.nan)
+
+    return mortgage
+
+def extend_mortgage(mortgage, n_months):
+
+    """
+    Extend batched mortgage arrays to `n_months` columns the way app.py builds `cash_flow`.
+
+    Balance and amount paid are carried forward after the last row, while
+    interest, installments and FGTS (and extra) payments are zero.
+    """
+
+    months = np.arange(n_months)
+    n_rows = mortgage['n_rows'][:, None]
+    last_valid = np.minimum(months, n_rows - 1)
+    is_active = months < n_rows
+
+    extended = {}
+    for key in ('mort_balance', 'mort_amount_paid'):
+        extended[key] = np.take_along_axis(mortgage[key], last_valid, axis=1)
+
+    for key in ('mort_amount_interest', 'mort_installment', 'mort_fgts_paid', 'mort_extra_paid'):
+
+        if key not in mortgage:
+            continue
+
+        extended[key] = np.where(is_active, np.take_along_axis(mortgage[key], last_valid, axis=1), 0.)
+
+    return extended
+
+def simulate_batch(params, rate_paths=None, prepayments=None, components=None):
+
+    """
+    Vectorized buy-vs-rent pipeline of app.py for many scenarios at once.
+
+    Scenarios may have different horizons (each one is at least as long as
+    its mortgage, as in app.py); values past a scenario's horizon are NaN.
+    Mortgage schedules and growth factors are computed once per distinct set
+    of inputs and shared between scenarios.
+
+    Args:
+        params (dict): inputs keyed by `PARAM_NAMES`, as scalars or arrays with
+            one entry per scenario; missing inputs take `DEFAULT_PARAMS`
+        rate_paths (dict): optional (scenarios x months) monthly rates keyed by
+            `RATE_PARAMS`, replacing the fixed yearly rate of those inputs, or
+            by `MORTGAGE_RATE_PARAMS`: the mortgage interest of each month and
+            the monthly variation of the index correcting the balance
+        prepayments (dict): optional (scenarios x n_months + 1) amounts paid
+            into the mortgage at each month, keyed by `PREPAYMENT_SOURCES`
+            (see `core.build_event_schedule`); 'fgts' replaces the schedule
+            of fgts_frequency and fgts_amount, 'extra' adds prepayments out
+            of the buyer's pocket (reported as 'mort_extra_paid')
+        components (list): optional `components.Component`s (e.g.
+            `components.DEFAULT_COMPONENTS`) whose net cost of buying is
+            reported as 'component_costs' and subtracted from the result,
+            with the passive income it would have earned when reinvesting
+
+    Returns:
+
+        result (dict): (scenarios x months) arrays of the intermediate series
+            and the final 'total', plus 'horizon', the number of months of
+            each scenario
+    """
+
+    rate_paths = {
+        name: np.atleast_2d(np.asarray(path, dtype=float))
+        for name, path in (rate_paths or {}).items()
+    }
+
+    unknown = set(rate_paths) - set(RATE_PARAMS + MORTGAGE_RATE_PARAMS)
+    if unknown:
+        raise ValueError(f'unknown rate paths: {sorted(unknown)}')
+
+    prepayments = prepayments or {}
+
+    unknown = set(prepayments) - set(PREPAYMENT_SOURCES)
+    if unknown:
+        raise ValueError(f'unknown prepayment sources: {sorted(unknown)}')
+
+    n_paths = max([path.shape[0] for path in rate_paths.values()] +
+                  [np.atleast_2d(payments).shape[0] for payments in prepayments.values()], default=1)
+    scenarios = as_scenarios(params, n_paths)
+    mortgage = _mortgage(scenarios, rate_paths, prepayments)
+
+    horizon = np.maximum(scenarios['time_horizon'], mortgage['n_rows'])
+    n_months = horizon.max()
+    months = np.arange(n_months)
+
+    result = extend_mortgage(mortgage, n_months)
+
+    # home value and equity
+    home_growth = _scenario_growth('home_appreciation', scenarios, rate_paths, n_months)
+    result['home_value'] = scenarios['total_amount'][:, None] * home_growth
+    result['downpayment'] = np.where(months == 0, scenarios['downpay_amount'][:, None], 0.)
+    result['estate'] = result['home_value'] - result['mort_balance']
+
+    # passive income lost on downpayment and FGTS
+    invest_growth = _scenario_growth('invest_interest', scenarios, rate_paths, n_months)
+    fgts_growth = growth_table.get(FGTS_INTEREST, n_months)
+
+    downpay_interest = (scenarios['downpay_amount'] - scenarios['downpay_fgts_amount'])[:, None] * invest_growth
+    downpay_fgts_interest = scenarios['downpay_fgts_amount'][:, None] * fgts_growth
+    fgts_amort_interest = (
+        compound_array(result['mort_fgts_paid'], fgts_growth) -
+        result['mort_fgts_paid'].cumsum(axis=1)
+    )
+
+    result['downpay_and_amort_passive_income'] = (
+        downpay_interest +
+        downpay_fgts_interest +
+        fgts_amort_interest -
+        scenarios['downpay_amount'][:, None]
+    )
+
+    if 'mort_extra_paid' in result:
+        result['downpay_and_amort_passive_income'] += (
+            compound_array(result['mort_extra_paid'], invest_growth) -
+            result['mort_extra_paid'].cumsum(axis=1)
+        )
+
+    # rent and reinvestment of the difference between rent and installments
+    rent_growth = _scenario_growth('rent_appreciation', scenarios, rate_paths, n_months)
+    result['rent'] = scenarios['rent_amount'][:, None] * rent_growth
+
+    rent_reinvestment_passive_income = calculate_rent_reinvestment_array(
+        result['rent'], result['mort_installment'], invest_growth
+    )
+
+    result['rent_reinvestment_passive_income'] = np.where(
+        scenarios['is_reinvestment'][:, None], rent_reinvestment_passive_income, 0.
+    )
+
+    # final result
+    total = (
+        result['rent'].cumsum(axis=1) +
+        result['rent_reinvestment_passive_income'] +
+        result['estate'] -
+        result['downpay_and_amort_passive_income'] -
+        result['mort_fgts_paid'].cumsum(axis=1) -
+        result['downpayment'].cumsum(axis=1) -
+        result['mort_installment'].cumsum(axis=1)
+    )
+
+    if 'mort_extra_paid' in result:
+        total -= result['mort_extra_paid'].cumsum(axis=1)
+
+    inflation_growth = _scenario_growth('inflation', scenarios, rate_paths, n_months)
+
+    # additional costs of buying and renting
+    if components:
+
+        bases = {
+            'total_amount': scenarios['total_amount'],
+            'mortgage_value': scenarios['total_amount'] - scenarios['downpay_amount'],
+            'rent_amount': scenarios['rent_amount'],
+            'home_value': result['home_value'],
+            'mort_balance': result['mort_balance'],
+            'rent': result['rent'],
+        }
+
+        # growth factors already computed above are reused
+        known = {
+            'home_appreciation': home_growth,
+            'inflation': inflation_growth,
+            'invest_interest': invest_growth,
+            'rent_appreciation': rent_growth,
+        }
+        growths = {
+            name: known[name] if name in known else _scenario_growth(name, scenarios, rate_paths, n_months)
+            for name in {component.growth for component in components} - {None}
+        }
+
+        costs = component_costs(components, bases, growths, horizon, mortgage['n_rows'])
+        result['component_costs'] = costs
+
+        # with reinvestment, each cost also loses the passive income it would have earned
+        total -= np.where(
+            scenarios['is_reinvestment'][:, None],
+            compound_array(costs, invest_growth),
+            costs.cumsum(axis=1)
+        )
+
+    result['total'] = np.where(scenarios['use_inflation'][:, None], total / inflation_growth, total)
+
+    is_valid = months < horizon[:, None]
+    result = {key: np.where(is_valid, value, np.nan) for key, value in result.items()}
+    result['horizon'] = horizon
+
+    return result
+
+def final_total(result):
+
+    """
+    Buy-vs-rent result at the horizon of each scenario of `simulate_batch`.
+    """
+
+    return result['total'][np.arange(result['horizon'].shape[0]), result['horizon'] - 1]
+
+def summarize(result):
+
+    """
+    Per-scenario summary of a `simulate_batch` result at each scenario's horizon.
+    """
+
+    last_month = result['horizon'] - 1
+    rows = np.arange(last_month.shape[0])
+
+    def at_horizon(key):
+        return result[key][rows, last_month]
+
+    total = at_horizon('total')
+
+    return {
+        'final_total': total,
+        'buy_wins': total > 0,
+        'horizon': result['horizon'],
+        'final_home_value': at_horizon('home_value'),
+        'final_estate': at_horizon('estate'),
+        'total_rent': np.nansum(result['rent'], axis=1),
+        'first_installment': result['mort_installment'][:, 0],
+        'total_installments': np.nansum(result['mort_installment'], axis=1),
+    }
+
+def final_totals(params, chunk_size=512, components=None):
+
+    """
+    Final buy-vs-rent result of many scenarios, simulated in chunks to bound memory.
+
+    `components` are the additional costs of every scenario (see `simulate_batch`).
+    """
+
+    scenarios = as_scenarios(params)
+    n_scenarios = scenarios['total_amount'].shape[0]
+    totals = np.empty(n_scenarios)
+
+    for start in range(0, n_scenarios, chunk_size):
+        chunk = {name: values[start:start + chunk_size] for name, values in scenarios.items()}
+        totals[start:start + chunk_size] = final_total(simulate_batch(chunk, components=components))
+
+    return totals
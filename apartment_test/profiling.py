@@ -0,0 +1,220 @@
+"""
+Opt-in instrumentation of the app computation.
+
+While a `Profile` is active on the current thread (one Streamlit rerun),
+every `stage` block records its wall time and how many pandas objects
+(DataFrame/Series) were created inside it. Stages nest, so a figure build
+and its `st.write` show up as `plot_total` and `plot_total/st.write`.
+When no profile is active, `stage` costs a thread-local lookup.
+"""
+
+import json
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from functools import wraps
+
+from pandas.core.generic import NDFrame
+
+# profile of the rerun running on each thread (Streamlit runs one script per thread)
+_local = threading.local()
+
+_hook_lock = threading.Lock()
+_original_init = None
+
+# threads being profiled, the hook is installed while there is any
+_n_profiled = 0
+
+def _counting_init(self, *args, **kwargs):
+
+    profile = getattr(_local, 'profile', None)
+
+    if profile is not None:
+        profile.count_allocation(type(self).__name__)
+
+    _original_init(self, *args, **kwargs)
+
+def _acquire_hook():
+
+    """
+    Count pandas allocations by wrapping NDFrame.__init__, which every DataFrame/Series goes through.
+    """
+
+    global _original_init, _n_profiled
+
+    with _hook_lock:
+
+        if _n_profiled == 0:
+            _original_init = NDFrame.__init__
+            NDFrame.__init__ = _counting_init
+
+        _n_profiled += 1
+
+def _release_hook():
+
+    """
+    Restore the original NDFrame.__init__ once no thread is being profiled.
+    """
+
+    global _original_init, _n_profiled
+
+    with _hook_lock:
+
+        _n_profiled -= 1
+
+        if _n_profiled == 0:
+            NDFrame.__init__ = _original_init
+            _original_init = None
+
+class Profile:
+
+    """
+    Timings and pandas allocation counts of the stages of one run.
+    """
+
+    def __init__(self):
+
+        self.started = time.time()
+        self.seconds = None
+        self.records = []
+        self._stack = []
+        self._start = time.perf_counter()
+
+    def count_allocation(self, kind):
+
+        for record in self._stack:
+            record[kind] = record.get(kind, 0) + 1
+
+    @contextmanager
+    def stage(self, name):
+
+        path = '/'.join([record['stage'] for record in self._stack] + [name])
+        record = {'stage': path, 'seconds': 0.}
+
+        self.records.append(record)
+        self._stack.append(record)
+        start = time.perf_counter()
+
+        try:
+            yield record
+        finally:
+            record['seconds'] = time.perf_counter() - start
+            self._stack.pop()
+
+    def finish(self):
+        self.seconds = time.perf_counter() - self._start
+
+    def summary(self):
+
+        """
+        Records aggregated by stage: calls, total seconds and pandas objects created.
+        """
+
+        stages = OrderedDict()
+
+        for record in self.records:
+
+            stats = stages.setdefault(record['stage'], {'calls': 0, 'seconds': 0., 'DataFrame': 0, 'Series': 0})
+            stats['calls'] += 1
+
+            for key, value in record.items():
+                if key != 'stage':
+                    stats[key] = stats.get(key, 0) + value
+
+        return stages
+
+    def to_dict(self, **extra):
+
+        return {
+            'started': self.started,
+            'seconds': self.seconds,
+            'stages': self.summary(),
+            **extra,
+        }
+
+    def log(self, path, **extra):
+
+        """
+        Append the profile as one JSON line to `path`.
+        """
+
+        with open(path, 'a') as file:
+            file.write(json.dumps(self.to_dict(**extra), default=str) + '\n')
+
+def start():
+
+    """
+    Start profiling the current thread, replacing any unfinished profile.
+    """
+
+    if getattr(_local, 'profile', None) is None:
+        _acquire_hook()
+
+    _local.profile = Profile()
+
+    return _local.profile
+
+def stop():
+
+    """
+    Stop profiling the current thread and return its profile (None if it wasn't profiling).
+    """
+
+    profile = getattr(_local, 'profile', None)
+    _local.profile = None
+
+    if profile is not None:
+        profile.finish()
+        _release_hook()
+
+    return profile
+
+@contextmanager
+def session(enabled=True):
+
+    """
+    Profile the current thread inside a block, stopping even if the block is cut short.
+
+    Yields the `Profile`, or None when `enabled` is false.
+    """
+
+    if not enabled:
+        yield None
+        return
+
+    profile = start()
+
+    try:
+        yield profile
+    finally:
+        stop()
+
+@contextmanager
+def stage(name):
+
+    """
+    Time a block under `name` if the current thread is being profiled.
+    """
+
+    profile = getattr(_local, 'profile', None)
+
+    if profile is None:
+        yield None
+        return
+
+    with profile.stage(name) as record:
+        yield record
+
+def profiled(func):
+
+    """
+    Decorator timing every call of `func` as a stage named after it.
+    """
+
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        with stage(func.__name__):
+            return func(*args, **kwargs)
+
+    return wrapper
@@ -0,0 +1,266 @@
+"""
+Closed-form scoring of the buy-vs-rent result at the horizon.
+
+Ranking leads only needs the final result (the last value of `total`), not
+the monthly series. For SAC mortgages with FGTS reducing the term and fixed
+rates, every term of the result is a sum of geometric or
+arithmetico-geometric series in the month. The stop month of the mortgage,
+when FGTS pays it off early, is found by bisection over the month. So a
+score costs a few dozen elementwise operations per scenario, whatever the
+horizon, and no (scenarios x months) array is ever built.
+
+Scores agree with `pipeline.simulate_batch` (and so with app.py) within
+`TOLERANCE_ABS` plus `TOLERANCE_REL` times the property price. The absolute
+part covers the rounding of the reinvested difference to whole reais, which
+can land on the other side of a .5 tie. Other scenarios (Price tables,
+FGTS reducing the installment, indexed mortgages) are scored by the
+pipeline itself.
+"""
+
+import numpy as np
+
+from core import FGTS_INTEREST
+from pipeline import as_scenarios, final_total, simulate_batch
+
+TOLERANCE_ABS = 1.
+TOLERANCE_REL = 1e-9
+
+# below this monthly log-rate, geometric sums switch to their Taylor series
+_SMALL_RATE = 1e-7
+
+def _geometric_sum(log_ratio, n):
+
+    """
+    sum(exp(k * log_ratio) for k in range(n)).
+
+    Tiny ratios use the second-order Taylor expansion, which is exact at zero
+    and keeps the derivative in the ratio (see dual.py).
+    """
+
+    small = np.abs(log_ratio) < _SMALL_RATE
+    safe = np.where(small, 1., log_ratio)
+
+    sum_1 = n * (n - 1) / 2
+    sum_2 = (n - 1) * n * (2 * n - 1) / 6
+    taylor = n + log_ratio * sum_1 + log_ratio ** 2 / 2 * sum_2
+
+    return np.where(small, taylor, np.expm1(n * safe) / np.expm1(safe))
+
+def _arithmetic_geometric_sum(log_ratio, n):
+
+    """
+    sum(k * exp(k * log_ratio) for k in range(n)).
+
+    The closed form loses about eps / |log_ratio| of relative precision, so
+    tiny ratios use the second-order Taylor expansion instead.
+    """
+
+    small = np.abs(log_ratio) < _SMALL_RATE
+    safe = np.where(small, 1., log_ratio)
+
+    ratio = np.exp(safe)
+    closed = (ratio * _geometric_sum(safe, n - 1) - (n - 1) * np.exp(n * safe)) / -np.expm1(safe)
+
+    sum_1 = n * (n - 1) / 2
+    sum_2 = (n - 1) * n * (2 * n - 1) / 6
+    taylor = sum_1 + log_ratio * sum_2 + log_ratio ** 2 / 2 * sum_1 ** 2
+
+    return np.where(small, taylor, closed)
+
+def _sawtooth_sum(log_ratio, n, period):
+
+    """
+    sum((k // period) * exp(k * log_ratio) for k in range(n)), as (k - k % period) / period.
+    """
+
+    n_periods, rest = np.divmod(n, period)
+
+    # k % period repeats 0 .. period - 1, scaled by exp(log_ratio * period) every period
+    modulo_sum = (
+        _geometric_sum(log_ratio * period, n_periods) * _arithmetic_geometric_sum(log_ratio, period) +
+        np.exp(log_ratio * period * n_periods) * _arithmetic_geometric_sum(log_ratio, rest)
+    )
+
+    return (_arithmetic_geometric_sum(log_ratio, n) - modulo_sum) / period
+
+def is_supported(scenarios):
+
+    """
+    Scenarios scored in closed form: SAC, fixed non-indexed rate, FGTS reducing the term (or no FGTS).
+    """
+
+    no_fgts = (scenarios['fgts_frequency'] == 0) | (scenarios['fgts_amount'] == 0)
+
+    return (
+        (scenarios['amortization'] == 'sac') &
+        (scenarios['mort_index'] == 0) &
+        ((scenarios['fgts_policy'] == 'reduce_term') | no_fgts)
+    )
+
+def _stop_month(principal, level, fgts_amount, period, n_months):
+
+    """
+    Last row of the mortgage: the first month whose balance is negative, or the term.
+    """
+
+    def is_negative(month):
+        return principal - level * month - fgts_amount * (month // period) < 0
+
+    lower, upper = np.zeros_like(n_months), n_months.copy()
+    search = is_negative(upper)
+
+    for _ in range(int(np.max(n_months, initial=1)).bit_length()):
+
+        middle = (lower + upper) // 2
+        negative = is_negative(middle)
+
+        lower = np.where(search & ~negative, middle, lower)
+        upper = np.where(search & negative, middle, upper)
+
+    return upper
+
+def _closed_form_scores(scenarios, months):
+
+    """
+    Result at each of `months` (None for the horizon) of scenarios supported by `is_supported`.
+    """
+
+    column = {name: values[:, None] for name, values in scenarios.items()}
+
+    total_amount, downpay = column['total_amount'], column['downpay_amount']
+    downpay_fgts = column['downpay_fgts_amount']
+    n_months = column['n_months']
+    rate = column['mort_interest'] / 12
+
+    # FGTS is used every `period` months; a zero amount stands for no FGTS
+    has_fgts = column['fgts_frequency'] > 0
+    period = np.where(has_fgts, 12 * column['fgts_frequency'], 1)
+    fgts_amount = np.where(has_fgts, column['fgts_amount'], 0.)
+
+    principal = total_amount - downpay
+    level = principal / n_months
+    stop = _stop_month(principal, level, fgts_amount, period, n_months)
+
+    horizon = np.maximum(column['time_horizon'], stop + 1)
+    month = horizon - 1 if months is None else np.asarray(months)[None, :]
+    mortgage_month = np.minimum(month, stop)
+
+    # monthly log-growth of each rate
+    home_log, rent_log, invest_log, inflation_log = (
+        np.log1p(column[name]) / 12
+        for name in ('home_appreciation', 'rent_appreciation', 'invest_interest', 'inflation')
+    )
+    fgts_log = np.log1p(FGTS_INTEREST) / 12
+
+    # mortgage: balance[k] = principal - level * k - fgts_amount * (k // period)
+    balance = principal - level * mortgage_month - fgts_amount * (mortgage_month // period)
+    n_fgts = mortgage_month // period
+    first_installment = level + rate * principal
+
+    installments = first_installment + level * mortgage_month + rate * (
+        principal * mortgage_month -
+        level * _arithmetic_geometric_sum(0., mortgage_month) -
+        fgts_amount * _sawtooth_sum(0., mortgage_month, period)
+    )
+
+    # home and equity
+    estate = total_amount * np.exp((month + 1) * home_log) - balance
+
+    # passive income lost on downpayment and FGTS
+    fgts_amort_interest = fgts_amount * (
+        np.exp((month + 1 - period) * fgts_log) * _geometric_sum(-period * fgts_log, n_fgts) - n_fgts
+    )
+
+    passive_income = (
+        (downpay - downpay_fgts) * np.exp((month + 1) * invest_log) +
+        downpay_fgts * np.exp((month + 1) * fgts_log) +
+        fgts_amort_interest -
+        downpay
+    )
+
+    # rent and reinvestment of the difference between rent and installments
+    rent = column['rent_amount'] * np.exp(rent_log) * _geometric_sum(rent_log, month + 1)
+
+    compounded_rent = (
+        column['rent_amount'] * np.exp(rent_log + (month + 1) * invest_log) *
+        _geometric_sum(rent_log - invest_log, month + 1)
+    )
+
+    compounded_installments = first_installment * np.exp((month + 1) * invest_log) + np.exp(month * invest_log) * (
+        first_installment * _geometric_sum(-invest_log, mortgage_month) -
+        rate * level * _arithmetic_geometric_sum(-invest_log, mortgage_month) -
+        rate * fgts_amount * _sawtooth_sum(-invest_log, mortgage_month, period)
+    )
+
+    reinvestment = np.round(compounded_rent - rent - (compounded_installments - installments), 0)
+
+    total = (
+        rent +
+        np.where(column['is_reinvestment'], reinvestment, 0.) +
+        estate -
+        passive_income -
+        fgts_amount * n_fgts -
+        downpay -
+        installments
+    )
+
+    total = np.where(column['use_inflation'], total * np.exp(-(month + 1) * inflation_log), total)
+
+    if months is None:
+        return total[:, 0]
+
+    return np.where(month < horizon, total, np.nan)
+
+def _pipeline_scores(scenarios, months):
+
+    """
+    Same as `_closed_form_scores`, running the full pipeline.
+    """
+
+    result = simulate_batch(scenarios)
+
+    if months is None:
+        return final_total(result)
+
+    months = np.asarray(months)
+    total = np.full((result['total'].shape[0], months.shape[0]), np.nan)
+    inside = months < result['total'].shape[1]
+    total[:, inside] = result['total'][:, months[inside]]
+
+    return total
+
+def score(params, months=None, chunk_size=100000, fallback_chunk_size=512):
+
+    """
+    Final buy-vs-rent result of many scenarios, without building monthly series.
+
+    Args:
+        params (dict): inputs, as scalars or arrays (see `pipeline.simulate_batch`)
+        months (array-like): optional months (columns of `total`) to score
+            instead of each scenario's horizon, NaN past the horizon
+        chunk_size (int): scenarios scored in closed form at a time
+        fallback_chunk_size (int): unsupported scenarios (see `is_supported`)
+            simulated at a time by the pipeline
+
+    Returns:
+
+        scores (np.ndarray): result at the horizon of each scenario, or a
+            (scenarios x months) array of results at `months`
+    """
+
+    scenarios = as_scenarios(params)
+    n_scenarios = scenarios['total_amount'].shape[0]
+    supported = is_supported(scenarios)
+
+    shape = (n_scenarios,) if months is None else (n_scenarios, np.asarray(months).shape[0])
+    scores = np.empty(shape)
+
+    for rows, func, size in (
+        (np.flatnonzero(supported), _closed_form_scores, chunk_size),
+        (np.flatnonzero(~supported), _pipeline_scores, fallback_chunk_size),
+    ):
+        for start in range(0, rows.shape[0], size):
+            chunk = rows[start:start + size]
+            scores[chunk] = func({name: values[chunk] for name, values in scenarios.items()}, months)
+
+    return scores
@@ -0,0 +1,305 @@
+"""
+Local HTTP/JSON service for the buy-vs-rent simulation.
+
+Serves the vectorized pipeline to other systems without a Streamlit rerun
+per request. Each request runs on its own thread (the heavy lifting is in
+NumPy, which releases the GIL), and every result is kept in a shared LRU
+cache keyed by its inputs, so repeated scenarios are answered from memory.
+
+Endpoints:
+
+    POST /simulate          one scenario: {"total_amount": 800000, ...}
+    POST /simulate/batch    {"scenarios": [{...}, ...], "series": ["total"]}
+    GET  /metrics           request counts, latencies and cache counters
+    GET  /health
+
+Scenario keys are the inputs of `pipeline.PARAM_NAMES` (missing ones take the
+app defaults); other keys, such as a lead id, are echoed back in the result.
+
+Usage:
+
+    python service.py --port 8000
+"""
+
+import argparse
+import json
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+from pipeline import DEFAULT_PARAMS, PARAM_NAMES, SERIES_NAMES, simulate_batch, summarize
+from cache import LRUCache, cache_info, make_key, register_cache
+
+# scenarios simulated per vectorized call
+CHUNK_SIZE = 2000
+
+MAX_BATCH_SIZE = 100000
+MAX_BODY_BYTES = 64 * 2**20
+
+# results shared by every request of the process
+result_cache = LRUCache(maxsize=200000, max_bytes=512 * 2**20)
+register_cache('service_results', result_cache)
+
+class LatencyMetrics:
+
+    """
+    Thread-safe request counters and latency percentiles per endpoint.
+
+    Percentiles are computed over the most recent `window` requests.
+    """
+
+    def __init__(self, window=2000):
+
+        self.window = window
+        self._endpoints = {}
+        self._lock = threading.Lock()
+
+    def record(self, endpoint, seconds, status, n_scenarios=1):
+
+        with self._lock:
+
+            stats = self._endpoints.setdefault(endpoint, {
+                'requests': 0, 'errors': 0, 'scenarios': 0, 'seconds': 0., 'latencies': deque(maxlen=self.window)
+            })
+
+            stats['requests'] += 1
+            stats['errors'] += status >= 400
+            stats['scenarios'] += n_scenarios
+            stats['seconds'] += seconds
+            stats['latencies'].append(seconds)
+
+    def snapshot(self):
+
+        with self._lock:
+            endpoints = {name: dict(stats, latencies=list(stats['latencies'])) for name, stats in self._endpoints.items()}
+
+        report = {}
+
+        for name, stats in endpoints.items():
+
+            p50, p95, p99 = np.percentile(stats['latencies'], [50, 95, 99]) * 1e3
+
+            report[name] = {
+                'requests': stats['requests'],
+                'errors': stats['errors'],
+                'scenarios': stats['scenarios'],
+                'mean_ms': 1e3 * stats['seconds'] / stats['requests'],
+                'p50_ms': p50,
+                'p95_ms': p95,
+                'p99_ms': p99,
+            }
+
+        return report
+
+metrics = LatencyMetrics()
+
+def _to_json(value):
+
+    """
+    Plain Python value of a NumPy scalar or array (NaN becomes None).
+    """
+
+    if isinstance(value, np.ndarray):
+        return [_to_json(item) for item in value.tolist()]
+
+    if isinstance(value, (np.generic, float)):
+        value = value.item() if isinstance(value, np.generic) else value
+        return None if isinstance(value, float) and np.isnan(value) else value
+
+    return value
+
+def validate_series(series):
+
+    """
+    Check that `series` is a list of names of `SERIES_NAMES`, raising ValueError naming the bad ones.
+    """
+
+    if not isinstance(series, (list, tuple)) or not all(isinstance(name, str) for name in series):
+        raise ValueError(f'series must be a list of names, got {json.dumps(series)}')
+
+    unknown = [name for name in series if name not in SERIES_NAMES]
+    if unknown:
+        raise ValueError(f'unknown series: {unknown}, expected some of {list(SERIES_NAMES)}')
+
+    return tuple(series)
+
+def simulate_scenarios(scenarios, series=()):
+
+    """
+    Results of a list of scenario dicts, reusing cached results and simulating the rest in batches.
+
+    Args:
+        scenarios (list): dicts of inputs keyed by `PARAM_NAMES`, plus any extra keys to echo back
+        series (tuple): names of monthly series to include (e.g. 'total', 'rent'), see `SERIES_NAMES`
+
+    Returns:
+
+        results (list): one dict per scenario with the `pipeline.summarize` fields
+    """
+
+    series = validate_series(series)
+    params = [{name: value for name, value in scenario.items() if name in PARAM_NAMES} for scenario in scenarios]
+    keys = [make_key(({**DEFAULT_PARAMS, **scenario_params}, series)) for scenario_params in params]
+
+    results = [None] * len(scenarios)
+    missing = []
+
+    for index, key in enumerate(keys):
+        found, value = result_cache.get(key)
+        if found:
+            results[index] = value
+        else:
+            missing.append(index)
+
+    for start in range(0, len(missing), CHUNK_SIZE):
+
+        chunk = missing[start:start + CHUNK_SIZE]
+        batch = {
+            name: np.array([params[index].get(name, DEFAULT_PARAMS[name]) for index in chunk])
+            for name in PARAM_NAMES
+        }
+
+        result = simulate_batch(batch)
+        summary = summarize(result)
+
+        for row, index in enumerate(chunk):
+
+            value = {key: _to_json(column[row]) for key, column in summary.items()}
+
+            for name in series:
+                value[name] = _to_json(result[name][row, :result['horizon'][row]])
+
+            result_cache.put(keys[index], value)
+            results[index] = value
+
+    return [
+        {**{key: value for key, value in scenario.items() if key not in PARAM_NAMES}, **result}
+        for scenario, result in zip(scenarios, results)
+    ]
+
+class SimulationHandler(BaseHTTPRequestHandler):
+
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        # request logs are replaced by /metrics
+        pass
+
+    def _send_json(self, status, payload):
+
+        body = json.dumps(payload).encode()
+
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _read_json(self):
+
+        length = int(self.headers.get('Content-Length', 0))
+        if length > MAX_BODY_BYTES:
+            raise ValueError(f'request body is larger than {MAX_BODY_BYTES} bytes')
+
+        return json.loads(self.rfile.read(length) or b'{}')
+
+    def _handle(self, endpoint, func):
+
+        start = time.perf_counter()
+        n_scenarios = 0
+
+        try:
+            status, payload, n_scenarios = func()
+        except (ValueError, TypeError, KeyError) as error:
+            status, payload = 400, {'error': str(error)}
+        except Exception as error:
+            status, payload = 500, {'error': f'{type(error).__name__}: {error}'}
+
+        self._send_json(status, payload)
+        metrics.record(endpoint, time.perf_counter() - start, status, n_scenarios)
+
+    def do_GET(self):
+
+        if self.path == '/health':
+            self._send_json(200, {'status': 'ok'})
+
+        elif self.path == '/metrics':
+            self._send_json(200, {
+                'endpoints': metrics.snapshot(),
+                'caches': {name: info._asdict() for name, info in cache_info().items()},
+            })
+
+        else:
+            self._send_json(404, {'error': f'unknown endpoint: {self.path}'})
+
+    def do_POST(self):
+
+        if self.path == '/simulate':
+            self._handle(self.path, self._simulate)
+
+        elif self.path == '/simulate/batch':
+            self._handle(self.path, self._simulate_batch)
+
+        else:
+            self._send_json(404, {'error': f'unknown endpoint: {self.path}'})
+
+    def _simulate(self):
+
+        scenario = self._read_json()
+        if not isinstance(scenario, dict):
+            raise ValueError('expected a JSON object with the scenario inputs')
+
+        series = validate_series(scenario.pop('series', []))
+
+        return 200, simulate_scenarios([scenario], series)[0], 1
+
+    def _simulate_batch(self):
+
+        request = self._read_json()
+        scenarios = request.get('scenarios') if isinstance(request, dict) else None
+
+        if not isinstance(scenarios, list) or not all(isinstance(scenario, dict) for scenario in scenarios):
+            raise ValueError('expected {"scenarios": [...]} with one JSON object per scenario')
+
+        if len(scenarios) > MAX_BATCH_SIZE:
+            raise ValueError(f'at most {MAX_BATCH_SIZE} scenarios per request, got {len(scenarios)}')
+
+        series = validate_series(request.get('series', []))
+        results = simulate_scenarios(scenarios, series)
+
+        return 200, {'results': results}, len(scenarios)
+
+def make_server(host='127.0.0.1', port=8000):
+
+    """
+    HTTP server answering each request on its own thread.
+    """
+
+    server = ThreadingHTTPServer((host, port), SimulationHandler)
+    server.daemon_threads = True
+
+    return server
+
+def main(argv=None):
+
+    parser = argparse.ArgumentParser(description='Serve the buy-vs-rent simulation over HTTP/JSON.')
+    parser.add_argument('--host', default='127.0.0.1', help='address to listen on (default: 127.0.0.1)')
+    parser.add_argument('--port', type=int, default=8000, help='port to listen on (default: 8000)')
+
+    args = parser.parse_args(argv)
+    server = make_server(args.host, args.port)
+
+    print(f'serving on http://{args.host}:{args.port}')
+
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,92 @@
+import numpy as np
+
+from pipeline import PARAM_NAMES, as_scenarios, final_totals
+
+def _evaluate(name, values, scenarios, index, target, components=None):
+
+    """
+    Final result minus `target` of the scenarios in `index`, with `name` set to `values`.
+    """
+
+    params = {key: value[index] for key, value in scenarios.items()}
+    params[name] = values
+
+    return final_totals(params, components=components) - target[index]
+
+def solve_break_even(name, lower, upper, params=None, target=0., xtol=1e-6, ftol=1., max_iter=100, components=None):
+
+    """
+    Find the value of one input that makes the final buy-vs-rent result hit `target`.
+
+    Solves many scenarios at once with a bracketing root finder (the Illinois
+    variant of regula falsi, which keeps the root bracketed while converging
+    superlinearly). Each iteration is one vectorized pipeline evaluation over
+    the scenarios that haven't converged yet. Scenarios whose bracket does not
+    contain a sign change, or that haven't converged after `max_iter`
+    iterations, get NaN.
+
+    Args:
+        name (str): input to solve for, e.g. 'rent_amount' or 'home_appreciation'
+        lower (array-like): lower end of the search bracket, per scenario
+        upper (array-like): upper end of the search bracket, per scenario
+        params (dict): remaining inputs, as scalars or arrays (see `pipeline.simulate_batch`)
+        target (array-like): final result to reach, zero for the break-even point
+        xtol (float): tolerance on the solution, relative to the bracket width
+        ftol (float): tolerance on the final result (R$)
+        max_iter (int): maximum number of iterations
+        components (list): additional costs of buying and renting (see `pipeline.simulate_batch`)
+
+    Returns:
+
+        solution (np.ndarray): value of `name` for each scenario, NaN where none was found
+    """
+
+    if name not in PARAM_NAMES:
+        raise ValueError(f'unknown parameter: {name}')
+
+    params = {key: value for key, value in (params or {}).items() if key != name}
+    scenarios = as_scenarios(params, np.broadcast(*(np.atleast_1d(value) for value in (lower, upper, target))).size)
+    n_scenarios = scenarios[name].shape[0]
+
+    lower, upper, target = (
+        np.broadcast_to(np.asarray(value, dtype=float), n_scenarios).copy()
+        for value in (lower, upper, target)
+    )
+
+    everyone = np.arange(n_scenarios)
+    f_lower = _evaluate(name, lower, scenarios, everyone, target, components)
+    f_upper = _evaluate(name, upper, scenarios, everyone, target, components)
+
+    solution = np.full(n_scenarios, np.nan)
+    solution[f_lower == 0] = lower[f_lower == 0]
+    solution[f_upper == 0] = upper[f_upper == 0]
+
+    active = np.flatnonzero((np.sign(f_lower) * np.sign(f_upper) < 0) & np.isnan(solution))
+    width = np.abs(upper - lower)
+
+    for _ in range(max_iter):
+
+        if active.size == 0:
+            break
+
+        a, b = lower[active], upper[active]
+        fa, fb = f_lower[active], f_upper[active]
+
+        x = b - fb * (b - a) / (fb - fa)
+        fx = _evaluate(name, x, scenarios, active, target, components)
+
+        # keep the root bracketed; halve the stale endpoint's value (Illinois step)
+        same_side = np.sign(fx) == np.sign(fb)
+        lower[active] = np.where(same_side, a, b)
+        f_lower[active] = np.where(same_side, fa / 2, fb)
+        upper[active] = x
+        f_upper[active] = fx
+
+        # bracket width after the update, not the step from a stale endpoint
+        bracket = np.abs(upper[active] - lower[active])
+        converged = (np.abs(fx) <= ftol) | (bracket <= xtol * width[active])
+        solution[active[converged]] = x[converged]
+        active = active[~converged]
+
+    # scenarios still active after max_iter keep NaN
+    return solution
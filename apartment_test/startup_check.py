@@ -0,0 +1,198 @@
+"""
+Startup time budget of the app.
+
+A container restart starts from a fresh interpreter with every cache empty,
+so each measurement runs in a new process:
+
+    import          importing the modules app.py needs before its first
+                    element, with streamlit and pandas already loaded, as
+                    in a running server
+    first_render    first full run of app.py, after a trivial script has
+                    warmed up the streamlit runtime
+    rerun           the run right after it
+
+The check fails (exit status 1) when the best of `--repeats` measurements
+exceeds its budget, when the app raises, or when a module of
+`FORBIDDEN_MODULES` gets imported by the first render. test_startup.py runs
+it with a margin over the budgets when APARTMENT_STARTUP_CHECK is set.
+
+Usage:
+
+    python startup_check.py
+    python startup_check.py --budget first_render=1.5 --repeats 5
+    python startup_check.py --build-static
+"""
+
+import argparse
+import ast
+import importlib
+import json
+import os
+import subprocess
+import sys
+import time
+
+APP_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'app.py')
+
+# seconds allowed for each measurement
+BUDGETS = {
+    'import': 0.05,
+    'first_render': 1.0,
+    'rerun': 0.15,
+}
+
+# modules the app must not import on its own
+FORBIDDEN_MODULES = ('plotly.express',)
+
+# modules a running server has loaded before it runs the app
+SERVER_MODULES = ('numpy', 'pandas', 'streamlit')
+
+def app_imports(path=APP_PATH):
+
+    """
+    Names of the modules imported at the top level of app.py, in order.
+    """
+
+    with open(path, encoding='utf-8') as file:
+        tree = ast.parse(file.read())
+
+    names = []
+
+    for node in tree.body:
+        if isinstance(node, ast.Import):
+            names.extend(alias.name for alias in node.names)
+        elif isinstance(node, ast.ImportFrom):
+            names.append(node.module)
+
+    return names
+
+def _measure_import():
+
+    for name in SERVER_MODULES:
+        importlib.import_module(name)
+
+    start = time.perf_counter()
+
+    for name in app_imports():
+        importlib.import_module(name)
+
+    return {'import': time.perf_counter() - start}
+
+def _measure_render():
+
+    from streamlit.testing.v1 import AppTest
+
+    AppTest.from_string('import streamlit as st\nst.write("warm up")').run()
+
+    app = AppTest.from_file(APP_PATH, default_timeout=60)
+
+    start = time.perf_counter()
+    app.run()
+    first_render = time.perf_counter() - start
+
+    start = time.perf_counter()
+    app.run()
+    rerun = time.perf_counter() - start
+
+    return {
+        'first_render': first_render,
+        'rerun': rerun,
+        'exceptions': [str(exception.value) for exception in app.exception],
+        'forbidden': [name for name in FORBIDDEN_MODULES if name in sys.modules],
+    }
+
+MEASUREMENTS = {
+    'import': _measure_import,
+    'render': _measure_render,
+}
+
+def measure(kind):
+
+    """
+    Run one measurement ('import' or 'render') in a fresh interpreter and return its results.
+    """
+
+    completed = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), '--measure', kind],
+        cwd=os.path.dirname(APP_PATH),
+        capture_output=True,
+        text=True,
+        check=True
+    )
+
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+def run_check(budgets=BUDGETS, repeats=3, stream=sys.stdout):
+
+    """
+    Best time of each measurement over `repeats` fresh processes, and the problems found.
+
+    Returns:
+
+        best (dict): seconds of each measurement
+        problems (list): budget overruns, app exceptions and forbidden imports
+    """
+
+    best = {}
+    problems = []
+
+    for _ in range(repeats):
+        for kind in MEASUREMENTS:
+
+            results = measure(kind)
+
+            problems.extend(f'app raised: {value}' for value in results.pop('exceptions', []))
+            problems.extend(f'{name} was imported' for name in results.pop('forbidden', []))
+
+            for name, seconds in results.items():
+                best[name] = min(best.get(name, float('inf')), seconds)
+
+    for name, seconds in best.items():
+
+        print(f'{name:<14} {seconds * 1e3:8.1f} ms  (budget {budgets[name] * 1e3:.0f} ms)', file=stream)
+
+        if seconds > budgets[name]:
+            problems.append(f'{name} took {seconds:.3f}s, over its budget of {budgets[name]:.3f}s')
+
+    return best, sorted(set(problems))
+
+def _parse_budget(text):
+
+    name, _, seconds = text.partition('=')
+
+    if name not in BUDGETS:
+        raise argparse.ArgumentTypeError(f'unknown budget {name}, expected one of {tuple(BUDGETS)}')
+
+    return name, float(seconds)
+
+def main(argv=None):
+
+    parser = argparse.ArgumentParser(description='Check the cold start time of the app against its budget.')
+    parser.add_argument('--budget', type=_parse_budget, action='append', default=[],
+                        help='override a budget, e.g. first_render=1.5 (seconds)')
+    parser.add_argument('--repeats', type=int, default=3, help='fresh processes per measurement (default: 3)')
+    parser.add_argument('--build-static', action='store_true', help='rebuild the prebuilt static figures and exit')
+    parser.add_argument('--measure', choices=tuple(MEASUREMENTS), help=argparse.SUPPRESS)
+
+    args = parser.parse_args(argv)
+
+    if args.measure:
+        print(json.dumps(MEASUREMENTS[args.measure]()))
+        return
+
+    if args.build_static:
+        from viz import build_static_figures
+        for path in build_static_figures():
+            print(f'wrote {path}')
+        return
+
+    _, problems = run_check({**BUDGETS, **dict(args.budget)}, args.repeats)
+
+    for problem in problems:
+        print(f'FAILED: {problem}', file=sys.stderr)
+
+    if problems:
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,301 @@
+"""
+On-disk store of simulated scenarios as fixed-layout memory-mapped arrays.
+
+A store is a directory holding one .npy file per monthly series, each with
+shape (scenarios x months) and padded with NaN after each horizon. It also
+holds one .npy file per input and per summary field, plus a parameter
+index:
+
+    meta.json                   shapes, names of the arrays and completion flag
+    series/<name>.npy           (scenarios x months) monthly values
+    params/<name>.npy           inputs of each scenario (see `pipeline.PARAM_NAMES`)
+    summary/<name>.npy          `pipeline.summarize` fields of each scenario
+    index/<name>.order.npy      scenarios sorted by an input, for range queries
+    index/<name>.sorted.npy     the input values in that order
+    index/keys.npy              sorted keys of the full input sets, for lookups
+
+Arrays are opened with `np.load(mmap_mode='r')`, so taking a month of every
+scenario or a contiguous block of scenarios doesn't copy or read the rest.
+"""
+
+import json
+import os
+
+import numpy as np
+
+from core import AMORTIZATION_SYSTEMS, FGTS_POLICIES, option_codes
+from pipeline import PARAM_NAMES, as_scenarios, final_totals, simulate_batch, summarize
+
+# monthly series kept by default: mortgage, rent and final result
+STORE_SERIES = ('mort_balance', 'mort_installment', 'rent', 'total')
+
+STRING_PARAMS = {'amortization': AMORTIZATION_SYSTEMS, 'fgts_policy': FGTS_POLICIES}
+
+def _row_keys(scenarios):
+
+    """
+    One fixed-size byte key per scenario, made of its inputs as float64 (options as codes).
+    """
+
+    columns = [
+        option_codes(scenarios[name], STRING_PARAMS[name], name) if name in STRING_PARAMS else scenarios[name]
+        for name in PARAM_NAMES
+    ]
+
+    # adding zero turns -0.0 into 0.0, so equal inputs have equal bytes
+    matrix = np.ascontiguousarray(np.column_stack(columns).astype(float) + 0.)
+    return matrix.view(np.dtype((np.void, matrix.itemsize * matrix.shape[1]))).ravel()
+
+class ResultStore:
+
+    """
+    Directory of memory-mapped scenario results (see the module docstring).
+    """
+
+    def __init__(self, path, mode='r'):
+
+        self.path = path
+        self.mode = mode
+
+        with open(os.path.join(path, 'meta.json')) as file:
+            self.meta = json.load(file)
+
+        if mode == 'r' and not self.meta['complete']:
+            raise ValueError(f'store {path} was not finalized')
+
+        self._arrays = {}
+
+    @classmethod
+    def create(cls, path, n_scenarios, n_months, series=STORE_SERIES, dtype='float64'):
+
+        """
+        Create an empty store with room for `n_scenarios` scenarios of up to `n_months` months.
+        """
+
+        for folder in ('series', 'params', 'summary', 'index'):
+            os.makedirs(os.path.join(path, folder), exist_ok=True)
+
+        meta = {
+            'n_scenarios': int(n_scenarios),
+            'n_months': int(n_months),
+            'series': list(series),
+            'params': list(PARAM_NAMES),
+            'dtype': np.dtype(dtype).str,
+            'complete': False,
+        }
+
+        for name in series:
+            values = np.lib.format.open_memmap(
+                os.path.join(path, 'series', f'{name}.npy'), 'w+', meta['dtype'], (n_scenarios, n_months)
+            )
+            values[:] = np.nan
+            del values
+
+        with open(os.path.join(path, 'meta.json'), 'w') as file:
+            json.dump(meta, file, indent=2)
+
+        return cls(path, 'r+')
+
+    def _file(self, folder, name):
+        return os.path.join(self.path, folder, f'{name}.npy')
+
+    def _array(self, folder, name):
+
+        key = (folder, name)
+
+        if key not in self._arrays:
+            self._arrays[key] = np.load(self._file(folder, name), mmap_mode=self.mode)
+
+        return self._arrays[key]
+
+    def __len__(self):
+        return self.meta['n_scenarios']
+
+    # writing #
+
+    def write(self, start, scenarios, result):
+
+        """
+        Store a `pipeline.simulate_batch` result for the scenarios from row `start` on.
+        """
+
+        n_rows = result['horizon'].shape[0]
+        n_months = min(result['total'].shape[1], self.meta['n_months'])
+
+        for name in self.meta['series']:
+            self._array('series', name)[start:start + n_rows, :n_months] = result[name][:, :n_months]
+
+        summary = summarize(result)
+        self.meta['summary'] = list(summary)
+
+        columns = {**{('params', name): scenarios[name] for name in PARAM_NAMES},
+                   **{('summary', name): value for name, value in summary.items()}}
+
+        # object columns (e.g. options read from a CSV) are stored as unicode arrays
+        columns = {key: value.astype(str) if value.dtype == object else value for key, value in columns.items()}
+
+        # small per-scenario columns are kept as row-chunk files until `finalize`
+        for (folder, name), values in columns.items():
+            np.save(os.path.join(self.path, folder, f'{name}.part{start:012d}.npy'), values)
+
+    def finalize(self):
+
+        """
+        Concatenate the per-scenario columns, build the parameter index and mark the store complete.
+        """
+
+        for folder in ('params', 'summary'):
+
+            parts = sorted(name for name in os.listdir(os.path.join(self.path, folder)) if '.part' in name)
+            names = sorted({part.split('.part')[0] for part in parts})
+
+            for name in names:
+
+                files = [os.path.join(self.path, folder, part) for part in parts if part.split('.part')[0] == name]
+                np.save(self._file(folder, name), np.concatenate([np.load(file) for file in files]))
+
+                for file in files:
+                    os.remove(file)
+
+        params = {name: np.load(self._file('params', name)) for name in PARAM_NAMES}
+
+        if params[PARAM_NAMES[0]].shape[0] != self.meta['n_scenarios']:
+            raise ValueError(f'store has {params[PARAM_NAMES[0]].shape[0]} of {self.meta["n_scenarios"]} scenarios')
+
+        for name, values in params.items():
+            order = np.argsort(values, kind='stable')
+            np.save(self._file('index', f'{name}.order'), order)
+            np.save(self._file('index', f'{name}.sorted'), values[order])
+
+        keys = _row_keys(params)
+        order = np.argsort(keys, kind='stable')
+        np.save(self._file('index', 'keys'), keys[order])
+        np.save(self._file('index', 'keys.order'), order)
+
+        for array in self._arrays.values():
+            if isinstance(array, np.memmap):
+                array.flush()
+
+        self._arrays.clear()
+        self.meta['complete'] = True
+        self.mode = 'r'
+
+        with open(os.path.join(self.path, 'meta.json'), 'w') as file:
+            json.dump(self.meta, file, indent=2)
+
+    # reading #
+
+    def series(self, name):
+
+        """
+        (scenarios x months) memory-mapped values of a monthly series.
+        """
+
+        if name not in self.meta['series']:
+            raise KeyError(f'series {name} is not stored, available: {self.meta["series"]}')
+
+        return self._array('series', name)
+
+    def params(self, name):
+        return self._array('params', name)
+
+    def summary(self, name):
+        return self._array('summary', name)
+
+    def month(self, name, month):
+
+        """
+        Values of a series at one month for every scenario (a strided view, no copy).
+        """
+
+        return self.series(name)[:, month]
+
+    def query(self, **conditions):
+
+        """
+        Sorted row numbers of the scenarios matching every condition.
+
+        Each condition is an input name set to a (low, high) range, inclusive
+        on both ends, or to a single value, e.g.
+        `store.query(mort_interest=(0.07, 0.09), amortization='sac')`.
+        """
+
+        rows = None
+
+        for name, condition in conditions.items():
+
+            if name not in PARAM_NAMES:
+                raise ValueError(f'unknown parameter: {name}')
+
+            low, high = condition if isinstance(condition, tuple) else (condition, condition)
+            values = self._array('index', f'{name}.sorted')
+
+            start = np.searchsorted(values, low, side='left')
+            stop = np.searchsorted(values, high, side='right')
+            matches = np.sort(self._array('index', f'{name}.order')[start:stop])
+
+            rows = matches if rows is None else np.intersect1d(rows, matches, assume_unique=True)
+
+        return np.arange(len(self)) if rows is None else rows
+
+    def lookup(self, params):
+
+        """
+        Row of each scenario of `params` (inputs as in `pipeline.simulate_batch`), -1 if not stored.
+        """
+
+        keys = _row_keys(as_scenarios(params))
+        stored = self._array('index', 'keys')
+
+        position = np.clip(np.searchsorted(stored, keys), 0, len(stored) - 1)
+        found = stored[position] == keys
+
+        return np.where(found, self._array('index', 'keys.order')[position], -1)
+
+    def final_totals(self, params, chunk_size=512):
+
+        """
+        Like `pipeline.final_totals`, reading stored scenarios and simulating only the others.
+        """
+
+        scenarios = as_scenarios(params)
+        rows = self.lookup(scenarios)
+        missing = rows < 0
+
+        totals = np.empty(rows.shape[0])
+        totals[~missing] = self.summary('final_total')[rows[~missing]]
+
+        if missing.any():
+            totals[missing] = final_totals({name: values[missing] for name, values in scenarios.items()}, chunk_size)
+
+        return totals
+
+def build_store(path, params, series=STORE_SERIES, chunk_size=2000, dtype='float64'):
+
+    """
+    Simulate every scenario of `params` (as in `pipeline.simulate_batch`) into a new store.
+    """
+
+    scenarios = as_scenarios(params)
+    n_scenarios = scenarios['n_months'].shape[0]
+    n_months = int(np.maximum(scenarios['time_horizon'], scenarios['n_months'] + 1).max())
+
+    store = ResultStore.create(path, n_scenarios, n_months, series, dtype)
+
+    for start in range(0, n_scenarios, chunk_size):
+        chunk = {name: values[start:start + chunk_size] for name, values in scenarios.items()}
+        store.write(start, chunk, simulate_batch(chunk))
+
+    store.finalize()
+
+    return store
+
+def open_store(path=None):
+
+    """
+    Store at `path`, or at the APARTMENT_RESULT_STORE env var if not given (None if neither is set).
+    """
+
+    path = path or os.environ.get('APARTMENT_RESULT_STORE')
+
+    return ResultStore(path) if path else None
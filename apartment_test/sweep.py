@@ -0,0 +1,69 @@
+import numpy as np
+
+from pipeline import DEFAULT_PARAMS, PARAM_NAMES, final_totals
+
+# inputs that can be swept over a grid (flags and integer schedules are left out)
+SWEEP_PARAMS = (
+    'total_amount',
+    'downpay_amount',
+    'home_appreciation',
+    'inflation',
+    'mort_interest',
+    'mort_index',
+    'invest_interest',
+    'rent_amount',
+    'rent_appreciation',
+)
+
+def sensitivity_grid(x_name, x_values, y_name, y_values, base_params=None, chunk_size=512, store=None, components=None):
+
+    """
+    Final buy-vs-rent result over a 2-D grid of two inputs.
+
+    Every grid cell is one scenario of the vectorized pipeline, so the whole
+    grid is evaluated in a few batched calls. Pieces that do not depend on the
+    swept inputs, such as the mortgage schedule when only rent varies, are
+    computed once and shared between cells.
+
+    Args:
+        x_name (str): input varied along the columns of the grid
+        x_values (array-like): values of `x_name`
+        y_name (str): input varied along the rows of the grid
+        y_values (array-like): values of `y_name`
+        base_params (dict): fixed values of the remaining inputs
+        chunk_size (int): number of grid cells simulated per batch
+        store (store.ResultStore): optional store of precomputed scenarios,
+            only the cells missing from it are simulated
+        components (list): additional costs of buying and renting (see
+            `pipeline.simulate_batch`); the store, which has none, isn't used with them
+
+    Returns:
+
+        totals (np.ndarray): (len(y_values) x len(x_values)) final results
+    """
+
+    for name in (x_name, y_name):
+        if name not in PARAM_NAMES:
+            raise ValueError(f'unknown parameter: {name}')
+
+    if x_name == y_name:
+        raise ValueError('x_name and y_name must be different parameters')
+
+    x_grid, y_grid = np.meshgrid(np.asarray(x_values, dtype=float), np.asarray(y_values, dtype=float))
+
+    params = dict(base_params or {})
+    params[x_name] = x_grid.ravel()
+    params[y_name] = y_grid.ravel()
+
+    # the downpayment can never exceed the value of the property
+    if 'total_amount' in (x_name, y_name) or 'downpay_amount' in (x_name, y_name):
+        merged = {**DEFAULT_PARAMS, **params}
+        params['downpay_amount'] = np.minimum(merged['downpay_amount'], merged['total_amount'])
+        params['downpay_fgts_amount'] = np.minimum(merged['downpay_fgts_amount'], params['downpay_amount'])
+
+    if store is None or components:
+        totals = final_totals(params, chunk_size, components)
+    else:
+        totals = store.final_totals(params, chunk_size)
+
+    return totals.reshape(x_grid.shape)
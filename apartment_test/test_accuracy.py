@@ -0,0 +1,11 @@
+from accuracy import EDGE_CASES, compare, random_scenarios, run_engines, run_reference
+
+def test_engines_match_the_reference():
+
+    # seed 2 draws every edge case; short mortgages keep the reference fast
+    scenarios = random_scenarios(20, seed=2, max_months=60)
+    assert set(scenarios['case']) == {'random', *EDGE_CASES}
+
+    report = compare(run_reference(scenarios, n_workers=1), run_engines(scenarios), scenarios)
+
+    assert report['n_failed'].sum() == 0, report[report['n_failed'] > 0]
@@ -0,0 +1,43 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from backtest import run_backtest
+from pipeline import simulate_batch
+
+def _history(n_months=200, seed=0):
+
+    rng = np.random.default_rng(seed)
+
+    return pd.DataFrame({
+        'home_appreciation': rng.normal(0.004, 0.01, n_months),
+        'inflation': rng.normal(0.004, 0.003, n_months),
+        'mort_interest': rng.uniform(0.06, 0.12, n_months),
+    }, index=pd.date_range('2000-01-01', periods=n_months, freq='MS'))
+
+def test_each_window_uses_the_rates_that_followed():
+
+    history = _history()
+    results = run_backtest(history, {'n_months': 60}, horizon=120, start='2001-01')
+    windows = results['windows']
+
+    assert len(windows) == 200 - 120 + 1 - 12
+    assert windows.index[0] == pd.Timestamp('2001-01-01')
+
+    for date in windows.index[[0, 30, -1]]:
+
+        position = history.index.get_loc(date)
+        rates = history.iloc[position:position + 121]
+        padding = {name: np.full(121 - len(rates), rates[name].iloc[-1]) for name in ('home_appreciation', 'inflation')}
+        rate_paths = {name: np.concatenate([rates[name], padding[name]])[None] for name in padding}
+
+        total = simulate_batch(
+            {'n_months': 60, 'time_horizon': 120, 'mort_interest': rates['mort_interest'].iloc[0]}, rate_paths
+        )['total'][0, 119]
+
+        assert windows.loc[date, 'final_total'] == pytest.approx(total, rel=1e-12)
+
+def test_history_shorter_than_the_horizon():
+
+    with pytest.raises(ValueError, match='120 are needed'):
+        run_backtest(_history(100), horizon=120)
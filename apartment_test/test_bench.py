@@ -0,0 +1,28 @@
+import json
+import os
+
+from bench import COMPARED_METRICS, compare, measure
+
+def test_counts_blocks_the_call_leaves_alive():
+
+    kept = measure(lambda: [object() for _ in range(1000)], min_seconds=0.)
+    freed = measure(lambda: len([object() for _ in range(1000)]), min_seconds=0.)
+
+    assert kept['allocated_blocks'] >= 1000
+    assert freed['allocated_blocks'] < 100
+
+def test_compare_flags_regressions_past_the_threshold():
+
+    baseline = {'case': {'best_seconds': 1., 'peak_bytes': 100}}
+
+    assert compare({'case': {'best_seconds': 1.2, 'peak_bytes': 100}}, baseline, 0.25) == []
+    assert compare({'case': {'best_seconds': 1.3, 'peak_bytes': 100}}, baseline, 0.25) == [('case', 'best_seconds', 1., 1.3)]
+    assert compare({'other': {'best_seconds': 9., 'peak_bytes': 900}}, baseline, 0.25) == []
+
+def test_baseline_has_every_compared_metric():
+
+    with open(os.path.join(os.path.dirname(__file__), 'bench_baseline.json')) as file:
+        results = json.load(file)['results']
+
+    assert results
+    assert all(metric in stats for stats in results.values() for metric in COMPARED_METRICS)
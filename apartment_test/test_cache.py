@@ -0,0 +1,91 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from cache import LRUCache, cache_info, make_key, memoize
+
+def test_evicts_the_least_recently_used_entry():
+
+    cache = LRUCache(maxsize=2)
+    cache.put('a', 1)
+    cache.put('b', 2)
+
+    # reading 'a' makes 'b' the oldest entry
+    assert cache.get('a') == (True, 1)
+    cache.put('c', 3)
+
+    assert cache.get('b') == (False, None)
+    assert cache.get('a') == (True, 1)
+    assert cache.get('c') == (True, 3)
+    assert cache.info()[:3] == (3, 1, 2)
+
+def test_evicts_past_the_byte_limit():
+
+    cache = LRUCache(maxsize=10, max_bytes=1900)
+    cache.put('a', np.zeros(100))
+    cache.put('b', np.zeros(100))
+
+    assert cache.info().nbytes == 1600
+
+    cache.put('c', np.zeros(50))
+
+    assert cache.get('a') == (False, None)
+    assert cache.info().nbytes == 1200
+
+    # replacing an entry frees its old size
+    cache.put('b', np.zeros(10))
+    assert cache.info().nbytes == 480
+
+    # an entry larger than the limit is not kept
+    cache.put('d', np.zeros(1000))
+    assert cache.info().size == 0 and cache.info().nbytes == 0
+
+def test_make_key():
+
+    array = np.arange(5.)
+
+    assert make_key(array) == make_key(array.copy())
+    assert make_key(array) != make_key(array.astype(int))
+    assert make_key(array) != make_key(array[::-1])
+    assert make_key(pd.Series(array, name='a')) != make_key(pd.Series(array, name='b'))
+    assert make_key({'b': 1, 'a': [2., np.float64(3.)]}) == make_key({'a': [2., 3.], 'b': 1})
+    assert make_key((1,)) != make_key([1])
+
+    with pytest.raises(TypeError):
+        make_key(np.array(['a', None], dtype=object))
+
+def test_memoize_returns_copies():
+
+    calls = []
+
+    @memoize(maxsize=4, name='test_memoize_returns_copies')
+    def frame(n):
+        calls.append(n)
+        return pd.DataFrame({'value': np.arange(n, dtype=float)})
+
+    first = frame(3)
+    first['value'] = -1.
+    again = frame(3)
+
+    assert calls == [3]
+    assert again['value'].tolist() == [0., 1., 2.]
+
+    again.loc[0, 'value'] = 10.
+    assert frame(3)['value'].tolist() == [0., 1., 2.]
+
+    assert cache_info()['test_memoize_returns_copies'][:2] == (2, 1)
+
+def test_memoize_bypasses_arguments_without_a_key():
+
+    calls = []
+
+    @memoize(name='test_memoize_bypasses')
+    def identity(value):
+        calls.append(value)
+        return value
+
+    identity(object())
+    identity(object())
+
+    assert len(calls) == 2
+    assert identity.cache_info().misses == 0
@@ -0,0 +1,44 @@
+import numpy as np
+import pandas as pd
+
+import reference
+from cashflow import CashFlow
+
+def _original_cash_flow(mortgage_df, home_value, downpay_amount):
+
+    # the DataFrame chain of the original app.py
+    return (
+        pd.concat([mortgage_df, home_value], axis=1)
+        .assign(downpayment=[downpay_amount] + [0]*(home_value.shape[0] - 1))
+        .assign(mort_installment = lambda x: x.mort_installment.fillna(0))
+        .assign(mort_amount_interest = lambda x: x.mort_amount_interest.fillna(0))
+        .assign(mort_fgts_paid = lambda x: x.mort_fgts_paid.fillna(0))
+        .ffill()
+        .assign(estate = lambda x: x.home_value - x.mort_balance)
+    )
+
+def test_matches_the_original_dataframe_chain():
+
+    mortgage_df = reference.calculate_mortgage_over_time(400e3, 120, 0.08, 2, 30e3)
+    home_value = reference.apply_interest_scalar(600e3, 0.03, 180, 'home_value')
+
+    expected = _original_cash_flow(mortgage_df, home_value, 200e3)
+    mortgage = {name: mortgage_df[name].to_numpy() for name in mortgage_df}
+
+    cash_flow = CashFlow(mortgage, home_value.to_numpy(), 200e3)
+    frame = cash_flow.to_frame()
+
+    assert len(cash_flow) == 180
+    pd.testing.assert_frame_equal(frame[expected.columns], expected, check_dtype=False)
+
+    for name in ('mort_installment', 'downpayment', 'mort_fgts_paid'):
+        np.testing.assert_allclose(cash_flow.cumsum(name), expected[name].cumsum())
+
+def test_derived_columns_are_computed_once():
+
+    mortgage_df = reference.calculate_mortgage_over_time(100e3, 12, 0.05, 1, 0.)
+    cash_flow = CashFlow({name: mortgage_df[name].to_numpy() for name in mortgage_df}, np.full(24, 150e3), 50e3)
+
+    assert cash_flow.estate is cash_flow.estate
+    assert cash_flow.cumsum('mort_installment') is cash_flow.cumsum('mort_installment')
+    assert cash_flow.to_frame() is cash_flow.to_frame()
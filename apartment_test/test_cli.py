@@ -0,0 +1,81 @@
+import glob
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from cli import main, run_batch
+from pipeline import PARAM_NAMES, final_totals
+from store import open_store
+
+@pytest.fixture
+def scenarios(tmp_path):
+
+    frame = pd.DataFrame({
+        'lead': ['a', 'b', 'c', 'd', 'e'],
+        'rent_amount': [3000., 4000., 5000., 6000., 7000.],
+        'mort_interest': [0.07, 0.08, 0.09, 0.07, 0.08],
+        'time_horizon': [120, 240, 360, 480, 120],
+        'amortization': ['sac', 'price', 'sac', 'price', 'sac'],
+    })
+
+    path = os.path.join(tmp_path, 'scenarios.csv')
+    frame.to_csv(path, index=False)
+
+    expected = final_totals({name: frame[name].to_numpy() for name in PARAM_NAMES if name in frame})
+
+    return path, frame, expected
+
+def test_parquet_round_trip(scenarios, tmp_path):
+
+    path, frame, expected = scenarios
+    output = os.path.join(tmp_path, 'results.parquet')
+
+    assert run_batch(path, output, chunk_size=2, series=('total',)) == 5
+
+    results = pd.read_parquet(output)
+
+    assert results['lead'].tolist() == frame['lead'].tolist()
+    np.testing.assert_array_equal(results['final_total'], expected)
+    assert [row[-1] for row in results['total']] == results['final_total'].tolist()
+
+def test_npz_round_trip(scenarios, tmp_path):
+
+    path, frame, expected = scenarios
+    output = os.path.join(tmp_path, 'results')
+
+    run_batch(path, output, 'npz', chunk_size=2, series=('rent',))
+
+    parts = [np.load(part) for part in sorted(glob.glob(os.path.join(output, '*.npz')))]
+
+    assert len(parts) == 3
+    assert np.concatenate([part['lead'] for part in parts]).tolist() == frame['lead'].tolist()
+    np.testing.assert_array_equal(np.concatenate([part['final_total'] for part in parts]), expected)
+
+def test_store_round_trip(scenarios, tmp_path):
+
+    path, _, expected = scenarios
+    output = os.path.join(tmp_path, 'store')
+
+    run_batch(path, output, 'store', chunk_size=2)
+
+    np.testing.assert_array_equal(np.asarray(open_store(output).summary('final_total')), expected)
+
+    # scenarios read back from the store give the same results
+    results = os.path.join(tmp_path, 'results.parquet')
+    run_batch(path, results, store=output)
+
+    np.testing.assert_array_equal(pd.read_parquet(results)['final_total'], expected)
+
+def test_unknown_series(scenarios, tmp_path, capsys):
+
+    path, _, _ = scenarios
+
+    with pytest.raises(SystemExit):
+        main([path, os.path.join(tmp_path, 'results.parquet'), '--series', 'totl'])
+
+    assert "invalid choice: 'totl'" in capsys.readouterr().err
+
+    with pytest.raises(ValueError, match='unknown series'):
+        run_batch(path, os.path.join(tmp_path, 'results.parquet'), series=('totl',))
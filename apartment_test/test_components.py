@@ -0,0 +1,152 @@
+import numpy as np
+import pytest
+
+from components import DEFAULT_COMPONENTS, Component, component_costs, schedule, validate
+from core import growth_table
+from dag import buy_vs_rent
+from dual import tornado
+from pipeline import DEFAULT_PARAMS, final_total, final_totals, simulate_batch
+from solver import solve_break_even
+from sweep import sensitivity_grid
+
+PARAMS = {**DEFAULT_PARAMS, 'fgts_amount': 20e3}
+
+# every default component, with a condominium fee
+COMPONENTS = tuple(
+    component._replace(rate=800.) if component.name == 'condominium' else component
+    for component in DEFAULT_COMPONENTS
+)
+
+def _random_params(rng, index):
+
+    return {
+        **PARAMS,
+        'time_horizon': int(rng.integers(0, 480)),
+        'n_months': int(rng.integers(12, 420)),
+        'fgts_amount': float(rng.uniform(0, 1e5)),
+        'home_appreciation': float(rng.uniform(-0.05, 0.1)),
+        'invest_interest': float(rng.uniform(0, 0.15)),
+        'is_reinvestment': bool(rng.random() < 0.5),
+        'use_inflation': bool(rng.random() < 0.5),
+        'amortization': ('sac', 'price')[index % 2],
+    }
+
+def test_schedule():
+
+    paid = schedule([
+        Component('once', 'buy', 'fixed', 1., start=2, period=0),
+        Component('yearly', 'buy', 'fixed', 1., period=12, count=2),
+        Component('last', 'buy', 'fixed', 1., start=-1, period=0),
+    ], 30)
+
+    assert np.flatnonzero(paid[0]).tolist() == [2]
+    assert np.flatnonzero(paid[1]).tolist() == [0, 12]
+    assert np.flatnonzero(paid[2]).tolist() == [0]
+
+def test_invalid_components():
+
+    for component in (
+        Component('x', 'seller', 'fixed', 1.),
+        Component('x', 'buy', 'price', 1.),
+        Component('x', 'buy', 'fixed', 1., period=-1),
+    ):
+        with pytest.raises(ValueError, match='x: '):
+            validate([component])
+
+def test_no_components_change_nothing():
+
+    assert final_total(simulate_batch(PARAMS, components=()))[0] == final_total(simulate_batch(PARAMS))[0]
+
+def test_one_off_cost_compounds_and_deflates():
+
+    itbi = (Component('itbi', 'buy', 'total_amount', 0.03, period=0),)
+    result = simulate_batch(PARAMS, components=itbi)
+    horizon = result['horizon'][0]
+
+    lost = 0.03 * PARAMS['total_amount'] * growth_table.get(PARAMS['invest_interest'], horizon)[-1]
+    expected = final_total(simulate_batch(PARAMS))[0] - lost / growth_table.get(PARAMS['inflation'], horizon)[-1]
+
+    assert final_total(result)[0] == pytest.approx(expected, abs=1e-6)
+    assert np.count_nonzero(result['component_costs'][0]) == 1
+
+def test_refunded_deposit_nets_to_zero_without_reinvestment():
+
+    deposit = tuple(component for component in DEFAULT_COMPONENTS if component.name.startswith('rental'))
+    params = {**PARAMS, 'is_reinvestment': False}
+
+    assert final_total(simulate_batch(params, components=deposit))[0] == pytest.approx(
+        final_total(simulate_batch(params))[0], abs=1e-6
+    )
+
+def test_pipeline_totals_match_the_stage_graph():
+
+    rng = np.random.default_rng(0)
+
+    for index in range(20):
+
+        params = _random_params(rng, index)
+        result = simulate_batch(params, components=COMPONENTS)
+        run = buy_vs_rent.run({
+            **params,
+            'mortgage_value': params['total_amount'] - params['downpay_amount'],
+            'components': COMPONENTS,
+        })
+
+        np.testing.assert_allclose(
+            np.asarray(run['final_total']), result['total'][0, :result['horizon'][0]], rtol=1e-12, atol=1e-6
+        )
+
+def test_costs_while_the_mortgage_runs():
+
+    mip = (Component('mip', 'buy', 'mort_balance', np.array([3e-4, 1e-4]), during_mortgage=True),)
+    costs = simulate_batch({**PARAMS, 'n_months': np.array([120, 360])}, components=mip)['component_costs']
+
+    assert np.all(np.nan_to_num(costs[0, 121:]) == 0)
+    assert costs[1, 200] > 0
+    assert costs[0, 0] == pytest.approx(3 * costs[1, 0])
+
+def test_costs_match_their_formula():
+
+    n_scenarios, n_months = 3, 48
+    rng = np.random.default_rng(1)
+    bases = {
+        'total_amount': rng.uniform(1e5, 1e6, n_scenarios),
+        'mortgage_value': rng.uniform(1e5, 1e6, n_scenarios),
+        'rent_amount': rng.uniform(1e3, 5e3, n_scenarios),
+        'home_value': rng.uniform(1e5, 1e6, (n_scenarios, n_months)),
+        'mort_balance': rng.uniform(-1e3, 1e5, (n_scenarios, n_months)),
+        'rent': rng.uniform(1e3, 5e3, (n_scenarios, n_months)),
+    }
+    growths = {'inflation': np.cumprod(1 + rng.uniform(0, 0.01, (n_scenarios, n_months)), axis=1)}
+    horizon = np.array([48, 30, 12])
+    inflation = growths['inflation'] / growths['inflation'][:, :1]
+    months = np.arange(n_months)
+
+    # yearly payments take the path of sparse schedules, monthly ones the dense path
+    for period in (12, 1):
+
+        fee = Component('fee', 'buy', 'home_value', 0.01, growth='inflation', period=period)
+        expected = np.where(months % period == 0, 0.01 * bases['home_value'] * inflation, 0.)
+
+        np.testing.assert_allclose(component_costs([fee], bases, growths, horizon, horizon), expected, rtol=1e-12)
+
+    refund = Component('refund', 'rent', 'rent', 2., start=-1, period=0)
+    expected = np.where(months == horizon[:, None] - 1, -2. * bases['rent'], 0.)
+
+    np.testing.assert_allclose(component_costs([refund], bases, growths, horizon, horizon), expected, rtol=1e-12)
+
+def test_app_sections_see_the_components():
+
+    params = {name: value for name, value in PARAMS.items()}
+    expected = final_totals({**params, 'rent_amount': np.array([4000., 6000.])}, components=COMPONENTS)
+
+    grid = sensitivity_grid('rent_amount', [4000., 6000.], 'inflation', [PARAMS['inflation']], params, components=COMPONENTS)
+    np.testing.assert_allclose(grid[0], expected)
+    assert not np.allclose(grid[0], final_totals({**params, 'rent_amount': np.array([4000., 6000.])}))
+
+    rent = solve_break_even('rent_amount', 100., 20000., params, components=COMPONENTS)
+    assert abs(final_totals({**params, 'rent_amount': rent}, components=COMPONENTS)[0]) <= 1.
+
+    impacts = tornado(params, components=COMPONENTS)
+    assert impacts.loc['rent_amount', 'up'] > 0
+    assert not np.isclose(impacts.loc['total_amount', 'up'], tornado(params).loc['total_amount', 'up'])
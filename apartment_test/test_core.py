@@ -0,0 +1,268 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import reference
+from core import GrowthTable, build_fgts_schedule, calculate_mortgage_batch, compound_array, growth_table
+
+COLUMNS = ('mort_balance', 'mort_amount_paid', 'mort_amount_interest', 'mort_installment', 'mort_fgts_paid')
+
+def _annuity(monthly_interest, n_months):
+    return n_months if monthly_interest == 0 else (1 - (1 + monthly_interest) ** -n_months) / monthly_interest
+
+def _loop_mortgage(principal, n_months, yearly_interest, fgts_payments, amortization, fgts_policy,
+                   monthly_interest=None, index_rates=None):
+
+    """
+    Month-by-month mortgage, re-amortizing the balance over the remaining term when FGTS reduces the installment.
+
+    Per-month arrays have n_months + 1 entries, entry i for month i. The
+    balance is corrected by the index before each month's interest, and the
+    fixed amortization (SAC) or installment (Price) follows the index.
+    """
+
+    rates = np.full(n_months + 1, yearly_interest / 12) if monthly_interest is None else monthly_interest
+    index_rates = np.zeros(n_months + 1) if index_rates is None else index_rates
+
+    first_level = principal / n_months if amortization == 'sac' else principal / _annuity(rates[1], n_months)
+    level, index = first_level, 1.
+
+    balance, paid = principal, 0.
+    interest = principal * rates[1]
+    rows = [(balance, paid, interest, interest + level if amortization == 'sac' else level, 0.)]
+
+    for month in range(1, n_months + 1):
+
+        index *= 1 + index_rates[month]
+        balance = balance * (1 + index_rates[month])
+        interest = balance * rates[month]
+
+        if fgts_policy == 'reduce_installment':
+            remaining = n_months - month + 1
+            level = balance / remaining if amortization == 'sac' else balance / _annuity(rates[month], remaining)
+        else:
+            level = first_level * index
+
+        installment = interest + level if amortization == 'sac' else level
+        amortized = installment - interest
+
+        balance = balance - amortized - fgts_payments[month]
+        paid = paid + amortized + fgts_payments[month]
+        rows.append((balance, paid, interest, installment, fgts_payments[month]))
+
+        if balance < 0:
+            break
+
+    return np.array(rows)
+
+def _random_loans(n_loans, seed=0):
+
+    rng = np.random.default_rng(seed)
+
+    return {
+        'principal': rng.uniform(1e5, 2e6, n_loans),
+        'n_months': rng.integers(12, 421, n_loans),
+        'yearly_interest': rng.uniform(0., 0.15, n_loans),
+        'fgts_frequency': rng.integers(0, 6, n_loans),
+        'fgts_amount': np.where(rng.random(n_loans) < 0.3, 0., rng.uniform(0, 1e5, n_loans)),
+    }
+
+def test_sac_batch_matches_the_original_loop():
+
+    loans = _random_loans(60)
+    batch = calculate_mortgage_batch(**loans)
+
+    assert batch['mort_balance'].shape == (60, loans['n_months'].max() + 1)
+
+    for row in range(60):
+
+        loan = {name: values[row].item() for name, values in loans.items()}
+
+        # the original loop divides by the frequency: never using FGTS is using nothing every year
+        if not loan['fgts_frequency']:
+            loan.update(fgts_frequency=1, fgts_amount=0.)
+
+        expected = reference.calculate_mortgage_over_time(**loan)
+        n_rows = batch['n_rows'][row]
+
+        assert n_rows == len(expected)
+        assert np.isnan(batch['mort_balance'][row, n_rows:]).all()
+
+        for column in COLUMNS:
+            np.testing.assert_allclose(batch[column][row, :n_rows], expected[column], rtol=1e-12, atol=1e-6)
+
+@pytest.mark.parametrize('amortization', ['sac', 'price'])
+@pytest.mark.parametrize('fgts_policy', ['reduce_term', 'reduce_installment'])
+def test_batch_matches_a_loop(amortization, fgts_policy):
+
+    loans = _random_loans(40, seed=1)
+    batch = calculate_mortgage_batch(**loans, amortization=amortization, fgts_policy=fgts_policy)
+    fgts_payments = build_fgts_schedule(loans['fgts_amount'], loans['fgts_frequency'], loans['n_months'])
+
+    for row in range(40):
+
+        expected = _loop_mortgage(
+            loans['principal'][row], loans['n_months'][row], loans['yearly_interest'][row],
+            fgts_payments[row], amortization, fgts_policy
+        )
+        n_rows = batch['n_rows'][row]
+
+        assert n_rows == len(expected)
+
+        for column, values in zip(COLUMNS, expected.T):
+            np.testing.assert_allclose(batch[column][row, :n_rows], values, rtol=1e-9, atol=1e-4)
+
+@pytest.mark.parametrize('amortization, fgts_policy', [
+    ('sac', 'reduce_term'),
+    ('sac', 'reduce_installment'),
+    ('price', 'reduce_term'),
+    ('price', 'reduce_installment'),
+])
+def test_indexed_batch_matches_a_loop(amortization, fgts_policy):
+
+    loans = _random_loans(20, seed=3)
+    n_months = loans['n_months'].max()
+    index_rates = np.random.default_rng(3).uniform(-0.002, 0.01, (20, n_months))
+
+    batch = calculate_mortgage_batch(**loans, amortization=amortization, fgts_policy=fgts_policy, index_rates=index_rates)
+    fgts_payments = build_fgts_schedule(loans['fgts_amount'], loans['fgts_frequency'], loans['n_months'])
+
+    for row in range(20):
+
+        expected = _loop_mortgage(
+            loans['principal'][row], loans['n_months'][row], loans['yearly_interest'][row],
+            fgts_payments[row], amortization, fgts_policy, index_rates=np.concatenate([[0.], index_rates[row]])
+        )
+        n_rows = batch['n_rows'][row]
+
+        assert n_rows == len(expected)
+
+        for column, values in zip(COLUMNS, expected.T):
+            np.testing.assert_allclose(batch[column][row, :n_rows], values, rtol=1e-9, atol=1e-4)
+
+@pytest.mark.parametrize('amortization, fgts_policy', [
+    ('sac', 'reduce_term'),
+    ('sac', 'reduce_installment'),
+    ('price', 'reduce_installment'),
+])
+def test_variable_rate_batch_matches_a_loop(amortization, fgts_policy):
+
+    loans = _random_loans(20, seed=4)
+    n_months = loans['n_months'].max()
+    monthly_interest = np.random.default_rng(4).uniform(0.002, 0.012, (20, n_months))
+
+    batch = calculate_mortgage_batch(
+        **loans, amortization=amortization, fgts_policy=fgts_policy, monthly_interest=monthly_interest
+    )
+    fgts_payments = build_fgts_schedule(loans['fgts_amount'], loans['fgts_frequency'], loans['n_months'])
+
+    for row in range(20):
+
+        expected = _loop_mortgage(
+            loans['principal'][row], loans['n_months'][row], None,
+            fgts_payments[row], amortization, fgts_policy,
+            monthly_interest=np.concatenate([[monthly_interest[row, 0]], monthly_interest[row]])
+        )
+        n_rows = batch['n_rows'][row]
+
+        assert n_rows == len(expected)
+
+        for column, values in zip(COLUMNS, expected.T):
+            np.testing.assert_allclose(batch[column][row, :n_rows], values, rtol=1e-9, atol=1e-4)
+
+def test_variable_rate_price_needs_reduce_installment():
+
+    with pytest.raises(ValueError, match='reduce_installment'):
+        calculate_mortgage_batch(500e3, 12, 0.08, amortization='price', monthly_interest=np.full(12, 0.005))
+
+def test_mixed_options_match_separate_batches():
+
+    loans = _random_loans(8, seed=2)
+    amortization = np.array(['sac', 'price'] * 4)
+    fgts_policy = np.array(['reduce_term'] * 4 + ['reduce_installment'] * 4)
+
+    mixed = calculate_mortgage_batch(**loans, amortization=amortization, fgts_policy=fgts_policy)
+
+    for row in range(8):
+
+        single = calculate_mortgage_batch(
+            **{name: values[row] for name, values in loans.items()},
+            amortization=amortization[row], fgts_policy=fgts_policy[row]
+        )
+
+        n_rows = single['n_rows'][0]
+
+        assert mixed['n_rows'][row] == n_rows
+        np.testing.assert_array_equal(mixed['mort_balance'][row, :n_rows], single['mort_balance'][0, :n_rows])
+
+def test_price_installments_are_constant():
+
+    batch = calculate_mortgage_batch(500e3, 120, 0.08, amortization='price')
+
+    np.testing.assert_allclose(batch['mort_installment'][0], batch['mort_installment'][0, 0])
+
+def test_scalar_inputs_give_one_scenario():
+
+    batch = calculate_mortgage_batch(500e3, 120, 0.08)
+
+    assert batch['n_rows'].tolist() == [121]
+    assert batch['mort_balance'][0, -1] == pytest.approx(0., abs=1e-6)
+    assert batch['mort_amount_paid'][0, -1] == pytest.approx(500e3)
+
+def test_unknown_options():
+
+    with pytest.raises(ValueError):
+        calculate_mortgage_batch(500e3, 120, 0.08, amortization='german')
+
+def test_growth_table_rows_match_the_original_growth():
+
+    table = GrowthTable(maxsize=4)
+    monthly_interest = reference.convert_yearly_to_monthly_interest(0.05)
+
+    short = table.get(0.05, 12)
+    long = table.get(0.05, 24)
+
+    np.testing.assert_allclose(long, (1 + monthly_interest) ** np.arange(1, 25), rtol=1e-14)
+    np.testing.assert_array_equal(long[:12], short)
+    assert not long.flags.writeable
+
+    assert np.shares_memory(table.get(0.05, 6), long)
+    assert table.info()[:3] == (1, 2, 1)
+
+    rows = table.rows(np.array([0.05, 0.02, 0.05]), 24)
+    np.testing.assert_array_equal(rows[0], rows[2])
+    np.testing.assert_array_equal(rows[1], table.get(0.02, 24))
+
+def test_growth_table_evicts_past_its_limits():
+
+    table = GrowthTable(maxsize=3, max_bytes=3000)
+
+    for rate in (0.01, 0.02, 0.03, 0.04):
+        table.get(rate, 100)
+
+    info = table.info()
+    assert (info.size, info.nbytes, info.max_bytes) == (3, 2400, 3000)
+
+    # a longer row replaces the old one and pushes the oldest rates out
+    table.get(0.04, 300)
+    assert (table.info().size, table.info().nbytes) == (1, 2400)
+
+@pytest.mark.parametrize('yearly_interest', [0., 0.05, -0.03])
+def test_compound_array_matches_the_original_loop(yearly_interest):
+
+    values = pd.Series(np.random.default_rng(0).uniform(-1e3, 1e3, 60))
+
+    expected = reference.apply_interest_series(values, yearly_interest)
+    compounded = compound_array(values.to_numpy(), growth_table.get(yearly_interest, 60))
+
+    np.testing.assert_allclose(compounded, expected, rtol=1e-12, atol=1e-9)
+
+def test_compound_array_broadcasts_over_scenarios():
+
+    values = np.random.default_rng(1).uniform(0, 1e3, (3, 24))
+    growth = growth_table.rows(np.array([0.01, 0.05, 0.1]), 24)
+
+    compounded = compound_array(values, growth)
+
+    for row in range(3):
+        np.testing.assert_array_equal(compounded[row], compound_array(values[row], growth[row]))
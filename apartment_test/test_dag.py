@@ -0,0 +1,95 @@
+import numpy as np
+import pytest
+
+from cache import clear_caches
+from components import Component
+from dag import buy_vs_rent
+from pipeline import DEFAULT_PARAMS, final_totals
+
+PARAMS = {
+    **DEFAULT_PARAMS,
+    'mortgage_value': DEFAULT_PARAMS['total_amount'] - DEFAULT_PARAMS['downpay_amount'],
+    'fgts_amount': 20e3,
+    'components': (),
+}
+
+@pytest.fixture(autouse=True)
+def empty_caches():
+
+    clear_caches()
+    yield
+    clear_caches()
+
+def test_first_run_computes_every_stage():
+
+    run = buy_vs_rent.run(PARAMS)
+    run['final_total']
+
+    assert sorted(run.recomputed()) == sorted(buy_vs_rent.stages)
+
+    params = {name: value for name, value in PARAMS.items() if name in DEFAULT_PARAMS}
+    np.testing.assert_allclose(run['final_total'][-1], final_totals(params)[0], rtol=1e-12)
+
+def test_identical_inputs_are_served_from_the_cache():
+
+    first = buy_vs_rent.run(PARAMS)
+    expected = first['final_total']
+
+    run = buy_vs_rent.run(dict(PARAMS))
+
+    assert run['final_total'] is expected
+    assert run.recomputed() == []
+
+def test_rent_change_only_reruns_the_rent_stages():
+
+    buy_vs_rent.run(PARAMS)['final_total']
+
+    run = buy_vs_rent.run({**PARAMS, 'rent_amount': 6000.})
+    run['final_total']
+
+    assert sorted(run.recomputed()) == sorted([
+        'rent', 'rent_reinvestment', 'total', 'final_total',
+    ])
+
+def test_fgts_change_skips_the_rent_and_downpayment_stages():
+
+    buy_vs_rent.run(PARAMS)['final_total']
+
+    run = buy_vs_rent.run({**PARAMS, 'fgts_amount': 30e3})
+    run['final_total']
+
+    # the shorter mortgage doesn't move the horizon, so home value, rent and downpayment are reused
+    assert sorted(run.recomputed()) == sorted([
+        'mortgage', 'horizon', 'cash_flow', 'fgts_passive_income',
+        'downpay_and_amort_passive_income', 'rent_reinvestment', 'total', 'final_total',
+    ])
+
+def test_costs_without_components_depend_on_nothing_else():
+
+    buy_vs_rent.run(PARAMS)['final_total']
+
+    run = buy_vs_rent.run({**PARAMS, 'inflation': 0.04})
+    run['final_total']
+
+    assert run.recomputed() == ['final_total']
+
+def test_costs_with_components_follow_the_rent():
+
+    components = (Component('insurance', 'rent', 'rent', 0.01),)
+    buy_vs_rent.run({**PARAMS, 'components': components})['final_total']
+
+    run = buy_vs_rent.run({**PARAMS, 'components': components, 'rent_amount': 6000.})
+    run['final_total']
+
+    assert 'component_costs' in run.recomputed()
+
+def test_update_reuses_the_stages_already_evaluated():
+
+    run = buy_vs_rent.run(PARAMS)
+    run['final_total']
+
+    run.update(rent_amount=7000.)
+    run['final_total']
+
+    assert run.recomputed().count('mortgage') == 1
+    assert run.recomputed().count('rent') == 2
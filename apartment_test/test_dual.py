@@ -0,0 +1,62 @@
+import numpy as np
+import pytest
+
+from components import Component
+from dual import DIFFERENTIABLE_PARAMS, RATE_PARAMS, RATE_STEP, Dual, gradient, tornado
+from pipeline import DEFAULT_PARAMS, final_totals
+
+PARAMS = {**DEFAULT_PARAMS, 'fgts_amount': 20e3, 'downpay_fgts_amount': 50e3}
+
+def _central_differences(params, names):
+
+    derivatives = []
+
+    for name in names:
+        step = 1e-4 if name in RATE_PARAMS else 1e-3 * max(abs(params[name]), 1e3)
+        up = final_totals({**params, name: params[name] + step})[0]
+        down = final_totals({**params, name: params[name] - step})[0]
+        derivatives.append((up - down) / (2 * step))
+
+    return np.array(derivatives)
+
+def test_dual_arithmetic():
+
+    x, y = Dual.variables([2., 3.])
+    result = x * y + np.exp(x) / y - x ** 2
+
+    assert result.value == pytest.approx(6 + np.exp(2) / 3 - 4)
+    np.testing.assert_allclose(result.deriv, [3 + np.exp(2) / 3 - 4, 2 - np.exp(2) / 9])
+
+@pytest.mark.parametrize('params', [DEFAULT_PARAMS, PARAMS])
+def test_gradient_matches_central_differences(params):
+
+    total, derivatives = gradient(params)
+
+    np.testing.assert_allclose(total, final_totals(params), rtol=1e-9)
+    np.testing.assert_allclose(derivatives[0], _central_differences(params, DIFFERENTIABLE_PARAMS), rtol=5e-3)
+
+def test_finite_difference_fallback_matches_the_closed_form():
+
+    # a cost-free component sends the scenario through the finite difference path
+    free = (Component('free', 'buy', 'fixed', 0.),)
+
+    total, derivatives = gradient(PARAMS)
+    fallback_total, fallback_derivatives = gradient(PARAMS, components=free)
+
+    np.testing.assert_allclose(fallback_total, total, rtol=1e-9)
+    np.testing.assert_allclose(fallback_derivatives, derivatives, rtol=5e-3)
+
+def test_tornado_moves_each_input_up_and_down():
+
+    impacts = tornado(PARAMS)
+    base = final_totals(PARAMS)[0]
+
+    for name in ('mort_interest', 'rent_amount'):
+        step = impacts.loc[name, 'step']
+        assert impacts.loc[name, 'up'] == pytest.approx(final_totals({**PARAMS, name: PARAMS[name] + step})[0] - base)
+        assert impacts.loc[name, 'down'] == pytest.approx(final_totals({**PARAMS, name: PARAMS[name] - step})[0] - base)
+
+    # compounding makes the rates' effect asymmetric
+    assert impacts.loc['home_appreciation', 'step'] == RATE_STEP
+    assert impacts.loc['home_appreciation', 'up'] != pytest.approx(-impacts.loc['home_appreciation', 'down'], rel=1e-3)
+    assert impacts['impact'].is_monotonic_decreasing
@@ -0,0 +1,45 @@
+import numpy as np
+
+from inverse import max_affordable_price, min_downpayment, term_frontier
+from pipeline import final_totals
+
+RENT = np.array([3000., 5000., 8000.])
+
+def test_max_affordable_price_reaches_the_target():
+
+    target = np.array([0., 1e5, -1e5])
+    price = max_affordable_price({'rent_amount': RENT}, target)
+
+    totals = final_totals({'rent_amount': RENT, 'total_amount': price})
+
+    np.testing.assert_allclose(totals, target, atol=1.)
+
+def test_scalar_inputs_give_one_solution():
+
+    price = max_affordable_price()
+
+    assert price.shape == (1,)
+    assert abs(final_totals({'total_amount': price})[0]) <= 1.
+
+def test_min_downpayment_reaches_the_target():
+
+    target = np.array([1.2e6, 1.5e6, 0.])
+    downpayment = min_downpayment({'rent_amount': 5000.}, target)
+
+    totals = final_totals({'rent_amount': 5000., 'downpay_amount': downpayment})
+
+    np.testing.assert_allclose(totals[:2], target[:2], atol=1.)
+
+    # buying already wins with the lowest downpayment
+    assert downpayment[2] == 0.
+
+def test_term_frontier_matches_one_solve_per_term():
+
+    frontier = term_frontier('price', {'rent_amount': RENT[:2]}, [120, 240])
+
+    assert frontier.shape == (2, 2)
+
+    for column, n_months in enumerate((120, 240)):
+        np.testing.assert_allclose(
+            frontier[:, column], max_affordable_price({'rent_amount': RENT[:2], 'n_months': n_months}), rtol=1e-6
+        )
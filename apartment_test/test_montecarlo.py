@@ -0,0 +1,70 @@
+import numpy as np
+
+from montecarlo import _histogram_bins, _histogram_quantile, _merge, _simulate_totals, _summarize, run_monte_carlo
+from pipeline import DEFAULT_PARAMS, MORTGAGE_RATE_PARAMS, RATE_PARAMS, final_totals
+
+def _totals_with_gaps():
+
+    totals = np.random.default_rng(0).normal(size=(400, 4))
+    totals[:30, 2:] = np.nan
+    totals[5, 1] = np.inf
+    totals[:, 3] = np.nan
+
+    return totals
+
+def test_summary_leaves_out_non_finite_totals():
+
+    totals = _totals_with_gaps()
+    bins = _histogram_bins(totals, 200)
+    summary = _summarize(totals, bins)
+
+    finite = np.where(np.isfinite(totals), totals, np.nan)
+
+    assert np.all(np.isfinite(bins[0])) and np.all(np.isfinite(bins[1]))
+    assert summary['n_dropped'] == 400
+    assert summary['n_finite'].tolist() == [400, 399, 370, 0]
+    assert summary['counts'].sum(axis=1).tolist() == [400, 399, 370, 0]
+    np.testing.assert_allclose(summary['sums'][:3], np.nansum(finite, axis=0)[:3])
+    np.testing.assert_allclose(summary['minimum'][:3], np.nanmin(finite[:, :3], axis=0))
+
+    median = _histogram_quantile(summary, bins, 0.5)
+
+    np.testing.assert_allclose(median[:3], np.nanmedian(finite[:, :3], axis=0), atol=0.05)
+    assert np.isnan(median[3])
+
+def test_merged_chunks_match_a_single_summary():
+
+    totals = _totals_with_gaps()
+    bins = _histogram_bins(totals, 200)
+
+    whole = _summarize(totals, bins)
+    merged = _merge(_summarize(totals[:150], bins), _summarize(totals[150:], bins))
+
+    for name in ('counts', 'wins', 'sums', 'n_finite'):
+        np.testing.assert_allclose(merged[name], whole[name])
+
+    assert merged['n_dropped'] == whole['n_dropped']
+
+def test_run_monte_carlo_statistics_are_finite():
+
+    specs = {'invest_interest': {'process': 'lognormal', 'mean': 0.08, 'volatility': 0.1}}
+    results = run_monte_carlo({'time_horizon': 120, 'n_months': 120}, specs, n_paths=300, chunk_size=100, n_workers=1)
+
+    assert results['n_paths'] == 300
+    assert results['n_dropped'] == 0
+    assert np.all(np.isfinite(results['mean']))
+    assert np.all((results['prob_buy_wins'] >= 0) & (results['prob_buy_wins'] <= 1))
+    assert np.all(results['quantiles'][0.05] <= results['quantiles'][0.95])
+
+def test_constant_rates_reproduce_the_deterministic_result():
+
+    specs = {name: {'process': 'constant', 'mean': DEFAULT_PARAMS[name]} for name in RATE_PARAMS + MORTGAGE_RATE_PARAMS}
+    expected = final_totals(DEFAULT_PARAMS)
+
+    totals = _simulate_totals({}, specs, 3, 0)
+
+    np.testing.assert_allclose(totals[:, -1], np.repeat(expected, 3), rtol=1e-12)
+
+    results = run_monte_carlo({}, specs, n_paths=20, chunk_size=10, n_workers=1)
+
+    np.testing.assert_allclose(results['mean'][-1], expected, rtol=1e-12)
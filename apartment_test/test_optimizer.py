@@ -0,0 +1,44 @@
+import numpy as np
+import pytest
+
+from optimizer import build_candidate_schedules, candidate_grid, fgts_events, optimize_prepayments
+from pipeline import final_total, simulate_batch
+
+PARAMS = {'fgts_amount': 30e3, 'fgts_frequency': 2, 'n_months': 240, 'time_horizon': 240}
+
+CANDIDATES = candidate_grid(fgts_intervals=(0, 2, 3), extra_amounts=(0., 10e3), extra_years=(None, 5))
+
+# FGTS deposited each month, as optimize_prepayments derives it
+MONTHLY_DEPOSIT = 30e3 / 24
+
+def test_best_candidate_matches_a_direct_simulation():
+
+    ranking = optimize_prepayments(PARAMS, CANDIDATES, chunk_size=5, n_workers=1)
+    best = ranking.iloc[[0]].reset_index(drop=True)
+
+    schedules = build_candidate_schedules(best, MONTHLY_DEPOSIT, PARAMS['n_months'])
+    result = simulate_batch({**PARAMS, 'fgts_policy': best['fgts_policy'].to_numpy()}, prepayments=schedules)
+
+    assert len(ranking) == len(CANDIDATES)
+    assert ranking['final_total'].is_monotonic_decreasing
+    assert final_total(result)[0] == ranking['final_total'].iloc[0]
+
+def test_parallel_evaluation_gives_the_same_ranking():
+
+    serial = optimize_prepayments(PARAMS, CANDIDATES, chunk_size=5, n_workers=1)
+    parallel = optimize_prepayments(PARAMS, CANDIDATES, chunk_size=5, n_workers=2)
+
+    assert parallel.equals(serial)
+
+def test_fgts_uses_withdraw_the_accumulated_balance():
+
+    months, amounts = fgts_events(100., 2, 1, 60)
+
+    assert months.tolist() == [12, 36, 60]
+    monthly_interest = 1.03 ** (1 / 12) - 1
+    np.testing.assert_allclose(amounts, 100. * ((1 + monthly_interest) ** np.array([12, 24, 24]) - 1) / monthly_interest)
+
+def test_fgts_interval_below_the_minimum():
+
+    with pytest.raises(ValueError):
+        candidate_grid(fgts_intervals=(1,))
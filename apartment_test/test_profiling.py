@@ -0,0 +1,49 @@
+import pandas as pd
+import pytest
+from pandas.core.generic import NDFrame
+
+import profiling
+
+def test_hook_is_only_installed_while_profiling():
+
+    original = NDFrame.__init__
+
+    with profiling.session() as profile:
+
+        assert NDFrame.__init__ is not original
+
+        with profiling.stage('build'):
+            pd.Series([1., 2.])
+
+    assert NDFrame.__init__ is original
+    assert profile.summary()['build']['Series'] >= 1
+
+def test_session_stops_when_the_block_raises():
+
+    original = NDFrame.__init__
+
+    with pytest.raises(RuntimeError):
+        with profiling.session():
+            raise RuntimeError('rerun cut short')
+
+    assert profiling._local.profile is None
+    assert NDFrame.__init__ is original
+
+def test_restarting_keeps_a_single_hook():
+
+    original = NDFrame.__init__
+
+    profiling.start()
+    profiling.start()
+    profiling.stop()
+
+    assert NDFrame.__init__ is original
+    assert profiling.stop() is None
+
+def test_disabled_session_yields_nothing():
+
+    with profiling.session(False) as profile:
+        with profiling.stage('ignored') as record:
+            assert record is None
+
+    assert profile is None
@@ -0,0 +1,59 @@
+import numpy as np
+
+from pipeline import as_scenarios, final_totals, simulate_batch
+from scoring import TOLERANCE_ABS, TOLERANCE_REL, is_supported, score
+
+def _params(n_scenarios=200, seed=0):
+
+    rng = np.random.default_rng(seed)
+
+    return {
+        'total_amount': rng.uniform(300e3, 2e6, n_scenarios),
+        'downpay_amount': rng.uniform(0., 300e3, n_scenarios),
+        'home_appreciation': rng.uniform(-0.05, 0.1, n_scenarios),
+        'inflation': rng.uniform(0., 0.1, n_scenarios),
+        'time_horizon': rng.integers(0, 481, n_scenarios),
+        'n_months': rng.integers(1, 421, n_scenarios),
+        'mort_interest': rng.choice([0., 0.05, 0.1], n_scenarios),
+        'fgts_amount': rng.choice([0., 20e3, 200e3], n_scenarios),
+        'fgts_frequency': rng.integers(0, 5, n_scenarios),
+        'invest_interest': rng.uniform(0., 0.15, n_scenarios),
+        'is_reinvestment': rng.random(n_scenarios) < 0.5,
+        'use_inflation': rng.random(n_scenarios) < 0.5,
+        'amortization': rng.choice(['sac', 'price'], n_scenarios),
+        'fgts_policy': rng.choice(['reduce_term', 'reduce_installment'], n_scenarios),
+        'mort_index': rng.choice([0., 0.02], n_scenarios, p=[0.8, 0.2]),
+    }
+
+def test_is_supported():
+
+    scenarios = as_scenarios({
+        'amortization': np.array(['sac', 'price', 'sac', 'sac', 'sac']),
+        'mort_index': np.array([0., 0., 0.02, 0., 0.]),
+        'fgts_policy': np.array(['reduce_term', 'reduce_term', 'reduce_term', 'reduce_installment', 'reduce_installment']),
+        'fgts_amount': np.array([10e3, 10e3, 10e3, 10e3, 0.]),
+    })
+
+    assert is_supported(scenarios).tolist() == [True, False, False, False, True]
+
+def test_scores_match_the_pipeline():
+
+    params = _params()
+    supported = is_supported(as_scenarios(params))
+    expected = final_totals(params)
+
+    scores = score(params, chunk_size=64, fallback_chunk_size=16)
+
+    # both the closed form and the pipeline fallback are exercised
+    assert 0 < supported.sum() < supported.shape[0]
+    np.testing.assert_allclose(scores, expected, rtol=TOLERANCE_REL, atol=TOLERANCE_ABS)
+
+def test_scores_at_given_months():
+
+    params = _params(50, seed=1)
+    result = simulate_batch(params)
+    months = np.array([0, 12, 120, result['total'].shape[1] - 1])
+
+    scores = score(params, months)
+
+    np.testing.assert_allclose(scores, result['total'][:, months], rtol=TOLERANCE_REL, atol=TOLERANCE_ABS)
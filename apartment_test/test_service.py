@@ -0,0 +1,107 @@
+import json
+import threading
+import urllib.error
+import urllib.request
+
+import pytest
+
+import service
+
+@pytest.fixture(scope='module')
+def url():
+
+    server = service.make_server(port=0)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+
+    yield f'http://127.0.0.1:{server.server_address[1]}'
+
+    server.shutdown()
+    server.server_close()
+
+def _request(url, path, payload=None, data=None):
+
+    if payload is not None:
+        data = json.dumps(payload).encode()
+
+    request = urllib.request.Request(url + path, data=data, method='GET' if data is None else 'POST')
+
+    try:
+        with urllib.request.urlopen(request) as response:
+            return response.status, json.loads(response.read())
+    except urllib.error.HTTPError as error:
+        return error.code, json.loads(error.read())
+
+def test_simulate_returns_requested_series(url):
+
+    status, result = _request(url, '/simulate', {'time_horizon': 400, 'lead': 'a1', 'series': ['total', 'rent']})
+
+    assert status == 200
+    assert result['lead'] == 'a1'
+    assert len(result['total']) == len(result['rent']) == 400
+
+def test_batch_matches_single_scenarios(url):
+
+    scenarios = [{'rent_amount': 3000.}, {'rent_amount': 6000.}]
+    status, batch = _request(url, '/simulate/batch', {'scenarios': scenarios, 'series': ['total']})
+
+    assert status == 200
+    assert [result['total'] for result in batch['results']] == [
+        _request(url, '/simulate', {**scenario, 'series': ['total']})[1]['total'] for scenario in scenarios
+    ]
+
+@pytest.mark.parametrize('series, message', [
+    ('total', 'series must be a list'),
+    ([1], 'series must be a list'),
+    (['total', 'totl'], "unknown series: ['totl']"),
+])
+def test_bad_series_are_rejected(url, series, message):
+
+    for path, payload in (('/simulate', {'series': series}), ('/simulate/batch', {'scenarios': [{}], 'series': series})):
+
+        status, result = _request(url, path, payload)
+
+        assert status == 400
+        assert message in result['error']
+
+@pytest.mark.parametrize('path, payload', [
+    ('/simulate', [1, 2]),
+    ('/simulate/batch', {'scenarios': {}}),
+    ('/simulate/batch', {'scenarios': [1]}),
+    ('/simulate', {'total_amount': 'many'}),
+])
+def test_bad_requests_are_rejected(url, path, payload):
+
+    status, result = _request(url, path, payload)
+
+    assert status == 400
+    assert result['error']
+
+def test_invalid_json_is_rejected(url):
+
+    status, result = _request(url, '/simulate', data=b'{not json')
+
+    assert status == 400
+
+def test_batch_size_is_limited(url, monkeypatch):
+
+    monkeypatch.setattr(service, 'MAX_BATCH_SIZE', 2)
+    status, result = _request(url, '/simulate/batch', {'scenarios': [{}, {}, {}]})
+
+    assert status == 400
+    assert 'at most 2 scenarios' in result['error']
+
+def test_unknown_endpoints(url):
+
+    assert _request(url, '/simulate/other', {})[0] == 404
+    assert _request(url, '/other')[0] == 404
+    assert _request(url, '/health') == (200, {'status': 'ok'})
+
+def test_errors_are_counted_in_metrics(url):
+
+    _request(url, '/simulate', {'series': 'total'})
+    status, report = _request(url, '/metrics')
+
+    assert status == 200
+    assert report['endpoints']['/simulate']['errors'] >= 1
+    assert 'service_results' in report['caches']
@@ -0,0 +1,64 @@
+import numpy as np
+
+from pipeline import final_totals
+from solver import solve_break_even
+
+PARAMS = {'time_horizon': 240, 'n_months': 240, 'total_amount': 500000., 'downpay_amount': 100000.}
+
+def _final(rent_amount, params=PARAMS):
+    return final_totals({**params, 'rent_amount': rent_amount})
+
+def test_break_even_rent_hits_zero():
+
+    rent = solve_break_even('rent_amount', 100., 10000., PARAMS)
+
+    assert rent.shape == (1,)
+    assert np.abs(_final(rent)) <= 1.
+
+def test_solves_many_scenarios_at_once():
+
+    params = {**PARAMS, 'invest_interest': np.array([0.04, 0.06, 0.08, 0.10])}
+    rent = solve_break_even('rent_amount', 100., 10000., params)
+
+    assert np.all(np.isfinite(rent))
+    assert np.all(np.abs(_final(rent, params)) <= 1.)
+
+    for value, interest in zip(rent, params['invest_interest']):
+        assert solve_break_even('rent_amount', 100., 10000., {**PARAMS, 'invest_interest': interest})[0] == value
+
+def test_target_array_gives_one_scenario_per_target():
+
+    target = np.array([-1e5, 0., 1e5])
+    rent = solve_break_even('rent_amount', 100., 10000., PARAMS, target)
+
+    assert rent.shape == (3,)
+    np.testing.assert_allclose(_final(rent), target, atol=1.)
+
+def test_bracket_tolerance_brackets_the_root():
+
+    rent = solve_break_even('rent_amount', 100., 10000., PARAMS, ftol=0., xtol=1e-9)[0]
+    step = 1e-9 * (10000. - 100.)
+
+    assert np.sign(_final(rent - step)) != np.sign(_final(rent + step))
+
+def test_no_sign_change_gives_nan():
+
+    rent = solve_break_even('rent_amount', [100., 100.], [200., 10000.], PARAMS)
+
+    assert np.isnan(rent[0])
+    assert np.isfinite(rent[1])
+
+def test_unconverged_scenarios_give_nan():
+
+    rent = solve_break_even('rent_amount', 100., 10000., PARAMS, ftol=0., xtol=0., max_iter=3)
+
+    assert np.isnan(rent).all()
+
+def test_unknown_parameter():
+
+    try:
+        solve_break_even('rent', 0., 1.)
+    except ValueError as error:
+        assert 'rent' in str(error)
+    else:
+        raise AssertionError('expected a ValueError')
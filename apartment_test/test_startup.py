@@ -0,0 +1,23 @@
+import io
+import os
+
+import pytest
+
+from startup_check import BUDGETS, FORBIDDEN_MODULES, app_imports, run_check
+
+# shared CI machines are slower and noisier than the one the budgets were set on
+MARGIN = 3
+
+def test_app_imports_no_forbidden_module_at_the_top():
+
+    assert not set(app_imports()) & set(FORBIDDEN_MODULES)
+
+# wall-clock budgets depend on the machine's load, so they only run on request
+@pytest.mark.skipif(not os.environ.get('APARTMENT_STARTUP_CHECK'), reason='set APARTMENT_STARTUP_CHECK=1 to time the startup')
+def test_cold_start_is_within_budget():
+
+    budgets = {name: MARGIN * seconds for name, seconds in BUDGETS.items()}
+    best, problems = run_check(budgets, repeats=1, stream=io.StringIO())
+
+    assert problems == []
+    assert set(best) == set(BUDGETS)
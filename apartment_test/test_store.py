@@ -0,0 +1,87 @@
+import numpy as np
+import pytest
+
+from pipeline import as_scenarios, final_totals, simulate_batch, summarize
+from store import STORE_SERIES, ResultStore, build_store, open_store
+
+def _params(n_scenarios=20, seed=0):
+
+    rng = np.random.default_rng(seed)
+
+    return {
+        'rent_amount': rng.uniform(2000, 6000, n_scenarios).round(),
+        'mort_interest': rng.choice([0.07, 0.08, 0.09], n_scenarios),
+        'time_horizon': rng.choice([120, 240, 480], n_scenarios),
+        'amortization': rng.choice(['sac', 'price'], n_scenarios),
+    }
+
+@pytest.fixture
+def stored(tmp_path):
+
+    params = _params()
+    build_store(str(tmp_path), params, chunk_size=7)
+
+    return open_store(str(tmp_path)), as_scenarios(params)
+
+def test_round_trip_matches_the_pipeline(stored):
+
+    store, scenarios = stored
+    result = simulate_batch(scenarios)
+    summary = summarize(result)
+
+    assert len(store) == 20
+
+    for name in STORE_SERIES:
+
+        values = np.asarray(store.series(name))
+        n_months = result[name].shape[1]
+
+        np.testing.assert_array_equal(values[:, :n_months], result[name])
+        assert np.isnan(values[:, n_months:]).all()
+
+    for name, values in scenarios.items():
+        np.testing.assert_array_equal(store.params(name), values)
+
+    for name, values in summary.items():
+        np.testing.assert_array_equal(store.summary(name), values)
+
+    np.testing.assert_array_equal(store.month('total', 100), result['total'][:, 100])
+
+def test_query_and_lookup(stored):
+
+    store, scenarios = stored
+
+    rows = store.query(mort_interest=(0.075, 0.09), amortization='price')
+    expected = np.flatnonzero((scenarios['mort_interest'] >= 0.075) & (scenarios['amortization'] == 'price'))
+
+    np.testing.assert_array_equal(rows, expected)
+    np.testing.assert_array_equal(store.lookup(scenarios), np.arange(20))
+
+    other = {name: values[:3].copy() for name, values in scenarios.items()}
+    other['rent_amount'][1] += 0.5
+
+    assert store.lookup(other).tolist() == [0, -1, 2]
+    np.testing.assert_allclose(store.final_totals(other), final_totals(other))
+
+def test_unknown_names(stored):
+
+    store, _ = stored
+
+    with pytest.raises(KeyError):
+        store.series('estate')
+
+    with pytest.raises(ValueError):
+        store.query(rent=(0, 1))
+
+def test_unfinalized_store_is_not_readable(tmp_path):
+
+    ResultStore.create(str(tmp_path), 10, 12)
+
+    with pytest.raises(ValueError, match='not finalized'):
+        ResultStore(str(tmp_path))
+
+def test_open_store_without_a_path(monkeypatch):
+
+    monkeypatch.delenv('APARTMENT_RESULT_STORE', raising=False)
+
+    assert open_store() is None
@@ -0,0 +1,48 @@
+import numpy as np
+import pytest
+
+from pipeline import final_totals
+from store import build_store, open_store
+from sweep import sensitivity_grid
+
+BASE = {'time_horizon': 240, 'fgts_amount': 20e3}
+
+RENTS = [3000., 4500., 6000.]
+RATES = [0.06, 0.09]
+
+def test_cells_match_single_scenarios():
+
+    totals = sensitivity_grid('rent_amount', RENTS, 'mort_interest', RATES, BASE)
+
+    assert totals.shape == (2, 3)
+
+    for row, rate in enumerate(RATES):
+        for column, rent in enumerate(RENTS):
+            expected = final_totals({**BASE, 'rent_amount': rent, 'mort_interest': rate})[0]
+            assert totals[row, column] == pytest.approx(expected, rel=1e-12)
+
+def test_downpayment_is_capped_at_the_price():
+
+    totals = sensitivity_grid('total_amount', [150e3, 500e3], 'rent_amount', [3000.], {'downpay_amount': 200e3})
+    expected = final_totals({'total_amount': 150e3, 'downpay_amount': 150e3, 'rent_amount': 3000.})[0]
+
+    assert totals[0, 0] == pytest.approx(expected, rel=1e-12)
+
+def test_store_gives_the_same_grid(tmp_path):
+
+    # the store holds only part of the grid, the rest is simulated
+    build_store(str(tmp_path), {**BASE, 'rent_amount': np.array(RENTS[:2]), 'mort_interest': RATES[0]})
+    store = open_store(str(tmp_path))
+    assert (store.lookup({**BASE, 'rent_amount': np.array(RENTS), 'mort_interest': RATES[0]}) >= 0).tolist() == [True, True, False]
+
+    expected = sensitivity_grid('rent_amount', RENTS, 'mort_interest', RATES, BASE)
+
+    np.testing.assert_array_equal(sensitivity_grid('rent_amount', RENTS, 'mort_interest', RATES, BASE, store=store), expected)
+
+def test_invalid_parameters():
+
+    with pytest.raises(ValueError):
+        sensitivity_grid('rent', RENTS, 'mort_interest', RATES)
+
+    with pytest.raises(ValueError):
+        sensitivity_grid('rent_amount', RENTS, 'rent_amount', RENTS)
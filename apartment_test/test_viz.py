@@ -0,0 +1,29 @@
+import numpy as np
+
+from viz import MAX_POINTS, downsample, fan_chart_figure, figure_cache, heatmap_figure
+
+def test_downsample_keeps_both_ends():
+
+    assert downsample(10, 20).tolist() == list(range(10))
+
+    index = downsample(1000, MAX_POINTS)
+
+    assert index.shape[0] <= MAX_POINTS
+    assert index[0] == 0 and index[-1] == 999
+    assert np.all(np.diff(index) > 0)
+
+def test_figures_are_built_once_per_input():
+
+    quantiles = {level: np.linspace(0, 1, 480) + level for level in (0.05, 0.5, 0.95)}
+    hits = figure_cache.hits
+
+    first = fan_chart_figure(np.arange(480), quantiles, 'a')
+    again = fan_chart_figure(np.arange(480), {level: values.copy() for level, values in quantiles.items()}, 'a')
+    other = fan_chart_figure(np.arange(480), quantiles, 'b')
+
+    assert again is first
+    assert other is not first
+    assert figure_cache.hits == hits + 1
+    assert len(first.data) == 3
+    assert len(first.data[0].x) == MAX_POINTS
+    assert first.data[0].x[-1] == 479
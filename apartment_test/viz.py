@@ -1,10 +1,32 @@
+import json
+import os
+from functools import wraps
+
 import numpy as np
 import pandas as pd
 import streamlit as st
-import plotly.express as px
-import plotly.graph_objects as go
-from plotly.subplots import make_subplots
 from core import apply_interest_scalar
+from cache import LRUCache, make_key, register_cache
+from profiling import profiled, stage
+
+# longest monthly series sent to the browser by the aggregated plots: the
+# horizons of the app reach 480 months, while the quantile bands are smooth
+# enough to draw from one point every few months
+MAX_POINTS = 120
+
+# figures of the aggregated plots, shared by every session (see `cached_figure`)
+figure_cache = LRUCache(maxsize=64)
+register_cache('figures', figure_cache)
+
+# plotly is imported by each plotting function on first use, so the header
+# and the first inputs of the page render before it loads
+
+# prebuilt figures that don't depend on the inputs, as plotly JSON
+# (regenerate with `python startup_check.py --build-static`)
+STATIC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static')
+
+# static figures already loaded by this process, by name
+_static_figures = {}
 
 def range_min(x):
     return x * (1 - np.sign(x) * 0.3)
@@ -12,8 +34,21 @@ def range_min(x):
 def range_max(x):
     return x * (1 + np.sign(x) * 0.2)
 
-def plot_example():
-    
+def write_figure(fig):
+
+    # timed apart from the figure build, as plotly serialization can dominate a rerun
+    with stage('st.write'):
+        st.write(fig)
+
+def example_figure():
+
+    """
+    Figure of the tutorial section, showing how positive and negative results read.
+    """
+
+    from plotly.subplots import make_subplots
+    import plotly.graph_objects as go
+
     fig = make_subplots(
         rows=1,
         cols=2,
@@ -39,10 +74,78 @@ def plot_example():
     )
 
     fig.update_yaxes(range=[-1.5, 1.5])
-    st.write(fig)
 
+    return fig
+
+# static figures: name -> function building it
+STATIC_FIGURES = {
+    'example': example_figure,
+}
+
+def static_figure(name):
+
+    """
+    Static figure `name`, loaded once per process from its prebuilt JSON, or built if there is none.
+
+    The figure is shared by every session, so it must not be changed.
+    """
+
+    fig = _static_figures.get(name)
+
+    if fig is None:
+
+        path = os.path.join(STATIC_DIR, f'{name}.json')
+
+        if os.path.exists(path):
+
+            import plotly.graph_objects as go
+
+            with open(path, encoding='utf-8') as file:
+                fig = go.Figure(json.load(file))
+
+        else:
+            fig = STATIC_FIGURES[name]()
+
+        _static_figures[name] = fig
+
+    return fig
+
+def build_static_figures():
+
+    """
+    Write the JSON of every figure of `STATIC_FIGURES` to `STATIC_DIR`; returns the paths written.
+
+    The default template is left out: plotly applies it when the figure is
+    shown, and validating it would take most of the loading time.
+    """
+
+    import plotly.io as pio
+
+    os.makedirs(STATIC_DIR, exist_ok=True)
+    paths = []
+
+    for name, build in STATIC_FIGURES.items():
+
+        figure = json.loads(pio.to_json(build()))
+        figure['layout'].pop('template', None)
+
+        path = os.path.join(STATIC_DIR, f'{name}.json')
+        with open(path, 'w', encoding='utf-8') as file:
+            json.dump(figure, file, indent=2, ensure_ascii=False)
+
+        paths.append(path)
+
+    return paths
+
+@profiled
+def plot_example():
+    write_figure(static_figure('example'))
+
+@profiled
 def plot_installment(cash_flow):
     
+    import plotly.graph_objects as go
+
     fig = go.Figure()
 
     installment = -cash_flow['mort_installment']
@@ -67,10 +170,13 @@ def plot_installment(cash_flow):
 
     fig.update_yaxes(range=[range_min(installment.min()), 0])
     fig.update_xaxes(title="Meses após compra")
-    st.write(fig)
+    write_figure(fig)
 
+@profiled
 def plot_total_amount_mortgage(cash_flow):
     
+    import plotly.graph_objects as go
+
     total_amount_mortgage = -(cash_flow['mort_installment'] + cash_flow['mort_fgts_paid'] + cash_flow['downpayment']).cumsum()
 
     fig = go.Figure()
@@ -95,10 +201,13 @@ def plot_total_amount_mortgage(cash_flow):
 
     fig.update_yaxes(range=[range_min(total_amount_mortgage.min()), 0])
     fig.update_xaxes(title="Meses após compra")
-    st.write(fig)
+    write_figure(fig)
 
+@profiled
 def plot_home_value(cash_flow):
     
+    import plotly.graph_objects as go
+
     fig = go.Figure()
 
     estate = cash_flow['estate']
@@ -123,10 +232,13 @@ def plot_home_value(cash_flow):
 
     fig.update_yaxes(range=[0, range_max(estate.max())])
     fig.update_xaxes(title="Meses após compra")
-    st.write(fig)
+    write_figure(fig)
 
+@profiled
 def plot_interest_downpay_fgts(downpay_and_amort):
     
+    import plotly.graph_objects as go
+
     fig = go.Figure()
 
     fig.update_layout(
@@ -149,10 +261,13 @@ def plot_interest_downpay_fgts(downpay_and_amort):
 
     fig.update_yaxes(range=[range_min((-downpay_and_amort).min()), 0])
     fig.update_xaxes(title="Meses após compra")
-    st.write(fig)
+    write_figure(fig)
 
+@profiled
 def plot_rent_economy(rent_over_time):
 
+    import plotly.graph_objects as go
+
     fig = go.Figure()
 
     fig.update_layout(
@@ -175,10 +290,13 @@ def plot_rent_economy(rent_over_time):
 
     fig.update_yaxes(range=[0, range_max(rent_over_time.cumsum().max())])
     fig.update_xaxes(title="Meses após compra")
-    st.write(fig)
+    write_figure(fig)
 
+@profiled
 def plot_rent_installment_diff(diff):
 
+    import plotly.graph_objects as go
+
     positive_diff = pd.Series(np.clip(diff, 0, None)).replace(0, np.nan)
     negative_diff = pd.Series(np.clip(diff, None, 0)).replace(0, np.nan)
 
@@ -213,11 +331,14 @@ def plot_rent_installment_diff(diff):
 
     fig.update_yaxes(range=[range_min(diff.min()), range_max(diff.max())])
     fig.update_xaxes(title="Meses após compra")
-    st.write(fig)
+    write_figure(fig)
 
 
+@profiled
 def plot_rent_installment_diff_reinvest(diff):
     
+    import plotly.graph_objects as go
+
     positive_diff = pd.Series(np.clip(diff, 0, None)).replace(0, np.nan)
     negative_diff = pd.Series(np.clip(diff, None, 0)).replace(0, np.nan)
 
@@ -252,11 +373,14 @@ def plot_rent_installment_diff_reinvest(diff):
 
     fig.update_yaxes(range=[range_min(diff.min()), range_max(diff.max())])
     fig.update_xaxes(title="Meses após compra")
-    st.write(fig)
+    write_figure(fig)
 
 
+@profiled
 def plot_total(total):
 
+    import plotly.graph_objects as go
+
     positive_totals = pd.Series(np.clip(total, 0, None)).replace(0, np.nan)
     negative_totals = pd.Series(np.clip(total, None, 0)).replace(0, np.nan)
 
@@ -291,4 +415,166 @@ def plot_total(total):
 
     fig.update_yaxes(range=[range_min(total.min()), range_max(total.max())])
     fig.update_xaxes(title="Meses após compra")
-    st.write(fig)
\ No newline at end of file
+    write_figure(fig)
+
+def downsample(n_points, max_points):
+
+    """
+    Positions of at most `max_points` evenly spaced points out of `n_points`, first and last included.
+    """
+
+    if n_points <= max_points:
+        return np.arange(n_points)
+
+    return np.unique(np.linspace(0, n_points - 1, max_points).round().astype(int))
+
+def cached_figure(build):
+
+    """
+    Keep the figures built by `build` in `figure_cache`, keyed by its inputs.
+
+    Figures are shared between reruns and sessions, so they must not be changed after they are built.
+    They are kept as `go.Figure`s, since `st.plotly_chart` would validate cached JSON or dicts again.
+    """
+
+    @wraps(build)
+    def wrapper(*args):
+
+        key = (build.__name__, make_key(args))
+        found, fig = figure_cache.get(key)
+
+        if not found:
+            fig = build(*args)
+            figure_cache.put(key, fig)
+
+        return fig
+
+    return wrapper
+
+@cached_figure
+def fan_chart_figure(months, quantiles, title):
+
+    """
+    Bands between symmetric quantiles of a monthly result, darker towards the median.
+    """
+
+    import plotly.graph_objects as go
+
+    levels = sorted(quantiles)
+    index = downsample(months.shape[0], MAX_POINTS)
+    x = months[index]
+
+    fig = go.Figure()
+
+    fig.update_layout(
+        width=750,
+        height=300,
+        font=dict(size=14, family="Roboto, monospace"),
+        title=title,
+        margin=dict(l=20, r=20, t=40, b=20),
+        showlegend=False
+    )
+
+    n_bands = len(levels) // 2
+
+    for band in range(n_bands):
+
+        low, high = quantiles[levels[band]][index], quantiles[levels[-band - 1]][index]
+        color = f'rgba(128, 128, 128, {0.25 + 0.5 * band / max(n_bands, 1):.2f})'
+
+        fig.add_trace(go.Scattergl(x=x, y=high, mode='lines', line=dict(width=0), hoverinfo='skip'))
+        fig.add_trace(go.Scattergl(x=x, y=low, mode='lines', fill='tonexty', fillcolor=color, line=dict(width=0), hoverinfo='skip'))
+
+    if len(levels) % 2:
+        fig.add_trace(go.Scattergl(x=x, y=quantiles[levels[n_bands]][index], mode='lines', line_color='black'))
+
+    fig.update_xaxes(title="Meses após compra")
+
+    return fig
+
+@cached_figure
+def heatmap_figure(x_values, y_values, totals, x_title, y_title):
+
+    """
+    Heatmap of the final result over a grid of two inputs, with the break-even line.
+    """
+
+    import plotly.graph_objects as go
+
+    fig = go.Figure()
+
+    fig.update_layout(
+        width=750,
+        height=500,
+        font=dict(size=14, family="Roboto, monospace"),
+        title='Resultado final segundo a simulação',
+        margin=dict(l=20, r=20, t=40, b=20),
+        showlegend=False
+    )
+
+    fig.add_trace(
+        go.Heatmap(
+            x=x_values,
+            y=y_values,
+            z=totals,
+            zmid=0,
+            colorscale='RdYlGn',
+            colorbar=dict(title='R$')
+        )
+    )
+
+    fig.add_trace(
+        go.Contour(
+            x=x_values,
+            y=y_values,
+            z=totals,
+            contours=dict(start=0, end=0, size=1, coloring='lines'),
+            line=dict(color='black', width=2),
+            showscale=False
+        )
+    )
+
+    fig.update_xaxes(title=x_title)
+    fig.update_yaxes(title=y_title)
+
+    return fig
+
+@profiled
+def plot_sensitivity_heatmap(x_values, y_values, totals, x_title, y_title):
+    write_figure(heatmap_figure(np.asarray(x_values), np.asarray(y_values), np.asarray(totals), x_title, y_title))
+
+@profiled
+def plot_fan_chart(quantiles, title):
+    months = np.arange(next(iter(quantiles.values())).shape[0])
+    write_figure(fan_chart_figure(months, quantiles, title))
+
+@profiled
+def plot_monte_carlo(quantiles):
+    plot_fan_chart(quantiles, 'Faixa de resultados da simulação de Monte Carlo')
+
+@profiled
+def plot_tornado(impacts, labels):
+
+    import plotly.graph_objects as go
+
+    # largest impact at the top
+    impacts = impacts.iloc[::-1]
+    names = [labels[name] for name in impacts.index]
+
+    fig = go.Figure()
+
+    fig.update_layout(
+        width=750,
+        height=100 + 40 * len(names),
+        font=dict(size=14, family="Roboto, monospace"),
+        title='Variação do resultado final para cada premissa',
+        margin=dict(l=20, r=20, t=40, b=20),
+        barmode='overlay',
+        legend=dict(orientation="h")
+    )
+
+    fig.add_trace(go.Bar(y=names, x=impacts['up'], orientation='h', name='Premissa para cima', marker_color='green'))
+    fig.add_trace(go.Bar(y=names, x=impacts['down'], orientation='h', name='Premissa para baixo', marker_color='red'))
+
+    fig.update_xaxes(title="Variação do resultado final (R$)")
+    write_figure(fig)